@@ -0,0 +1,22 @@
+import graphene
+from django.db.models import Q
+from graphene_django.filter import DjangoFilterConnectionField
+
+from teamsite_annual_leave.graphql import HolidayRecordFilter, HolidayRecordNode
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+
+
+class Query(graphene.ObjectType):
+    holidays = DjangoFilterConnectionField(
+        HolidayRecordNode, filterset_class=HolidayRecordFilter
+    )
+
+    @staticmethod
+    def resolve_holidays(root, info, **kwargs):
+        # Only the user's own leave and the records that apply to everyone
+        return HolidayRecord.objects.filter(
+            Q(user__user=info.context.user) | Q(user__isnull=True)
+        )
+
+
+schema = graphene.Schema(query=Query)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -78,9 +79,25 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
-    }
+    },
+    # A stand-in read replica for trying out replica routing locally. Copy the primary into it with
+    # `manage.py refresh-read-replica` and set ANNUAL_LEAVE_READ_REPLICA=1 to read reports from it.
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db-replica.sqlite3",
+        "TEST": {"MIRROR": "default"},
+    },
 }
 
+# The load-test command serves the site from a throwaway database
+if os.environ.get("ANNUAL_LEAVE_DATABASE_NAME"):
+    DATABASES["default"]["NAME"] = os.environ["ANNUAL_LEAVE_DATABASE_NAME"]
+
+DATABASE_ROUTERS = ["teamsite_annual_leave.routers.ReportingRouter"]
+
+if os.environ.get("ANNUAL_LEAVE_READ_REPLICA"):
+    ANNUAL_LEAVE_READ_DATABASE = "replica"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -13,9 +13,32 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import functools
+import importlib.util
+
 from django.contrib import admin
-from django.urls import path
+from django.contrib.auth.decorators import login_required
+from django.urls import include, path
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("holiday/", include("teamsite_annual_leave.urls")),
 ]
+
+# The GraphQL types are served when the graphql extra is installed. graphene is only imported on
+# the first request, so start-up doesn't pay for it.
+if importlib.util.find_spec("graphene_django") is not None:
+
+    @functools.cache
+    def _graphql_view():
+        from graphene_django.views import GraphQLView
+
+        from .schema import schema
+
+        return GraphQLView.as_view(schema=schema)
+
+    @login_required
+    def graphql(request, *args, **kwargs):
+        return _graphql_view()(request, *args, **kwargs)
+
+    urlpatterns.append(path("graphql/", graphql))
@@ -2,15 +2,27 @@ import logging
 from datetime import date
 from math import ceil
 
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.utils import unquote
+from django.core.exceptions import PermissionDenied
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponseNotAllowed, JsonResponse
+from django.urls import path
 from threadlocals.threadlocals import get_request_variable, set_request_variable
 
 from .models.confirmation import Confirmation
+from .models.export_job import ExportJob
 from .models.holiday_plan import HolidayPlan
 from .models.holiday_record import HolidayRecord
 from .models.holiday_record_type import HolidayRecordType
 from .models.holiday_user import HolidayUser
+from .models.holiday_year import HolidayYear
+from .tasks.close_year import reopen_year
+from .util.closed_years import closed_message, find_closed, is_closed
 from .util.holiday_report import generate_holiday_report
+from .util.overlaps import find_overlapping, overlap_message
+from .util.simulation import LeaveLedger
 
 logger = logging.getLogger(__name__)
 
@@ -176,13 +188,122 @@ class HolidayPlanAdmin(admin.ModelAdmin):
         "sun_days",
     )
     search_fields = ("user__user__username",)
+    change_form_template = "admin/holiday/change_form_holidayplan.html"
 
     def get_user(self, obj):
         return obj.user.user.username
 
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        preview = self.admin_site.admin_view(self.preview_view)
+        return [
+            path("preview/", preview, name="%s_%s_preview" % info),
+            path("<path:object_id>/preview/", preview),
+        ] + super().get_urls()
+
+    def preview_view(self, request, object_id=None):
+        """
+        The leave summary before and after the changes in the submitted form, calculated in memory
+        without saving the plan. Called by the change form as it is edited.
+        """
+        if request.method != "POST":
+            return HttpResponseNotAllowed(["POST"])
+        obj = self.get_object(request, unquote(object_id)) if object_id else None
+        if not (
+            self.has_change_permission(request, obj)
+            if obj
+            else self.has_add_permission(request)
+        ):
+            raise PermissionDenied
+
+        form = self.get_form(request, obj, change=obj is not None)(
+            request.POST, instance=obj
+        )
+        if not form.is_valid():
+            return JsonResponse({"errors": form.errors}, status=400)
+        plan = form.save(commit=False)
+
+        plans = [p for p in plan.user.holiday_plans.all() if p.pk != plan.pk]
+        plans.append(plan)
+
+        years = []
+        for year in sorted({plan.start_date.year, date.today().year}):
+            ledger = LeaveLedger(plan.user, year)
+            years.append(
+                dict(
+                    year=year,
+                    before=_preview_figures(ledger.report()),
+                    after=_preview_figures(ledger.report(plans=plans)),
+                )
+            )
+        return JsonResponse(dict(years=years), encoder=DjangoJSONEncoder)
+
+
+def _preview_figures(summary):
+    return {
+        key: summary[key]
+        for key in (
+            "allowance",
+            "public_holiday_adjustment",
+            "total_allowance",
+            "total_used",
+            "remainder",
+        )
+    }
+
+
+class HolidayRecordForm(forms.ModelForm):
+    class Meta:
+        model = HolidayRecord
+        fields = "__all__"
+
+    def clean(self):
+        cleaned_data = super().clean()
+        self._check_open(cleaned_data)
+
+        record_type = cleaned_data.get("record_type")
+        if (
+            record_type is None
+            or record_type.system_option
+            or cleaned_data.get("user") is None
+            or cleaned_data.get("start_date") is None
+            or cleaned_data.get("end_date") is None
+        ):
+            return cleaned_data
+
+        record = HolidayRecord(
+            pk=self.instance.pk,
+            user=cleaned_data["user"],
+            start_date=cleaned_data["start_date"],
+            end_date=cleaned_data["end_date"],
+            start_half=cleaned_data.get("start_half", False),
+            end_half=cleaned_data.get("end_half", False),
+        )
+        other = find_overlapping(record)
+        if other is not None:
+            raise forms.ValidationError(overlap_message(other))
+        return cleaned_data
+
+    def _check_open(self, cleaned_data):
+        records = []
+        if self.instance.pk is not None:
+            records.append(HolidayRecord.objects.get(pk=self.instance.pk))
+        if cleaned_data.get("year") is not None:
+            user = cleaned_data.get("user")
+            records.append(
+                HolidayRecord(
+                    user_id=None if user is None else user.pk,
+                    year=cleaned_data["year"],
+                )
+            )
+        closed = find_closed(records)
+        if closed:
+            raise forms.ValidationError(closed_message(min(year for _, year in closed)))
+
 
 @admin.register(HolidayRecord)
 class HolidayRecordAdmin(admin.ModelAdmin):
+    form = HolidayRecordForm
     list_display = (
         "title",
         "user",
@@ -196,6 +317,23 @@ class HolidayRecordAdmin(admin.ModelAdmin):
     search_fields = ("user__user__username",)
     list_filter = ("record_type",)
 
+    def has_delete_permission(self, request, obj=None):
+        if obj is not None and is_closed(obj):
+            return False
+        return super().has_delete_permission(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        records = list(queryset.only("user", "year"))
+        closed = find_closed(records)
+        kept = [r.pk for r in records if (r.user_id, r.year) in closed]
+        if kept:
+            self.message_user(
+                request,
+                f"Kept {len(kept)} record(s) in closed years",
+                level=messages.WARNING,
+            )
+        super().delete_queryset(request, queryset.exclude(pk__in=kept))
+
 
 @admin.register(HolidayRecordType)
 class HolidayRecordTypeAdmin(admin.ModelAdmin):
@@ -206,3 +344,46 @@ class HolidayRecordTypeAdmin(admin.ModelAdmin):
 class ConfirmationAdmin(admin.ModelAdmin):
     list_display = ("user", "confirmed", "year")
     search_fields = ("user__user__username",)
+
+
+@admin.register(HolidayYear)
+class HolidayYearAdmin(admin.ModelAdmin):
+    list_display = ("user", "year", "last_calculated", "closed")
+    search_fields = ("user__user__username",)
+    list_filter = ("year",)
+    exclude = ("snapshot",)
+    readonly_fields = ("checksum", "last_calculated", "closed")
+    actions = ["reopen"]
+
+    @admin.action(description="Reopen selected closed years")
+    def reopen(self, request, queryset):
+        reopened = 0
+        for year in queryset.values_list("year", flat=True).distinct():
+            users = [s.user.user for s in queryset.filter(year=year)]
+            reopened += len(reopen_year(year, users=users))
+        self.message_user(request, f"Reopened {reopened} year(s)")
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "year",
+        "config",
+        "usernames",
+        "requested_by",
+        "status",
+        "progress",
+        "created",
+        "finished",
+    )
+    list_filter = ("status",)
+    readonly_fields = (
+        "status",
+        "progress",
+        "progress_message",
+        "cache_key",
+        "artifact",
+        "error",
+        "started",
+        "finished",
+    )
@@ -6,3 +6,7 @@ class TeamsiteAnnualLeaveConfig(AppConfig):
 
     def ready(self):
         from .tasks.holiday_plan_tasks import holiday_receiver
+        from .tasks.leave_days import leave_days_record_receiver
+        from .tasks.leave_ledger import leave_ledger_record_receiver
+        from .util.leave_cache import leave_cache_receiver
+        from .util.read_replica import read_your_writes_receiver
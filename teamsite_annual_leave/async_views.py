@@ -0,0 +1,108 @@
+"""
+Async versions of the read-heavy REST actions, for deployments served over ASGI. They return the same
+JSON as the DRF actions, but don't hold a thread while waiting on the database.
+
+DRF views are sync only, so these are plain Django views. Authentication uses the session from
+Django's AuthenticationMiddleware.
+"""
+from datetime import date
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotAllowed, JsonResponse
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models.confirmation import Confirmation
+from .models.holiday_record import HolidayRecord
+from .pagination import (
+    CURSOR_QUERY_PARAM,
+    get_next_link,
+    get_page_size,
+    keyset_queryset,
+    split_page,
+)
+from .serializers.activity_serializers import ActivitySummarySerializer
+from .serializers.confirmation_serializer import ConfirmationSerializer
+from .serializers.holiday_record_serializer import HolidayRecordSerializer
+from .util.holiday_report import agenerate_holiday_report
+from .util.public_holidays import get_public_holiday_data
+from .util.record_filters import filter_records
+
+
+def _json_response(data, status=200):
+    return JsonResponse(data, encoder=JSONEncoder, safe=False, status=status)
+
+
+@sync_to_async
+def _get_authenticated_user(request):
+    user = request.user
+    return user if user.is_authenticated else None
+
+
+def async_api_view(view):
+    """
+    Only allows authenticated GET requests, and passes the user to the view
+    """
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != "GET":
+            return HttpResponseNotAllowed(["GET"])
+        user = await _get_authenticated_user(request)
+        if user is None:
+            return _json_response(
+                {"detail": "Authentication credentials were not provided."}, status=403
+            )
+        return await view(request, user, *args, **kwargs)
+
+    return wrapper
+
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+
+@async_api_view
+async def records(request, user):
+    try:
+        qs = keyset_queryset(
+            filter_records(HolidayRecord.objects.filter(user__user=user), request.GET),
+            request.GET.get(CURSOR_QUERY_PARAM),
+        )
+    except (ValidationError, NotFound) as e:
+        return _json_response(e.detail, status=e.status_code)
+
+    page_size = get_page_size(request.GET)
+    page, next_cursor = split_page(await _alist(qs[: page_size + 1]), page_size)
+    return _json_response(
+        {
+            "next": get_next_link(request.build_absolute_uri(), next_cursor),
+            "results": HolidayRecordSerializer(page, many=True).data,
+        }
+    )
+
+
+@async_api_view
+async def activity(request, user):
+    year = request.GET.get("year", date.today().year)
+    summary = await agenerate_holiday_report(user, year)
+    return _json_response(ActivitySummarySerializer(summary).data)
+
+
+@async_api_view
+async def public(request, user):
+    year = request.GET.get("year", date.today().year)
+    data = await sync_to_async(get_public_holiday_data)(year)
+    return _json_response(data)
+
+
+@async_api_view
+async def confirmations(request, user):
+    qs = (
+        Confirmation.objects.filter(user__user=user)
+        .select_related("snapshot", "user")
+        .defer("snapshot__data", "data")
+        .order_by("-confirmed")
+    )
+    return _json_response(ConfirmationSerializer(await _alist(qs), many=True).data)
@@ -6,11 +6,19 @@ from graphene import Boolean, relay
 from graphene_django.types import DjangoObjectType
 
 from .models.holiday_record import HolidayRecord
+from .util.read_replica import get_read_database
 
 
 class HolidayRecordNode(DjangoObjectType):
     today = Boolean()
 
+    @classmethod
+    def get_queryset(cls, queryset, info):
+        user = getattr(info.context, "user", None)
+        if user is not None and not user.is_authenticated:
+            user = None
+        return queryset.using(get_read_database(user))
+
     @staticmethod
     def resolve_today(record, info):
         today = date.today()
@@ -1,7 +1,10 @@
+from django.contrib.auth import get_user_model
 from django.core.management import BaseCommand
 
 from teamsite_annual_leave.tasks.add_rollovers import add_rollovers
 
+User = get_user_model()
+
 
 class Command(BaseCommand):
     help = "Adds rollover for year"
@@ -9,6 +12,28 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument("year", type=int)
         parser.add_argument("--max", type=int, default=5)
+        parser.add_argument(
+            "--user",
+            action="append",
+            dest="usernames",
+            help="Only roll over this user. Can be given more than once.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Show the changes that would be made without saving them",
+        )
+
+    def handle(self, *args, year, max, usernames, dry_run, **options):
+        users = None
+        if usernames:
+            users = User.objects.filter(username__in=usernames)
+
+        changes = add_rollovers(year, users=users, max_rollover=max, dry_run=dry_run)
 
-    def handle(self, *args, year, max, **options):
-        add_rollovers(year, max_rollover=max)
+        for change in changes:
+            self.stdout.write(
+                f"{change.user.user.username}: {change.previous} -> {change.amount}"
+            )
+        verb = "would change" if dry_run else "changed"
+        self.stdout.write(f"Rollover {verb} for {len(changes)} user(s)")
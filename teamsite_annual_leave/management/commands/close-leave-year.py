@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+
+from teamsite_annual_leave.tasks.close_year import close_year, reopen_year
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Closes a leave year, freezing each user's report. Use --reopen to undo."
+
+    def add_arguments(self, parser):
+        parser.add_argument("year", type=int)
+        parser.add_argument(
+            "--user",
+            action="append",
+            dest="usernames",
+            help="Only close this user's year. Can be given more than once.",
+        )
+        parser.add_argument(
+            "--reopen",
+            action="store_true",
+            help="Reopen the year and recalculate it from the current plans",
+        )
+
+    def handle(self, *args, year, usernames, reopen, **options):
+        users = None
+        if usernames:
+            users = User.objects.filter(username__in=usernames)
+
+        if reopen:
+            changed = reopen_year(year, users=users)
+            verb = "Reopened"
+        else:
+            changed = close_year(year, users=users)
+            verb = "Closed"
+
+        self.stdout.write(f"{verb} {year} for {len(changed)} user(s)")
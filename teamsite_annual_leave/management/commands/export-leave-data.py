@@ -0,0 +1,56 @@
+from django.core.management import BaseCommand, CommandError
+
+from teamsite_annual_leave.util.analytics_export import (
+    DATASETS,
+    FORMATS,
+    get_writer_class,
+    write_analytics_export,
+)
+
+
+class Command(BaseCommand):
+    help = "Exports the summary or detail data for analysis as CSV, NDJSON, Arrow or Parquet"
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(DATASETS))
+        parser.add_argument(
+            "--year",
+            type=int,
+            action="append",
+            dest="years",
+            required=True,
+            help="Year to export. Can be given more than once.",
+        )
+        parser.add_argument(
+            "--users", help="Comma separated list of usernames to include"
+        )
+        parser.add_argument(
+            "--format",
+            choices=sorted(FORMATS) + ["columnar"],
+            default="csv",
+            help="columnar writes Parquet if pyarrow is installed, otherwise NDJSON",
+        )
+        parser.add_argument("--output", help="Defaults to <dataset>.<format>")
+        parser.add_argument("--row-group-size", type=int, default=10000)
+
+    def handle(
+        self, *args, dataset, years, users, format, output, row_group_size, **options
+    ):
+        writer_class = get_writer_class(format)
+        if output is None:
+            output = f"{dataset}.{writer_class.extension}"
+
+        try:
+            with open(output, "wb") as fh:
+                count = write_analytics_export(
+                    fh,
+                    dataset,
+                    format,
+                    years,
+                    usernames=users,
+                    row_group_size=row_group_size,
+                )
+        except ImportError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"Wrote {count} rows to {output}")
@@ -4,6 +4,10 @@ from django.db.models import Q
 from tablib import Dataset
 
 from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.models.holiday_record_type import HolidayRecordType
+from teamsite_annual_leave.models.holiday_user import HolidayUser
+from teamsite_annual_leave.util.closed_years import closed_message, is_closed
+from teamsite_annual_leave.util.overlaps import find_overlapping, overlap_message
 
 User = get_user_model()
 
@@ -54,24 +58,42 @@ class Command(BaseCommand):
         end_half = True if row.get("end_half", "") != "" else False
         year = row.get("year") if row.get("year") is not None else start_date.year
 
-        holiday, created = HolidayRecord.objects.get_or_create(
-            user=user,
+        holiday = HolidayRecord.objects.filter(
+            user__user=user,
             start_date=start_date,
-            record_type_id=5,  # Annual Leave
-            defaults={
-                "end_date": end_date,
-                "start_half": start_half,
-                "end_half": end_half,
-                "year": int(year),
-            },
-        )
+            record_type_id=HolidayRecordType.objects.id_for("AL"),
+        ).first()
+        created = holiday is None
+
+        if not created and is_closed(holiday):
+            print("Skipping", user, holiday, closed_message(holiday.year))
+            return
+
         if row.get("deleted") == "DELETED":
-            holiday.delete()
-            print("Deleted", user, holiday)
-        else:
-            holiday.end_date = end_date
-            holiday.start_half = start_half
-            holiday.end_half = end_half
-            holiday.year = int(year)
-            holiday.save()
-            print("Processed", user, holiday, "Added" if created else "Updated")
+            if not created:
+                holiday.delete()
+                print("Deleted", user, holiday)
+            return
+
+        if created:
+            holiday = HolidayRecord(
+                user=HolidayUser.objects.get(user=user),
+                start_date=start_date,
+                record_type_id=HolidayRecordType.objects.id_for("AL"),
+            )
+        holiday.end_date = end_date
+        holiday.start_half = start_half
+        holiday.end_half = end_half
+        holiday.year = int(year)
+
+        if is_closed(holiday):
+            print("Skipping", user, holiday, closed_message(holiday.year))
+            return
+
+        other = find_overlapping(holiday)
+        if other is not None:
+            print("Skipping", user, holiday, overlap_message(other))
+            return
+
+        holiday.save()
+        print("Processed", user, holiday, "Added" if created else "Updated")
@@ -0,0 +1,74 @@
+import shlex
+
+from django.core.management import BaseCommand, CommandError
+
+from teamsite_annual_leave.util.importtime import measure_importtime
+
+# Short-lived entry points whose start-up should stay cheap
+DEFAULT_TARGETS = {
+    "wsgi": ["-c", "import django_site.wsgi"],
+    "asgi": ["-c", "import django_site.asgi"],
+    "help": ["manage.py", "help"],
+    "recalculate-all-leave-plans": [
+        "manage.py",
+        "recalculate-all-leave-plans",
+        "--help",
+    ],
+    "run-export-jobs": ["manage.py", "run-export-jobs", "--help"],
+    "export-leave-data": ["manage.py", "export-leave-data", "--help"],
+    "add-rollovers": ["manage.py", "add-rollovers", "--help"],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the import time of the WSGI/ASGI apps and management commands with "
+        "python -X importtime, and lists the optional extras each one loads"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--command",
+            action="append",
+            dest="commands",
+            help="manage.py command line to measure instead of the defaults, e.g. "
+            "'close-leave-year --help'. Can be given more than once.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="Runs per target; the fastest is reported",
+        )
+        parser.add_argument(
+            "--top", type=int, default=5, help="Show the slowest top level imports"
+        )
+        parser.add_argument(
+            "--max-ms",
+            type=float,
+            help="Fail if any target takes longer than this to import",
+        )
+
+    def handle(self, *args, commands, repeat, top, max_ms, **options):
+        if commands:
+            targets = {c: ["manage.py"] + shlex.split(c) for c in commands}
+        else:
+            targets = DEFAULT_TARGETS
+
+        too_slow = []
+        for name, target_args in targets.items():
+            runs = [measure_importtime(target_args) for _ in range(repeat)]
+            best = min(runs, key=lambda r: r.total_us)
+            extras = ", ".join(sorted(best.extras)) or "none"
+            self.stdout.write(
+                f"{name}: {best.total_us / 1000:.1f} ms, extras loaded: {extras}"
+            )
+            slowest = sorted(best.modules.items(), key=lambda m: -m[1])[:top]
+            for module, us in slowest:
+                self.stdout.write(f"    {us / 1000:8.1f} ms  {module}")
+
+            if max_ms is not None and best.total_us / 1000 > max_ms:
+                too_slow.append(name)
+
+        if too_slow:
+            raise CommandError(f"Import took longer than {max_ms} ms: {too_slow}")
@@ -0,0 +1,123 @@
+from django.core.management import BaseCommand, CommandError
+
+from teamsite_annual_leave.util.load_test import (
+    DEFAULT_MIX,
+    count_queries,
+    create_session,
+    get_available_endpoints,
+    get_requests,
+    run_load,
+    seed_users,
+    serve,
+    throwaway_database,
+    validate_mix,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load tests the read endpoints with a synthetic organisation of simulated users making a "
+        "mix of requests, served by the sync views under WSGI and by the async views under ASGI. "
+        "Reports latency percentiles, throughput, errors and database queries per endpoint. The "
+        "organisation is seeded into a throwaway database, which is destroyed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--server",
+            action="append",
+            dest="servers",
+            choices=["wsgi", "asgi"],
+            help="Server to test. Can be given more than once; defaults to both.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=200,
+            help="Number of simulated users making requests at the same time",
+        )
+        parser.add_argument(
+            "--duration", type=float, default=10, help="Seconds to run each test for"
+        )
+        parser.add_argument(
+            "--endpoint",
+            action="append",
+            dest="endpoints",
+            choices=get_available_endpoints(),
+            help="Endpoint to request. Can be given more than once; defaults to all.",
+        )
+        parser.add_argument(
+            "--mix",
+            action="append",
+            default=[],
+            metavar="ENDPOINT=WEIGHT",
+            help=f"How often an endpoint is requested relative to the others. Defaults to "
+            f"{', '.join(f'{k}={v}' for k, v in DEFAULT_MIX.items())}.",
+        )
+        parser.add_argument(
+            "--records-per-user",
+            type=int,
+            default=6,
+            help="Leave booked for each seeded user",
+        )
+        parser.add_argument("--port", type=int, default=8765)
+
+    def _parse_mix(self, values, endpoints):
+        mix = {}
+        for value in values:
+            name, _, weight = value.partition("=")
+            try:
+                mix[name] = float(weight)
+            except ValueError:
+                raise CommandError(f"Invalid mix {value}, expected ENDPOINT=WEIGHT")
+        try:
+            validate_mix(mix, endpoints)
+        except ValueError as e:
+            raise CommandError(str(e))
+        return dict(DEFAULT_MIX, **mix)
+
+    def handle(
+        self,
+        *args,
+        servers,
+        concurrency,
+        duration,
+        endpoints,
+        mix,
+        records_per_user,
+        port,
+        **options,
+    ):
+        servers = servers or ["wsgi", "asgi"]
+        endpoints = endpoints or get_available_endpoints()
+        mix = self._parse_mix(mix, endpoints)
+
+        with throwaway_database() as database:
+            users = seed_users(concurrency, records_per_user=records_per_user)
+            session_keys = [create_session(u) for u in users]
+
+            self.stdout.write(
+                f"{'server':8}{'endpoint':15}{'requests':>10}{'errors':>8}{'error %':>9}"
+                f"{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}"
+            )
+            for mode in servers:
+                requests = get_requests(mode, endpoints)
+                queries = count_queries(users[0], requests)
+                try:
+                    with serve(mode, port, database=database):
+                        stats = run_load(
+                            port, session_keys, requests, duration, mix=mix
+                        )
+                except RuntimeError as e:
+                    raise CommandError(str(e))
+
+                for name, endpoint_stats in stats.items():
+                    self.stdout.write(
+                        f"{mode:8}{name:15}{endpoint_stats.requests:>10}"
+                        f"{endpoint_stats.errors:>8}{endpoint_stats.error_rate:>9.1%}"
+                        f"{endpoint_stats.throughput:>10.1f}"
+                        f"{endpoint_stats.percentile(50) * 1000:>9.1f}"
+                        f"{endpoint_stats.percentile(95) * 1000:>9.1f}"
+                        f"{endpoint_stats.percentile(99) * 1000:>9.1f}"
+                        f"{queries[name]:>9}"
+                    )
@@ -0,0 +1,22 @@
+from django.core.management import BaseCommand
+
+from teamsite_annual_leave.tasks.leave_days import is_enabled, rebuild_leave_year
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds the LeaveDay table for the given years. Set ANNUAL_LEAVE_LEAVE_DAYS to keep the built "
+        "years up to date as leave, plans and closures change."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("years", type=int, nargs="+")
+
+    def handle(self, *args, years, **options):
+        if not is_enabled():
+            self.stderr.write(
+                "ANNUAL_LEAVE_LEAVE_DAYS is not set, so the table will not be kept up to date"
+            )
+        for year in years:
+            rows = rebuild_leave_year(year)
+            self.stdout.write(f"{year}: {rows} days")
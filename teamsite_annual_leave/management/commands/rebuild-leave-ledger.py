@@ -0,0 +1,22 @@
+from django.core.management import BaseCommand
+
+from teamsite_annual_leave.tasks.leave_ledger import is_enabled, rebuild_ledger
+
+
+class Command(BaseCommand):
+    help = (
+        "Starts the leave ledger for the given years from the current records. Set "
+        "ANNUAL_LEAVE_LEDGER to append events to it as leave, plans and closures change."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("years", type=int, nargs="+")
+
+    def handle(self, *args, years, **options):
+        if not is_enabled():
+            self.stderr.write(
+                "ANNUAL_LEAVE_LEDGER is not set, so the ledger will not be kept up to date"
+            )
+        for year in years:
+            events = rebuild_ledger(year)
+            self.stdout.write(f"{year}: {events} events")
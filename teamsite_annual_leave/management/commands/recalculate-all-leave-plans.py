@@ -9,5 +9,12 @@ User = get_user_model()
 class Command(BaseCommand):
     help = "Recalculate all holiday entitlements"
 
-    def handle(self, *args, **options):
-        recalculate_all_plans()
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Recalculate even if the plans and public holidays are unchanged",
+        )
+
+    def handle(self, *args, force, **options):
+        recalculate_all_plans(force=force)
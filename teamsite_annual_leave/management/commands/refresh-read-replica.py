@@ -0,0 +1,34 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from teamsite_annual_leave.routers import get_read_alias
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies the primary SQLite database into the read replica, standing in for replication "
+        "when trying out replica routing locally"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            help="Alias to copy into. Defaults to ANNUAL_LEAVE_READ_DATABASE, or 'replica'.",
+        )
+
+    def handle(self, *args, database, **options):
+        alias = database or get_read_alias() or "replica"
+        if alias not in connections.databases:
+            raise CommandError(f"Unknown database alias: {alias}")
+
+        source = connections[DEFAULT_DB_ALIAS]
+        target = connections[alias]
+        if source.vendor != "sqlite" or target.vendor != "sqlite":
+            raise CommandError(
+                "Only SQLite databases can be copied. Use your database's replication instead."
+            )
+
+        source.ensure_connection()
+        target.ensure_connection()
+        source.connection.backup(target.connection)
+        self.stdout.write(f"Copied {DEFAULT_DB_ALIAS} into {alias}")
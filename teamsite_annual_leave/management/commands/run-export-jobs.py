@@ -0,0 +1,45 @@
+import time
+
+from django.core.management import BaseCommand
+
+from teamsite_annual_leave.tasks.export_jobs import cleanup_exports, run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs queued holiday report exports. Fails exports whose worker stopped responding and "
+        "deletes old exports, see ANNUAL_LEAVE_EXPORT_STALE_AFTER and ANNUAL_LEAVE_EXPORT_MAX_AGE."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run the jobs currently queued and exit instead of waiting for more",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=5,
+            help="Seconds to wait between checks for new jobs",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Generate the user reports for each export in this many processes",
+        )
+
+    def handle(self, *args, once, sleep, processes, **options):
+        while True:
+            count = run_pending_jobs(workers=processes)
+            if count:
+                self.stdout.write(f"Ran {count} export job(s)")
+            jobs, artifacts = cleanup_exports()
+            if jobs or artifacts:
+                self.stdout.write(
+                    f"Deleted {jobs} old export job(s) and {artifacts} workbook(s)"
+                )
+            if once:
+                break
+            time.sleep(sleep)
@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand
+
+from teamsite_annual_leave.tasks.leave_ledger import take_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Snapshots the leave ledger balances that have changed since their last snapshot. Run it "
+        "monthly so that balances are read from a short tail of events."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("years", type=int, nargs="*")
+
+    def handle(self, *args, years, **options):
+        count = take_snapshots(years=years or None)
+        self.stdout.write(f"{count} snapshots")
@@ -0,0 +1,61 @@
+from datetime import date
+
+from django.core.management import BaseCommand
+
+from teamsite_annual_leave.util.cache_warmup import CacheWarmup, get_coverage
+from teamsite_annual_leave.util.leave_cache import is_enabled
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the leave cache with the public holidays, report summaries and availability for the "
+        "current and next year, e.g. after a deploy or a bank holiday sync"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--year",
+            type=int,
+            action="append",
+            dest="years",
+            help="Year to warm instead of the current and next. Can be given more than once.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes to generate the summaries with",
+        )
+        parser.add_argument(
+            "--budget",
+            type=float,
+            help="Stop after this many seconds, leaving the rest to be calculated on demand",
+        )
+        parser.add_argument("--chunk-size", type=int, default=50)
+
+    def handle(self, *args, years, workers, budget, chunk_size, **options):
+        if not is_enabled():
+            # Not an error, so the command can be run after every deploy
+            self.stderr.write("ANNUAL_LEAVE_CACHE is not set, nothing to warm")
+            return
+
+        if not years:
+            years = [date.today().year, date.today().year + 1]
+
+        def progress(stage, done, total):
+            self.stdout.write(f"{stage}: {done}/{total}")
+
+        stages = CacheWarmup(
+            years,
+            workers=workers,
+            budget=budget,
+            chunk_size=chunk_size,
+            progress=progress,
+        ).run()
+
+        for stage in stages:
+            self.stdout.write(
+                f"{stage.name} {stage.year}: {stage.cached} cached, {stage.warmed} warmed, "
+                f"{stage.total - stage.cached - stage.warmed} left of {stage.total}"
+            )
+        self.stdout.write(f"Coverage: {get_coverage(stages):.0%}")
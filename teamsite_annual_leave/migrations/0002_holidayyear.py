@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("teamsite_annual_leave", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HolidayYear",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("year", models.IntegerField()),
+                ("checksum", models.CharField(blank=True, max_length=64)),
+                ("last_calculated", models.DateTimeField(blank=True, null=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="holiday_years",
+                        to="teamsite_annual_leave.holidayuser",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("user", "year")},
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("teamsite_annual_leave", "0002_holidayyear"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="holidayyear",
+            name="closed",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="holidayyear",
+            name="snapshot",
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
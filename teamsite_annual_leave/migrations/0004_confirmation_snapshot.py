@@ -0,0 +1,109 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:39
+
+import hashlib
+import json
+import zlib
+from datetime import date
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Copied from models.confirmation_snapshot as it was when this migration was written, so that later
+# changes to the model don't change what the migration stores
+RECORD_FIELDS = (
+    "id",
+    "record_type",
+    "start_date",
+    "end_date",
+    "start_half",
+    "end_half",
+    "adjustment",
+    "title",
+    "year",
+    "holiday_plan",
+)
+
+
+def _encode_value(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_records(rows):
+    rows = sorted([_encode_value(v) for v in row] for row in rows)
+    content = json.dumps([RECORD_FIELDS, rows], separators=(",", ":"))
+    return hashlib.sha256(content.encode("utf-8")).hexdigest(), content
+
+
+def move_data_to_snapshots(apps, schema_editor):
+    Confirmation = apps.get_model("teamsite_annual_leave", "Confirmation")
+    ConfirmationSnapshot = apps.get_model(
+        "teamsite_annual_leave", "ConfirmationSnapshot"
+    )
+    HolidayRecordType = apps.get_model("teamsite_annual_leave", "HolidayRecordType")
+    codes = dict(HolidayRecordType.objects.values_list("pk", "code"))
+
+    pending = Confirmation.objects.filter(snapshot__isnull=True, data__isnull=False)
+    for confirmation in pending.iterator():
+        rows = []
+        for obj in json.loads(confirmation.data):
+            fields = dict(obj["fields"], id=obj["pk"])
+            fields["record_type"] = codes.get(fields["record_type"])
+            rows.append([fields.get(f) for f in RECORD_FIELDS])
+
+        checksum, content = encode_records(rows)
+        snapshot, _ = ConfirmationSnapshot.objects.get_or_create(
+            checksum=checksum,
+            defaults=dict(data=zlib.compress(content.encode("utf-8"), 9)),
+        )
+        confirmation.snapshot = snapshot
+        confirmation.data = None
+        confirmation.save(update_fields=["snapshot", "data"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("teamsite_annual_leave", "0003_holidayyear_closed"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ConfirmationSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("checksum", models.CharField(max_length=64, unique=True)),
+                ("data", models.BinaryField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="confirmation",
+            index=models.Index(
+                fields=["user", "year", "confirmed"],
+                name="teamsite_an_user_id_e3313f_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="confirmation",
+            name="snapshot",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="confirmations",
+                to="teamsite_annual_leave.confirmationsnapshot",
+            ),
+        ),
+        migrations.RunPython(move_data_to_snapshots, migrations.RunPython.noop),
+    ]
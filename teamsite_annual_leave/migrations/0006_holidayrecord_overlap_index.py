@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("teamsite_annual_leave", "0005_exportjob"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="holidayrecord",
+            index=models.Index(
+                fields=["user", "end_date", "start_date"],
+                name="teamsite_an_user_id_9ff0ee_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("teamsite_annual_leave", "0006_holidayrecord_overlap_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LeaveDay",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("year", models.IntegerField()),
+                (
+                    "working",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=3),
+                ),
+                (
+                    "taken",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=3),
+                ),
+                (
+                    "closure",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=3),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="leave_days",
+                        to="teamsite_annual_leave.holidayuser",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["year", "user"], name="teamsite_an_year_e36946_idx"
+                    ),
+                    models.Index(fields=["date"], name="teamsite_an_date_98a1d9_idx"),
+                ],
+                "unique_together": {("user", "date")},
+            },
+        ),
+    ]
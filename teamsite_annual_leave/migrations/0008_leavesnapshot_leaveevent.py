@@ -0,0 +1,102 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("teamsite_annual_leave", "0007_leaveday"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LeaveSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("year", models.IntegerField()),
+                ("event_id", models.IntegerField()),
+                ("balance", models.DecimalField(decimal_places=2, max_digits=6)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="leave_snapshots",
+                        to="teamsite_annual_leave.holidayuser",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["user", "year", "event_id"],
+                        name="teamsite_an_user_id_9780e8_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="LeaveEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("year", models.IntegerField()),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("opening", "Opening balance"),
+                            ("booked", "Leave booked"),
+                            ("changed", "Leave changed"),
+                            ("cancelled", "Leave cancelled"),
+                            ("entitlement", "Entitlement changed"),
+                            ("rollover", "Rollover"),
+                            ("plan", "Plan changed"),
+                            ("closure", "Closure changed"),
+                        ],
+                        max_length=12,
+                    ),
+                ),
+                ("record_id", models.IntegerField()),
+                ("delta", models.DecimalField(decimal_places=2, max_digits=6)),
+                ("contribution", models.DecimalField(decimal_places=2, max_digits=6)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="leave_events",
+                        to="teamsite_annual_leave.holidayuser",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["user", "year", "id"],
+                        name="teamsite_an_user_id_0202ed_idx",
+                    ),
+                    models.Index(
+                        fields=["user", "record_id", "id"],
+                        name="teamsite_an_user_id_9fd6e0_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("teamsite_annual_leave", "0008_leavesnapshot_leaveevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="exportjob",
+            name="heartbeat",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
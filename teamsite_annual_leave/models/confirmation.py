@@ -1,6 +1,6 @@
-from django.core import serializers
 from django.db import models
 
+from .confirmation_snapshot import ConfirmationSnapshot
 from .holiday_record import HolidayRecord
 from .holiday_user import HolidayUser
 
@@ -15,13 +15,32 @@ class Confirmation(models.Model):
         blank=False,
         related_name="holiday_confirmations",
     )
-    data = models.TextField(null=True)
+    snapshot = models.ForeignKey(
+        ConfirmationSnapshot,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="confirmations",
+    )
+    data = models.TextField(
+        null=True
+    )  # Legacy full serialisation, moved into snapshots by migration 0004
 
     def save(self, *args, **kwargs):
-        if self.data is None:
+        if self.snapshot_id is None and self.data is None:
             records = HolidayRecord.objects.filter(user=self.user, year=self.year)
-            self.data = serializers.serialize("json", records)
+            self.snapshot = ConfirmationSnapshot.for_records(records)
         super(Confirmation, self).save(*args, **kwargs)
 
+    @property
+    def records(self):
+        """
+        :return: dict of record id to the values confirmed
+        """
+        if self.snapshot_id is None:
+            return {}
+        return self.snapshot.records
+
     class Meta:
         get_latest_by = "confirmed"
+        indexes = [models.Index(fields=["user", "year", "confirmed"])]
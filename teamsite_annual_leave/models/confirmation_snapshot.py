@@ -0,0 +1,85 @@
+import hashlib
+import json
+import zlib
+from datetime import date
+from decimal import Decimal
+
+from django.db import models
+
+# Stored per record, in this order. The record type is stored by code so snapshots can be read
+# without the record type table.
+RECORD_FIELDS = (
+    "id",
+    "record_type",
+    "start_date",
+    "end_date",
+    "start_half",
+    "end_half",
+    "adjustment",
+    "title",
+    "year",
+    "holiday_plan",
+)
+
+
+def _encode_value(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_records(rows):
+    """
+    Encodes record rows as compact JSON. The result is deterministic, so identical content always
+    produces the same checksum.
+
+    :param rows: sequences of values in RECORD_FIELDS order
+    :return: (checksum, JSON string)
+    """
+    rows = sorted([_encode_value(v) for v in row] for row in rows)
+    content = json.dumps([RECORD_FIELDS, rows], separators=(",", ":"))
+    return hashlib.sha256(content.encode("utf-8")).hexdigest(), content
+
+
+class ConfirmationSnapshot(models.Model):
+    """
+    The records a user confirmed. Each distinct set of records is stored once and shared by every
+    confirmation of that content.
+    """
+
+    checksum = models.CharField(max_length=64, unique=True)
+    data = models.BinaryField()  # zlib compressed output of encode_records
+
+    @classmethod
+    def for_records(cls, records):
+        """
+        :param records: a HolidayRecord queryset
+        :return: the saved snapshot of the records, reusing an existing one if the content matches
+        """
+        source_fields = [
+            f"{f}__code"
+            if f == "record_type"
+            else f"{f}_id"
+            if f == "holiday_plan"
+            else f
+            for f in RECORD_FIELDS
+        ]
+        checksum, content = encode_records(records.values_list(*source_fields))
+        snapshot, _ = cls.objects.get_or_create(
+            checksum=checksum,
+            defaults=dict(data=zlib.compress(content.encode("utf-8"), 9)),
+        )
+        return snapshot
+
+    @property
+    def records(self):
+        """
+        :return: dict of record id to a dict of the stored values
+        """
+        fields, rows = json.loads(zlib.decompress(bytes(self.data)))
+        return {row[0]: dict(zip(fields, row)) for row in rows}
+
+    def __str__(self):
+        return self.checksum[:12]
@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+
+User = get_user_model()
+
+
+class ExportJob(models.Model):
+    """
+    A holiday report export, run off-request by the run-export-jobs worker
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    year = models.IntegerField(null=False)
+    usernames = models.CharField(max_length=1000, null=True, blank=True)
+    config = models.CharField(max_length=20, default="csd")
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="holiday_export_jobs",
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    progress = models.IntegerField(default=0)  # Percent complete
+    progress_message = models.CharField(max_length=255, blank=True, default="")
+    cache_key = models.CharField(
+        max_length=64, blank=True, default=""
+    )  # Hash of the parameters and the data change key, see tasks.export_jobs
+    artifact = models.CharField(
+        max_length=255, null=True, blank=True
+    )  # File name in the export storage
+    error = models.TextField(null=True, blank=True)
+    created = models.DateTimeField(blank=True, auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    heartbeat = models.DateTimeField(
+        null=True, blank=True
+    )  # Last sign of life from the worker running the job
+    finished = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def filename(self):
+        return f"holiday-report-{self.year}-{self.config}.xlsx"
+
+    def __str__(self):
+        return f"[{self.pk}] {self.year} {self.config} ({self.status})"
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created"])]
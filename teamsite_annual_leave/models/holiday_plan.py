@@ -161,6 +161,18 @@ class HolidayPlanCacheLookup:
         self.user_cache[user] = resolved_user
         return resolved_user
 
+    def prime(self, users, plans):
+        """
+        Loads plans for many users up front, e.g. from a single query. Plans must be ordered by
+        descending start date.
+        """
+        plans_by_user_id = {}
+        for user in users:
+            self.user_cache[user] = user
+            self.plan_cache[user] = plans_by_user_id[user.pk] = []
+        for plan in plans:
+            plans_by_user_id[plan.user_id].append(plan)
+
     def get_for_user(self, user):
         user = self.__get_user__(user)
         plans = self.plan_cache.get(user)
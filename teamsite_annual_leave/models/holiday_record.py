@@ -43,6 +43,11 @@ class HolidayRecord(models.Model):
     created = models.DateTimeField(blank=True, auto_now_add=True)
     last_modified = models.DateTimeField(blank=True, auto_now=True)
 
+    class Meta:
+        # Overlap queries (see util.overlaps) filter on end_date >= start, so leading with end_date
+        # only scans the records that end after the new leave starts, not the whole history
+        indexes = [models.Index(fields=["user", "end_date", "start_date"])]
+
     def __str__(self):
         adjustment = f"({self.adjustment})" if self.adjustment is not None else ""
         return (
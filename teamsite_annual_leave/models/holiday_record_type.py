@@ -1,4 +1,69 @@
+import threading
+
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+
+class HolidayRecordTypeManager(models.Manager):
+    """
+    Record types hardly ever change, so they are loaded once per process and then resolved from
+    memory, in the same way as ContentType.objects.get_for_model. The cache is cleared whenever a
+    record type is saved or deleted.
+    """
+
+    _lock = threading.Lock()
+    _cache = None
+
+    def _load(self):
+        """
+        :return: (dict of code to record type, dict of id to code)
+        """
+        cache = HolidayRecordTypeManager._cache
+        if cache is None:
+            with self._lock:
+                cache = HolidayRecordTypeManager._cache
+                if cache is None:
+                    by_code = {t.code: t for t in self.all()}
+                    cache = (by_code, {t.pk: code for code, t in by_code.items()})
+                    HolidayRecordTypeManager._cache = cache
+        return cache
+
+    def _types(self):
+        return self._load()[0]
+
+    def clear_cache(self):
+        HolidayRecordTypeManager._cache = None
+
+    def get_for_code(self, code):
+        try:
+            return self._types()[code]
+        except KeyError:
+            raise self.model.DoesNotExist(f"No record type with code {code!r}")
+
+    def get_for_title(self, title):
+        for record_type in self._types().values():
+            if record_type.title == title:
+                return record_type
+        raise self.model.DoesNotExist(f"No record type with title {title!r}")
+
+    def user_option_ids(self):
+        """
+        :return: ids of the record types users book themselves, i.e. leave
+        """
+        return [t.pk for t in self._types().values() if not t.system_option]
+
+    def id_for(self, code):
+        return self.get_for_code(code).pk
+
+    def ids_for(self, *codes):
+        return [self.id_for(code) for code in codes]
+
+    def code_for(self, record_type_id):
+        """
+        :return: the code for a record type id, e.g. from HolidayRecord.record_type_id
+        """
+        return self._load()[1][record_type_id]
 
 
 class HolidayRecordType(models.Model):
@@ -6,5 +71,12 @@ class HolidayRecordType(models.Model):
     code = models.CharField(max_length=5, unique=True)
     system_option = models.BooleanField()
 
+    objects = HolidayRecordTypeManager()
+
     def __str__(self):
         return self.title
+
+
+@receiver([post_save, post_delete], sender=HolidayRecordType)
+def record_type_receiver(sender, **kwargs):
+    HolidayRecordType.objects.clear_cache()
@@ -0,0 +1,36 @@
+from django.db import models
+
+from .holiday_user import HolidayUser
+
+
+class HolidayYear(models.Model):
+    """
+    Book-keeping for a user's leave year
+    """
+
+    user = models.ForeignKey(
+        HolidayUser,
+        on_delete=models.CASCADE,
+        null=False,
+        blank=False,
+        related_name="holiday_years",
+    )
+    year = models.IntegerField(null=False)
+    checksum = models.CharField(
+        max_length=64, blank=True
+    )  # Fingerprint of the inputs to the last plan recalculation
+    last_calculated = models.DateTimeField(null=True, blank=True)
+    closed = models.DateTimeField(
+        null=True, blank=True
+    )  # Closed years are served from the snapshot and never recalculated
+    snapshot = models.TextField(null=True, blank=True)
+
+    @property
+    def is_closed(self):
+        return self.closed is not None
+
+    def __str__(self):
+        return f"{self.user} {self.year}"
+
+    class Meta:
+        unique_together = ["user", "year"]
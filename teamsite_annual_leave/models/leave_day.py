@@ -0,0 +1,39 @@
+from django.db import models
+
+from .holiday_user import HolidayUser
+
+
+class LeaveDay(models.Model):
+    """
+    One row per user per day: how much they work, how much leave they take and how much of the day is
+    closed. Optional, see tasks.leave_days. Lets totals and availability be aggregated in SQL across
+    the whole organisation.
+    """
+
+    user = models.ForeignKey(
+        HolidayUser,
+        on_delete=models.CASCADE,
+        null=False,
+        blank=False,
+        related_name="leave_days",
+    )
+    date = models.DateField(null=False)
+    year = models.IntegerField(
+        null=False
+    )  # The leave year the day counts against, which is the record's year for leave
+    working = models.DecimalField(
+        max_digits=3, decimal_places=2, default=0
+    )  # From the plan, 0 before the first plan and after leaving
+    taken = models.DecimalField(
+        max_digits=3, decimal_places=2, default=0
+    )  # Allowance used, as calculated for the holiday report
+    closure = models.DecimalField(
+        max_digits=3, decimal_places=2, default=0
+    )  # Public holiday or office closure, 1 is a full day
+
+    def __str__(self):
+        return f"{self.user} {self.date}"
+
+    class Meta:
+        unique_together = ["user", "date"]
+        indexes = [models.Index(fields=["year", "user"]), models.Index(fields=["date"])]
@@ -0,0 +1,57 @@
+from django.db import models
+
+from .holiday_user import HolidayUser
+
+
+class LeaveEvent(models.Model):
+    """
+    An append-only entry in a user's leave ledger: the change one event made to a record's effect on
+    the balance for the year. Optional, see tasks.leave_ledger. The balance is the sum of the deltas,
+    so it can be read from the latest LeaveSnapshot plus the events after it.
+    """
+
+    OPENING = "opening"
+    BOOKED = "booked"
+    CHANGED = "changed"
+    CANCELLED = "cancelled"
+    ENTITLEMENT = "entitlement"
+    ROLLOVER = "rollover"
+    PLAN = "plan"
+    CLOSURE = "closure"
+    KIND_CHOICES = [
+        (OPENING, "Opening balance"),
+        (BOOKED, "Leave booked"),
+        (CHANGED, "Leave changed"),
+        (CANCELLED, "Leave cancelled"),
+        (ENTITLEMENT, "Entitlement changed"),
+        (ROLLOVER, "Rollover"),
+        (PLAN, "Plan changed"),
+        (CLOSURE, "Closure changed"),
+    ]
+
+    user = models.ForeignKey(
+        HolidayUser,
+        on_delete=models.CASCADE,
+        null=False,
+        blank=False,
+        related_name="leave_events",
+    )
+    year = models.IntegerField(null=False)
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES)
+    record_id = models.IntegerField(
+        null=False
+    )  # Not a foreign key, the events outlive deleted records
+    delta = models.DecimalField(max_digits=6, decimal_places=2)
+    contribution = models.DecimalField(
+        max_digits=6, decimal_places=2
+    )  # The record's effect on the balance after this event: its adjustment minus the days it uses
+    created = models.DateTimeField(blank=True, auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user} {self.year} {self.kind} {self.delta}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "year", "id"]),
+            models.Index(fields=["user", "record_id", "id"]),
+        ]
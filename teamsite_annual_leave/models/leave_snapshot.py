@@ -0,0 +1,27 @@
+from django.db import models
+
+from .holiday_user import HolidayUser
+
+
+class LeaveSnapshot(models.Model):
+    """
+    A user's ledger balance for a year, up to and including an event, see tasks.leave_ledger
+    """
+
+    user = models.ForeignKey(
+        HolidayUser,
+        on_delete=models.CASCADE,
+        null=False,
+        blank=False,
+        related_name="leave_snapshots",
+    )
+    year = models.IntegerField(null=False)
+    event_id = models.IntegerField(null=False)  # The last LeaveEvent included
+    balance = models.DecimalField(max_digits=6, decimal_places=2)
+    created = models.DateTimeField(blank=True, auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user} {self.year} {self.balance}"
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "year", "event_id"])]
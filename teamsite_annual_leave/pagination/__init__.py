@@ -0,0 +1,111 @@
+import base64
+import binascii
+from collections import OrderedDict
+from datetime import date
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+CURSOR_QUERY_PARAM = "cursor"
+PAGE_SIZE_QUERY_PARAM = "page_size"
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(record):
+    """
+    :return: an opaque cursor pointing just after the record
+    """
+    value = f"{record.start_date.isoformat()}|{record.pk}"
+    return base64.urlsafe_b64encode(value.encode("ascii")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """
+    :return: (start_date, id) of the record the cursor points after
+    """
+    try:
+        start_date, pk = (
+            base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii").split("|")
+        )
+        return date.fromisoformat(start_date), int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise NotFound("Invalid cursor")
+
+
+def get_page_size(params):
+    try:
+        page_size = int(params.get(PAGE_SIZE_QUERY_PARAM, DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+def keyset_queryset(queryset, cursor=None):
+    """
+    Orders records by (start_date, id) and skips those up to the cursor. Unlike offsets, the cost of
+    a page does not grow with how far into the list it is.
+    """
+    queryset = queryset.order_by("start_date", "id")
+    if cursor:
+        start_date, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(start_date__gt=start_date) | Q(start_date=start_date, id__gt=pk)
+        )
+    return queryset
+
+
+def split_page(records, page_size):
+    """
+    :param records: up to page_size + 1 records from keyset_queryset
+    :return: (the records for the page, the cursor for the next page or None)
+    """
+    records = list(records)
+    if len(records) > page_size:
+        records = records[:page_size]
+        return records, encode_cursor(records[-1])
+    return records, None
+
+
+def get_next_link(url, next_cursor):
+    if next_cursor is None:
+        return None
+    return replace_query_param(url, CURSOR_QUERY_PARAM, next_cursor)
+
+
+class RecordKeysetPagination(BasePagination):
+    """
+    Pages HolidayRecords by (start_date, id), so each page is a single bounded query with no count.
+    Only next links are given.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = get_page_size(request.query_params)
+        queryset = keyset_queryset(
+            queryset, request.query_params.get(CURSOR_QUERY_PARAM)
+        )
+        page, self.next_cursor = split_page(queryset[: page_size + 1], page_size)
+        self.url = request.build_absolute_uri()
+        return page
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("next", get_next_link(self.url, self.next_cursor)),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
@@ -0,0 +1,19 @@
+from rest_framework import renderers
+
+
+class ICalendarRenderer(renderers.BaseRenderer):
+    """
+    Passes through pre-rendered iCalendar documents.
+    """
+
+    media_type = "text/calendar"
+    format = "ics"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        if isinstance(data, dict):
+            # Error responses, e.g. from failed authentication
+            data = data.get("detail", "")
+        return str(data).encode(self.charset)
@@ -0,0 +1,60 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# The alias reads are currently routed to, see read_from
+_read_alias = ContextVar("teamsite_annual_leave_read_alias", default=None)
+
+
+def get_read_alias():
+    """
+    :return: the configured read replica alias, or None if there isn't one
+    """
+    return getattr(settings, "ANNUAL_LEAVE_READ_DATABASE", None)
+
+
+def get_routed_alias():
+    """
+    :return: the alias reads are currently routed to, or None for the primary
+    """
+    return _read_alias.get()
+
+
+@contextmanager
+def read_from(alias):
+    """
+    Sends the reads made in the block to the given alias. See util.read_replica.reporting, which
+    picks the alias.
+    """
+    token = _read_alias.set(None if alias == DEFAULT_DB_ALIAS else alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReportingRouter:
+    """
+    Add to DATABASE_ROUTERS to route the reads inside `reporting` blocks to the
+    ANNUAL_LEAVE_READ_DATABASE alias
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is not None and connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None  # Reads inside a transaction on the primary must see its writes
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # Objects read from the replica would otherwise be saved back to it
+        if get_read_alias() is not None:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, get_read_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -0,0 +1,19 @@
+from rest_framework import serializers
+
+
+class OutOfOfficeUserSerializer(serializers.Serializer):
+    id = serializers.IntegerField(source="user.pk")
+    username = serializers.CharField(source="user.user.username")
+    reason = serializers.CharField()
+
+
+class OutOfOfficeSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    headcount = serializers.IntegerField()
+    out = OutOfOfficeUserSerializer(many=True)
+
+
+class HeadcountSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    available = serializers.IntegerField()
+    partial = serializers.IntegerField()
@@ -8,6 +8,7 @@ class ConfirmationSerializer(serializers.HyperlinkedModelSerializer):
     user = serializers.ReadOnlyField(source="user.id")
     year = serializers.IntegerField()
     confirmed = serializers.DateTimeField(read_only=True)
+    checksum = serializers.ReadOnlyField(source="snapshot.checksum", default=None)
 
     class Meta:
         model = Confirmation
@@ -16,4 +17,5 @@ class ConfirmationSerializer(serializers.HyperlinkedModelSerializer):
             "user",
             "year",
             "confirmed",
+            "checksum",
         )
@@ -0,0 +1,40 @@
+import re
+
+from rest_framework import serializers
+
+from ..models.export_job import ExportJob
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    requested_by = serializers.ReadOnlyField(source="requested_by.username")
+
+    def validate_config(self, value):
+        if not re.fullmatch("[cusdp]+", value):
+            raise serializers.ValidationError(
+                "Use the letters c, u, s, d and p to choose the sheets"
+            )
+        return value
+
+    class Meta:
+        model = ExportJob
+        fields = (
+            "id",
+            "year",
+            "usernames",
+            "config",
+            "requested_by",
+            "status",
+            "progress",
+            "progress_message",
+            "created",
+            "started",
+            "finished",
+        )
+        read_only_fields = (
+            "status",
+            "progress",
+            "progress_message",
+            "created",
+            "started",
+            "finished",
+        )
@@ -4,11 +4,31 @@ from ..models.holiday_record import HolidayRecord
 from ..models.holiday_record_type import HolidayRecordType
 
 
+class RecordTypeField(serializers.PrimaryKeyRelatedField):
+    """
+    Resolves the record type from HolidayRecordType.objects' cache rather than with a query per
+    record
+    """
+
+    def to_internal_value(self, data):
+        try:
+            record_type = HolidayRecordType.objects.get_for_code(
+                HolidayRecordType.objects.code_for(int(data))
+            )
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        except (KeyError, HolidayRecordType.DoesNotExist):
+            self.fail("does_not_exist", pk_value=data)
+        if record_type.system_option:
+            self.fail("does_not_exist", pk_value=data)
+        return record_type
+
+
 class HolidayRecordSerializer(serializers.HyperlinkedModelSerializer):
-    record_type = serializers.PrimaryKeyRelatedField(
+    record_type = RecordTypeField(
         queryset=HolidayRecordType.objects.all().filter(system_option=False)
     )
-    user = serializers.ReadOnlyField(source="user.id")
+    user = serializers.ReadOnlyField(source="user_id")
     start_date = serializers.DateField(
         format="%Y-%m-%d", input_formats=["%d/%m/%Y", "iso-8601"]
     )
@@ -0,0 +1,203 @@
+import copy
+from datetime import date
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from ..models.holiday_record import HolidayRecord
+from ..models.holiday_record_type import HolidayRecordType
+from ..routers import get_read_alias
+from ..tasks.leave_days import refresh_leave_days_for_records
+from ..tasks.leave_ledger import update_ledger_for_records
+from ..tasks.previous_dates import set_previous_dates
+from ..util import leave_cache
+from ..util.closed_years import closed_message, find_closed
+from ..util.overlaps import find_overlaps, overlap_message, overlapping_records
+from ..util.read_replica import mark_write
+from .holiday_record_serializer import HolidayRecordSerializer
+
+MAX_BATCH_SIZE = 500
+
+PAST_ERROR = "Leave cannot be in the past"
+
+
+class RecordBatchSerializer(serializers.Serializer):
+    """
+    Creates, updates and deletes many of a user's leave records at once. All the operations are
+    validated together and then applied in one transaction with bulk queries.
+
+    Needs the user's HolidayRecord queryset and their HolidayUser in the context.
+    """
+
+    create = serializers.ListField(
+        child=serializers.DictField(), default=list, max_length=MAX_BATCH_SIZE
+    )
+    update = serializers.ListField(
+        child=serializers.DictField(), default=list, max_length=MAX_BATCH_SIZE
+    )
+    delete = serializers.ListField(
+        child=serializers.IntegerField(), default=list, max_length=MAX_BATCH_SIZE
+    )
+
+    def validate(self, attrs):
+        today = date.today()
+        errors = {
+            "create": [{} for _ in attrs["create"]],
+            "update": [{} for _ in attrs["update"]],
+            "delete": [[] for _ in attrs["delete"]],
+        }
+
+        def add_error(operation, ix, message, field="non_field_errors"):
+            if operation == "delete":
+                errors[operation][ix].append(message)
+            else:
+                errors[operation][ix].setdefault(field, []).append(message)
+
+        update_ids = [item.get("id") for item in attrs["update"]]
+        instances = self.context["queryset"].in_bulk(
+            [pk for pk in update_ids + attrs["delete"] if isinstance(pk, int)]
+        )
+        seen = set()
+        for operation, ids in (("update", update_ids), ("delete", attrs["delete"])):
+            for ix, pk in enumerate(ids):
+                instance = instances.get(pk)
+                if instance is None:
+                    add_error(operation, ix, "Not found", "id")
+                elif pk in seen:
+                    add_error(operation, ix, "Record is changed more than once", "id")
+                elif instance.record_type.system_option:
+                    add_error(operation, ix, "System records cannot be changed", "id")
+                elif instance.start_date < today:
+                    add_error(operation, ix, PAST_ERROR, "start_date")
+                seen.add(pk)
+
+        created = []
+        leave_type = HolidayRecordType.objects.get_for_code("AL")
+        for ix, item in enumerate(attrs["create"]):
+            serializer = HolidayRecordSerializer(data=item)
+            if not serializer.is_valid():
+                errors["create"][ix].update(serializer.errors)
+                continue
+
+            item = dict(serializer.validated_data)
+            item.pop("record_type", None)
+            record = HolidayRecord(
+                user=self.context["holiday_user"], record_type=leave_type, **item
+            )
+            if record.start_date < today:
+                add_error("create", ix, PAST_ERROR, "start_date")
+            created.append((ix, record))
+
+        updated = []
+        for ix, item in enumerate(attrs["update"]):
+            instance = instances.get(update_ids[ix])
+            if instance is None or errors["update"][ix]:
+                continue
+            serializer = HolidayRecordSerializer(instance, data=item, partial=True)
+            if not serializer.is_valid():
+                errors["update"][ix].update(serializer.errors)
+                continue
+
+            record = copy.copy(instance)
+            set_previous_dates(record, instance.start_date, instance.end_date)
+            for field, value in serializer.validated_data.items():
+                setattr(record, field, value)
+            if record.start_date < today:
+                add_error("update", ix, PAST_ERROR, "start_date")
+            updated.append((ix, record, set(serializer.validated_data)))
+
+        self._check_open(created, updated, instances, attrs["delete"], add_error)
+        self._check_overlaps(created, updated, attrs["delete"], add_error)
+
+        if any(e for item_errors in errors.values() for e in item_errors):
+            raise serializers.ValidationError(
+                {k: v for k, v in errors.items() if any(v)}
+            )
+
+        attrs["create"] = [record for _, record in created]
+        attrs["update"] = [(record, fields) for _, record, fields in updated]
+        return attrs
+
+    def _check_open(self, created, updated, instances, deleted, add_error):
+        """
+        Records in closed years can't be added, moved into or out of them, or deleted
+        """
+        checks = [("create", ix, record) for ix, record in created]
+        for ix, record, _ in updated:
+            checks += [("update", ix, instances[record.pk]), ("update", ix, record)]
+        checks += [
+            ("delete", ix, instances[pk])
+            for ix, pk in enumerate(deleted)
+            if pk in instances
+        ]
+
+        closed = find_closed([record for _, _, record in checks])
+        reported = set()
+        for operation, ix, record in checks:
+            if (record.user_id, record.year) in closed and (
+                operation,
+                ix,
+            ) not in reported:
+                add_error(operation, ix, closed_message(record.year), "year")
+                reported.add((operation, ix))
+
+    def _check_overlaps(self, created, updated, deleted, add_error):
+        """
+        New and changed leave must not overlap other leave, including other records in the batch
+        """
+        changed = {id(r): ("create", ix) for ix, r in created}
+        changed.update({id(r): ("update", ix) for ix, r, _ in updated})
+        records = [r for _, r in created] + [r for _, r, _ in updated]
+        if len(records) == 0:
+            return
+
+        replaced = set(deleted) | {r.pk for r in records if r.pk is not None}
+        records += [
+            r
+            for r in overlapping_records(
+                self.context["holiday_user"],
+                min(r.start_date for r in records),
+                max(r.end_date for r in records),
+            )
+            if r.pk not in replaced
+        ]
+
+        for a, b in find_overlaps(records):
+            for record, other in ((a, b), (b, a)):
+                if id(record) in changed:
+                    add_error(*changed[id(record)], overlap_message(other))
+
+    def save(self):
+        """
+        :return: dict of the created and updated records, and the deleted ids
+        """
+        validated_data = self.validated_data
+        created = validated_data["create"]
+        updated = [record for record, _ in validated_data["update"]]
+        deleted = validated_data["delete"]
+
+        now = timezone.now()
+        fields = {"last_modified"}
+        for record, changed_fields in validated_data["update"]:
+            record.last_modified = now
+            fields |= changed_fields
+
+        with transaction.atomic():
+            if deleted:
+                self.context["queryset"].filter(pk__in=deleted).delete()
+            if updated:
+                HolidayRecord.objects.bulk_update(updated, sorted(fields))
+            if created:
+                HolidayRecord.objects.bulk_create(created)
+
+        # Bulk queries don't send signals, see util.read_replica and tasks.leave_days
+        if get_read_alias() is not None:
+            mark_write(self.context["holiday_user"].user_id)
+        refresh_leave_days_for_records(
+            self.context["holiday_user"].pk, created + updated
+        )
+        update_ledger_for_records(self.context["holiday_user"].pk, created + updated)
+        leave_cache.invalidate_users([self.context["holiday_user"].user_id])
+
+        return dict(created=created, updated=updated, deleted=deleted)
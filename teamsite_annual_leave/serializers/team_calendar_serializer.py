@@ -0,0 +1,21 @@
+from rest_framework import serializers
+
+
+class TeamCalendarUserSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    username = serializers.CharField()
+    name = serializers.CharField()
+    spans = serializers.ListField(child=serializers.ListField())
+
+
+class TeamCalendarClosureSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    title = serializers.CharField()
+
+
+class TeamCalendarSerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    columns = serializers.ListField(child=serializers.ListField())
+    closures = TeamCalendarClosureSerializer(many=True)
+    users = TeamCalendarUserSerializer(many=True)
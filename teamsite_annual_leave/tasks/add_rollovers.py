@@ -1,16 +1,22 @@
+from collections import namedtuple
+from contextlib import nullcontext
 from datetime import date
+from decimal import Decimal
 from math import ceil
 
-import reversion
-from django.contrib.auth import get_user_model
-from django.db.models import Q
+from django.db import transaction
 from django.utils import timezone
-from holiday.models.holiday_plan import HolidayPlanCacheLookup
-from holiday.models.holiday_record import HolidayRecord
-from holiday.models.holiday_record_type import HolidayRecordType
-from holiday.util.holiday_export import get_user_reports
 
-User = get_user_model()
+from ..models.holiday_plan import HolidayPlanCacheLookup
+from ..models.holiday_record import HolidayRecord
+from ..models.holiday_record_type import HolidayRecordType
+from ..models.holiday_user import HolidayUser
+from ..models.leave_event import LeaveEvent
+from ..util import leave_cache
+from ..util.holiday_report import generate_holiday_reports
+from .leave_ledger import update_ledger_for_year
+
+RolloverChange = namedtuple("RolloverChange", ["user", "previous", "amount"])
 
 
 def populate_record(record, year, rollover_amount):
@@ -21,49 +27,138 @@ def populate_record(record, year, rollover_amount):
     record.comment = f"Rollover calculated {timezone.now()}"
 
 
-def add_rollovers(year, users=None, max_rollover=5):
+def _get_reversion():
+    """
+    :return: the reversion module, or None if django-reversion isn't installed
+    """
+    try:
+        import reversion
+    except ImportError:  # pragma: no cover
+        return None
+    return reversion
+
+
+def _revision(reversion):
+    if reversion is None:
+        return nullcontext()
+    return reversion.create_revision()
+
+
+def calculate_rollovers(year, users=None, max_rollover=5):
+    """
+    Calculates the rollover from `year` into the next year without writing anything. All users are
+    calculated from one batch of reports, so the cost does not grow with a query per user.
+
+    :param year: the year to roll over from
+    :param users: optional queryset or list of Users to limit the calculation to
+    :param max_rollover: the maximum number of days that can be carried over
+    :return: list of RolloverChange tuples with the currently recorded and the calculated amount
+    """
     new_years_eve = date(year, 12, 31)
     new_years_day = date(year + 1, 1, 1)
-    rollover_type = HolidayRecordType.objects.get(code="ROL")
-
-    HolidayRecord.objects.filter(
-        Q(record_type=rollover_type)
-        & (Q(start_date=new_years_day) | Q(start_date=new_years_eve))
-    ).delete()
+    rollover_type = HolidayRecordType.objects.get_for_code("ROL")
+
+    holiday_users = HolidayUser.objects.select_related("user").order_by(
+        "user__username"
+    )
+    if users is not None:
+        holiday_users = holiday_users.filter(user__in=users)
+
+    existing = {}
+    for record in HolidayRecord.objects.filter(
+        user__in=holiday_users,
+        record_type=rollover_type,
+        start_date__in=(new_years_eve, new_years_day),
+    ):
+        user_existing = existing.setdefault(record.user_id, {})
+        user_existing[record.start_date] = (
+            user_existing.get(record.start_date, 0) + record.adjustment
+        )
 
-    users = User.objects.filter(holidays__isnull=False).order_by("username")
-    reports = get_user_reports(users, year)
     plan_lookup = HolidayPlanCacheLookup()
+    reports = generate_holiday_reports(holiday_users, year, plan_lookup=plan_lookup)
+
+    changes = []
+    for user in holiday_users:
+        report = reports[user.pk]
+        user_existing = existing.get(user.pk, {})
 
-    for report in reports:
-        user = report[0]
-        remainder = report[1].get("remainder", 0)
-        remainder_rounded = ceil(remainder * 2) / 2
+        rollover_amount = Decimal(0)
+        if len(report["details"]) > 0:
+            # The remainder already includes any rollover recorded by a previous run
+            remainder = report["remainder"] - user_existing.get(new_years_eve, 0)
+            remainder_rounded = Decimal(ceil(remainder * 2)) / 2
+            rollover_amount = max(min(remainder_rounded, max_rollover), 0)
 
-        rollover_amount = min(remainder_rounded, max_rollover)
+            plan = plan_lookup.get_for_user_and_date(user, new_years_day)
+            if plan is None or plan.allowance == 0:
+                rollover_amount = Decimal(0)
 
-        plan = plan_lookup.get_for_user_and_date(user, new_years_day)
-        if plan.allowance == 0:
-            rollover_amount = 0
+        changes.append(
+            RolloverChange(
+                user, user_existing.get(new_years_day, Decimal(0)), rollover_amount
+            )
+        )
 
-        if rollover_amount > 0:
-            end_record = HolidayRecord()
-            end_record.user = user.holidays
-            end_record.start_date = new_years_eve
-            end_record.record_type = rollover_type
+    return changes
 
-            start_record = HolidayRecord()
-            start_record.user = user.holidays
-            start_record.start_date = new_years_day
-            start_record.record_type = rollover_type
 
-            populate_record(end_record, year, -rollover_amount)
-            populate_record(start_record, year, rollover_amount)
+def add_rollovers(year, users=None, max_rollover=5, dry_run=False):
+    """
+    Adds the rollover records from `year` into the next year. Only users whose rollover has changed
+    are rewritten, in a single transaction and revision.
 
-            # Declare a new revision block.
-            with reversion.create_revision():
-                end_record.save()
-                start_record.save()
+    :param dry_run: if True, only calculate what would change
+    :return: list of RolloverChange tuples for the users whose rollover changed
+    """
+    new_years_eve = date(year, 12, 31)
+    new_years_day = date(year + 1, 1, 1)
 
-                # Store some meta-information.
-                reversion.set_comment("Automatically created rollover allowances")
+    changes = [
+        c
+        for c in calculate_rollovers(year, users=users, max_rollover=max_rollover)
+        if c.previous != c.amount
+    ]
+    if dry_run or len(changes) == 0:
+        return changes
+
+    rollover_type = HolidayRecordType.objects.get_for_code("ROL")
+    records = []
+    for change in changes:
+        if change.amount <= 0:
+            continue
+
+        end_record = HolidayRecord(
+            user=change.user, start_date=new_years_eve, record_type=rollover_type
+        )
+        start_record = HolidayRecord(
+            user=change.user, start_date=new_years_day, record_type=rollover_type
+        )
+
+        populate_record(end_record, year, -change.amount)
+        populate_record(start_record, year, change.amount)
+        records += [end_record, start_record]
+
+    reversion = _get_reversion()
+    with transaction.atomic(), _revision(reversion):
+        HolidayRecord.objects.filter(
+            user__in=[c.user for c in changes],
+            record_type=rollover_type,
+            start_date__in=(new_years_eve, new_years_day),
+        ).delete()
+        HolidayRecord.objects.bulk_create(records)
+
+        if reversion is not None:
+            if reversion.is_registered(HolidayRecord):
+                for record in records:
+                    reversion.add_to_revision(record)
+            reversion.set_comment("Automatically created rollover allowances")
+
+        leave_cache.invalidate_users([c.user.user_id for c in changes])
+        for change in changes:
+            for ledger_year in (year, year + 1):
+                update_ledger_for_year(
+                    change.user.pk, ledger_year, kind=LeaveEvent.ROLLOVER
+                )
+
+    return changes
@@ -0,0 +1,84 @@
+from contextlib import ExitStack
+
+from django.utils import timezone
+
+from ..models.holiday_user import HolidayUser
+from ..models.holiday_year import HolidayYear
+from ..util import leave_cache, snapshot
+from ..util.holiday_report import _generate_holiday_reports
+from ..util.locks import year_lock
+from .holiday_plan_tasks import recalculate_user_plans
+
+# Users are locked and snapshotted this many at a time
+BATCH_SIZE = 100
+
+
+def close_year(year, users=None):
+    """
+    Freezes the leave ledger for a year. Each user's report, including their rollover and last
+    confirmation, is stored on their HolidayYear. From then on reports for the year are served from
+    the snapshot and plan changes no longer recalculate it, until the year is reopened.
+
+    The users' years are locked while their reports are generated and stored, so that a plan
+    recalculation can't change the records in between.
+
+    :param users: optional queryset or list of Users to limit the operation to
+    :return: list of the HolidayUsers whose year was closed
+    """
+    holiday_users = HolidayUser.objects.select_related("user").order_by(
+        "user__username"
+    )
+    if users is not None:
+        holiday_users = holiday_users.filter(user__in=users)
+    holiday_users = list(holiday_users)
+
+    closed = []
+    for start in range(0, len(holiday_users), BATCH_SIZE):
+        closed += _close_batch(holiday_users[start : start + BATCH_SIZE], year)
+    return closed
+
+
+def _close_batch(holiday_users, year):
+    with ExitStack() as stack:
+        states = {}
+        # Always lock in the same order as recalculate_user_plans to avoid deadlocks
+        for user in sorted(holiday_users, key=lambda u: u.pk):
+            states[user.pk] = stack.enter_context(year_lock(user, year))
+
+        to_close = [u for u in holiday_users if not states[u.pk].is_closed]
+        if len(to_close) == 0:
+            return []
+
+        # Generated from the primary rather than the cache, as the snapshot is never updated
+        reports = _generate_holiday_reports(to_close, year)
+        now = timezone.now()
+        for user in to_close:
+            states[user.pk].closed = now
+            states[user.pk].snapshot = snapshot.dumps(reports[user.pk])
+        HolidayYear.objects.bulk_update(
+            [states[u.pk] for u in to_close], ["closed", "snapshot"]
+        )
+
+    leave_cache.invalidate_users([u.user_id for u in to_close])
+    return to_close
+
+
+def reopen_year(year, users=None):
+    """
+    Reopens a closed year, discarding the snapshots. The plan records for the year are brought up to
+    date with any plan changes made while it was closed.
+
+    :param users: optional queryset or list of Users to limit the operation to
+    :return: list of the HolidayUsers whose year was reopened
+    """
+    states = HolidayYear.objects.filter(year=year, closed__isnull=False)
+    if users is not None:
+        states = states.filter(user__user__in=users)
+    reopened = [s.user for s in states.select_related("user__user")]
+
+    states.update(closed=None, snapshot=None)
+    leave_cache.invalidate_users([u.user_id for u in reopened])
+
+    for user in reopened:
+        recalculate_user_plans(user, [year])
+    return reopened
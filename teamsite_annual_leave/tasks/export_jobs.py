@@ -0,0 +1,267 @@
+import hashlib
+import logging
+import os
+import tempfile
+import time
+import traceback
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db.models import Count, Max
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ..models.confirmation import Confirmation
+from ..models.export_job import ExportJob
+from ..models.holiday_plan import HolidayPlan
+from ..models.holiday_record import HolidayRecord
+from ..models.holiday_user import HolidayUser
+from ..util import get_records_change_key
+from ..util.holiday_export import create_holiday_report
+
+logger = logging.getLogger(__name__)
+
+# Increment when the workbook layout changes so cached artifacts are no longer reused
+EXPORT_VERSION = 1
+
+# Share of the progress bar given to generating the user reports, the sheets get the rest
+USERS_PROGRESS_SHARE = 60
+
+# Seconds without progress after which a running job's worker is presumed dead
+DEFAULT_STALE_AFTER = 30 * 60
+
+# Seconds finished jobs and their workbooks are kept for
+DEFAULT_MAX_AGE = 7 * 24 * 60 * 60
+
+
+def get_export_storage():
+    location = getattr(settings, "ANNUAL_LEAVE_EXPORT_DIR", None) or os.path.join(
+        tempfile.gettempdir(), "teamsite-annual-leave-exports"
+    )
+    return FileSystemStorage(location=location)
+
+
+def get_export_change_key(config):
+    """
+    Changes whenever anything that goes into an export does
+    """
+    confirmations = Confirmation.objects.aggregate(
+        count=Count("id"), last=Max("confirmed")
+    )
+    users = HolidayUser.objects.aggregate(count=Count("id"), last=Max("id"))
+    key = [
+        get_records_change_key(HolidayRecord.objects.all()),
+        get_records_change_key(HolidayPlan.objects.all()),
+        f"{confirmations['count']}.{confirmations['last']}",
+        f"{users['count']}.{users['last']}",
+    ]
+    if "u" in config:  # The upcoming calendar starts from the current week
+        key.append(date.today().isoformat())
+    return ":".join(key)
+
+
+def get_export_cache_key(year, usernames, config):
+    change_key = get_export_change_key(config)
+    key = f"{EXPORT_VERSION}|{year}|{usernames or ''}|{config}|{change_key}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _artifact_name(cache_key):
+    return f"{cache_key}.xlsx"
+
+
+def fail_stale_jobs():
+    """
+    Fails running jobs that have not reported progress for ANNUAL_LEAVE_EXPORT_STALE_AFTER seconds,
+    e.g. because their worker was killed, so that identical requests are queued afresh rather than
+    waiting on them.
+
+    :return: the number of jobs failed
+    """
+    stale_after = getattr(
+        settings, "ANNUAL_LEAVE_EXPORT_STALE_AFTER", DEFAULT_STALE_AFTER
+    )
+    now = timezone.now()
+    return (
+        ExportJob.objects.filter(status=ExportJob.RUNNING)
+        .annotate(last_seen=Coalesce("heartbeat", "started"))
+        .filter(last_seen__lt=now - timedelta(seconds=stale_after))
+        .update(
+            status=ExportJob.FAILED,
+            error="The worker running the export stopped responding",
+            finished=now,
+        )
+    )
+
+
+def cleanup_exports():
+    """
+    Deletes jobs that finished more than ANNUAL_LEAVE_EXPORT_MAX_AGE seconds ago, and the workbooks
+    older than that which no remaining job refers to.
+
+    :return: tuple of the numbers of jobs and workbooks deleted
+    """
+    max_age = getattr(settings, "ANNUAL_LEAVE_EXPORT_MAX_AGE", DEFAULT_MAX_AGE)
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+
+    jobs, _ = ExportJob.objects.filter(finished__lt=cutoff).delete()
+
+    storage = get_export_storage()
+    if not storage.exists(""):
+        return jobs, 0
+    in_use = set(
+        ExportJob.objects.filter(artifact__isnull=False).values_list(
+            "artifact", flat=True
+        )
+    )
+    artifacts = 0
+    for name in storage.listdir("")[1]:
+        if name not in in_use and storage.get_modified_time(name) < cutoff:
+            storage.delete(name)
+            artifacts += 1
+    return jobs, artifacts
+
+
+def request_export(year, usernames=None, config="csd", requested_by=None):
+    """
+    Queues an export. If an identical export of the current data already exists the job is finished
+    straight away, and if one is already queued or running that job is returned instead.
+
+    :return: the ExportJob
+    """
+    cache_key = get_export_cache_key(year, usernames, config)
+    fail_stale_jobs()
+
+    queued = ExportJob.objects.filter(
+        cache_key=cache_key, status__in=(ExportJob.PENDING, ExportJob.RUNNING)
+    ).first()
+    if queued is not None:
+        return queued
+
+    job = ExportJob(
+        year=year,
+        usernames=usernames,
+        config=config,
+        requested_by=requested_by,
+        cache_key=cache_key,
+    )
+    if get_export_storage().exists(_artifact_name(cache_key)):
+        _finish(job, _artifact_name(cache_key), "Reused cached export")
+    job.save()
+    return job
+
+
+def _finish(job, artifact, message):
+    job.status = ExportJob.DONE
+    job.artifact = artifact
+    job.progress = 100
+    job.progress_message = message
+    job.finished = timezone.now()
+
+
+class ExportProgress:
+    """
+    Records the progress reported by create_holiday_report on the job, at most once per interval
+    """
+
+    def __init__(self, job, interval=1.0):
+        self.job = job
+        self.interval = interval
+        self.last_saved = 0
+
+    def __call__(self, stage, done, total):
+        if stage == "users":
+            percent = USERS_PROGRESS_SHARE * done // total
+            message = f"Generated {done} of {total} user reports"
+        else:
+            percent = (
+                USERS_PROGRESS_SHARE + (100 - USERS_PROGRESS_SHARE) * done // total
+            )
+            message = f"Written {done} of {total} sheets"
+
+        now = time.monotonic()
+        if done < total and now - self.last_saved < self.interval:
+            return
+        self.last_saved = now
+
+        self.job.progress = min(percent, 99)
+        self.job.progress_message = message
+        ExportJob.objects.filter(pk=self.job.pk).update(
+            progress=self.job.progress,
+            progress_message=message,
+            heartbeat=timezone.now(),
+        )
+
+
+def run_export_job(job, workers=1):
+    """
+    Runs an export that has been claimed by a worker. The workbook is written to the export storage,
+    named after the cache key, so later requests for the same data reuse it.
+
+    :param workers: number of processes to generate the user reports with
+    """
+    storage = get_export_storage()
+    job.cache_key = get_export_cache_key(job.year, job.usernames, job.config)
+    name = _artifact_name(job.cache_key)
+
+    try:
+        if storage.exists(name):
+            _finish(job, name, "Reused cached export")
+        else:
+            with tempfile.TemporaryFile() as fh:
+                create_holiday_report(
+                    fh,
+                    job.usernames,
+                    job.year,
+                    config=job.config,
+                    progress=ExportProgress(job),
+                    workers=workers,
+                )
+                fh.seek(0)
+                if not storage.exists(name):
+                    name = storage.save(name, File(fh))
+            _finish(job, name, "Export complete")
+    except Exception:
+        logger.exception("Export job %s failed", job.pk)
+        job.status = ExportJob.FAILED
+        job.error = traceback.format_exc()
+        job.finished = timezone.now()
+
+    job.save()
+    return job
+
+
+def claim_next_job():
+    """
+    Marks the oldest pending job as running. Safe to call from several workers at once, as only one
+    of them can move a job out of pending.
+
+    :return: the claimed ExportJob, or None if there is nothing to do
+    """
+    pending = ExportJob.objects.filter(status=ExportJob.PENDING).order_by("created")
+    for pk in pending.values_list("pk", flat=True)[:10]:
+        now = timezone.now()
+        claimed = ExportJob.objects.filter(pk=pk, status=ExportJob.PENDING).update(
+            status=ExportJob.RUNNING, started=now, heartbeat=now
+        )
+        if claimed:
+            return ExportJob.objects.get(pk=pk)
+    return None
+
+
+def run_pending_jobs(limit=None, workers=1):
+    """
+    :param workers: number of processes to generate the user reports with
+    :return: the number of jobs run
+    """
+    fail_stale_jobs()
+    count = 0
+    while limit is None or count < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_export_job(job, workers=workers)
+        count += 1
+    return count
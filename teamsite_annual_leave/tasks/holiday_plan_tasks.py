@@ -1,161 +1,403 @@
-from datetime import date
+import hashlib
+from contextlib import ExitStack
+from datetime import date, timedelta
+from decimal import Decimal
 
 from django.db import transaction
+from django.db.models import Count
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from django.utils import timezone
 
-from ..models.holiday_plan import WEEKDAYS, HolidayPlan, HolidayPlanCacheLookup
+from ..models.holiday_plan import HolidayPlan
 from ..models.holiday_record import HolidayRecord
 from ..models.holiday_record_type import HolidayRecordType
 from ..models.holiday_user import HolidayUser
+from ..models.holiday_year import HolidayYear
+from ..models.leave_event import LeaveEvent
+from ..util import leave_cache
+from ..util.locks import year_lock
+from .leave_ledger import update_ledger_for_year
+
+# Increment when compute_plan_records changes so stored fingerprints no longer match
+FINGERPRINT_VERSION = 1
 
 
 @receiver([post_save, post_delete], sender=HolidayRecord)
 @receiver([post_save, post_delete], sender=HolidayPlan)
 def holiday_receiver(sender, instance, **kwargs):
     if sender == HolidayPlan:
+        closed_years = HolidayYear.objects.filter(
+            user_id=instance.user_id, closed__isnull=False
+        ).values("year")
         year_list = (
-            HolidayRecord.objects.filter(record_type__code__in=("PH", "CLS"))
+            HolidayRecord.objects.filter(
+                record_type_id__in=HolidayRecordType.objects.ids_for("PH", "CLS")
+            )
+            .exclude(year__in=closed_years)
             .values("year")
             .distinct()
         )
-        for year in year_list:
-            recalculate_plans(instance.user, year["year"])
+        recalculate_user_plans(instance.user, [year["year"] for year in year_list])
+
+
+def _quantize(value):
+    return Decimal(value).quantize(Decimal("0.1"))
+
+
+def _normalize(value):
+    return None if value is None else str(Decimal(value).normalize())
+
+
+def plan_fingerprint(plans, public_holidays, year, record_count):
+    """
+    A fingerprint of everything compute_plan_records depends on, and of how many derived records the
+    year has so that deleted or added ones are noticed
+
+    :param record_count: the number of records derived from the plans for the year
+    """
+    digest = hashlib.sha256(
+        f"{FINGERPRINT_VERSION}:{year}:{record_count}".encode("utf-8")
+    )
+    for p in sorted(plans, key=lambda p: p.start_date):
+        values = [p.pk, p.start_date, _normalize(p.allowance)]
+        values += [_normalize(d) for d in p.days_as_list]
+        digest.update(repr(values).encode("utf-8"))
+    for ph in sorted(public_holidays, key=lambda r: (r.start_date, r.pk)):
+        digest.update(repr([ph.pk, ph.start_date, ph.title]).encode("utf-8"))
+    return digest.hexdigest()
 
 
-def recalculate_plans(user, year):
-    plan_lookup = HolidayPlanCacheLookup()
-    plans = plan_lookup.get_for_user(user)
-    if len(plans) == 0:
-        return
+def compute_plan_records(plans, public_holidays, year, type_entitlement, type_ph_adj):
+    """
+    Calculates the entitlement and public holiday adjustment records derived from a user's plans for a
+    year. Nothing is read from or written to the database.
 
-    with transaction.atomic():
-        type_entitlement = HolidayRecordType.objects.get(code="ENT")
-        type_public_holiday = HolidayRecordType.objects.get(code="PH")
-        type_public_holiday_adjustment = HolidayRecordType.objects.get(code="PHADJ")
+    :param plans: all the plans for a user, in any order
+    :param public_holidays: the public holiday records for the year
+    :return: list of unsaved HolidayRecords
+    """
+    plans = sorted(plans, key=lambda p: p.start_date)
+    end_dates = {
+        p.pk: p_next.start_date - timedelta(days=1)
+        for p, p_next in zip(plans, plans[1:])
+    }
+    public_holiday_count = len(public_holidays)
 
+    def plan_for_date(on_date):
+        found = None
         for p in plans:
-            p.records.filter(year=year).delete()
+            if p.start_date <= on_date:
+                found = p
+        return found
 
-        dt = date(year, 1, 1)
-        p = plan_lookup.get_for_user_and_date(user, dt)
-        if p is not None and p.allowance > 0 and p.start_date != dt:
-            HolidayRecord.objects.create(
-                user=p.user,
+    def ph_correction(p):
+        return (p.week_sum / 5 * public_holiday_count) - public_holiday_count
+
+    records = []
+
+    def add(p, dt, adjustment, title, record_type):
+        records.append(
+            HolidayRecord(
+                user_id=p.user_id,
                 start_date=dt,
                 end_date=dt,
                 year=dt.year,
-                adjustment=p.outstanding_allowance_at_date(dt),
-                title=f"Entitlement Year Start {dt.year}",
-                record_type=type_entitlement,
-                holiday_plan=p,
+                adjustment=_quantize(adjustment),
+                title=title,
+                record_type_id=record_type.pk,
+                holiday_plan_id=p.pk,
+            )
+        )
+
+    dt = date(year, 1, 1)
+    p = plan_for_date(dt)
+    if p is not None and p.allowance > 0 and p.start_date != dt:
+        add(
+            p,
+            dt,
+            p.outstanding_allowance_at_date(dt),
+            f"Entitlement Year Start {dt.year}",
+            type_entitlement,
+        )
+        if p.week_sum < 5:
+            add(
+                p,
+                dt,
+                ph_correction(p),
+                f"Bank Holiday Adjustment Year Start {dt.year}",
+                type_ph_adj,
             )
-            if p.week_sum < 5:
-                public_holiday_count = HolidayRecord.objects.filter(
-                    record_type=type_public_holiday, year=year
-                ).count()
-                ph_correction = (
-                    p.week_sum / 5 * public_holiday_count
-                ) - public_holiday_count
-                HolidayRecord.objects.create(
-                    user=p.user,
-                    start_date=dt,
-                    end_date=dt,
-                    year=dt.year,
-                    adjustment=ph_correction,
-                    title=f"Bank Holiday Adjustment Year Start {dt.year}",
-                    record_type=type_public_holiday_adjustment,
-                    holiday_plan=p,
-                )
 
     for p in plans:
         dt = p.start_date
         if dt.year == year:
             plan_type = "New Plan" if p.allowance > 0 else "Leaving"
-            HolidayRecord.objects.create(
-                user=p.user,
-                start_date=dt,
-                end_date=dt,
-                year=dt.year,
-                adjustment=p.outstanding_allowance_at_date(dt),
-                title=f"Entitlement Year {dt.year} - {plan_type}",
-                record_type_id=1,
-                holiday_plan_id=p.pk,
+            add(
+                p,
+                dt,
+                p.outstanding_allowance_at_date(dt),
+                f"Entitlement Year {dt.year} - {plan_type}",
+                type_entitlement,
             )
             if p.week_sum < 5:
-                public_holiday_count = HolidayRecord.objects.filter(
-                    record_type=type_public_holiday, year=dt.year
-                ).count()
-                ph_correction = (
-                    p.week_sum / 5 * public_holiday_count
-                ) - public_holiday_count
-                HolidayRecord.objects.create(
-                    user=p.user,
-                    start_date=dt,
-                    end_date=dt,
-                    year=dt.year,
-                    adjustment=p.pro_rata_remainder_at_date(dt, ph_correction),
-                    title=f"Bank Holiday Adjustment Year {dt.year} - New Plan",
-                    record_type=type_public_holiday_adjustment,
-                    holiday_plan=p,
+                add(
+                    p,
+                    dt,
+                    p.pro_rata_remainder_at_date(dt, ph_correction(p)),
+                    f"Bank Holiday Adjustment Year {dt.year} - New Plan",
+                    type_ph_adj,
                 )
 
-        dt = p.end_date
+        dt = end_dates.get(p.pk)
         if dt is not None and dt.year == year:
-            HolidayRecord.objects.create(
-                user=p.user,
-                start_date=dt,
-                end_date=dt,
-                year=dt.year,
-                adjustment=-p.outstanding_allowance_at_date(dt),
-                title=f"Entitlement Year {dt.year} - End Plan",
-                record_type_id=1,
-                holiday_plan_id=p.pk,
+            add(
+                p,
+                dt,
+                -p.outstanding_allowance_at_date(dt),
+                f"Entitlement Year {dt.year} - End Plan",
+                type_entitlement,
             )
             if p.week_sum < 5:
-                public_holiday_count = HolidayRecord.objects.filter(
-                    record_type=type_public_holiday, year=dt.year
-                ).count()
-                ph_correction = (
-                    p.week_sum / 5 * public_holiday_count
-                ) - public_holiday_count
-                HolidayRecord.objects.create(
-                    user=p.user,
-                    start_date=dt,
-                    end_date=dt,
-                    year=dt.year,
-                    adjustment=-p.pro_rata_remainder_at_date(dt, ph_correction),
-                    title=f"Bank Holiday Adjustment Year {dt.year} - End Plan",
-                    record_type=type_public_holiday_adjustment,
-                    holiday_plan=p,
+                add(
+                    p,
+                    dt,
+                    -p.pro_rata_remainder_at_date(dt, ph_correction(p)),
+                    f"Bank Holiday Adjustment Year {dt.year} - End Plan",
+                    type_ph_adj,
                 )
 
-    for ph in HolidayRecord.objects.filter(record_type__code="PH", year=year):
-        day_of_week = ph.start_date.weekday()
-        field = f"{WEEKDAYS[day_of_week]}_days"
-
-        p = plan_lookup.get_for_user_and_date(user, ph.start_date)
+    for ph in public_holidays:
+        p = plan_for_date(ph.start_date)
         if p is not None:
-            adjustment = 1 - getattr(p, field)
+            adjustment = 1 - p.get_days_for_day_of_week(ph.start_date.weekday())
             if adjustment > 0:
-                HolidayRecord.objects.create(
-                    user=p.user,
-                    start_date=ph.start_date,
-                    end_date=ph.start_date,
-                    year=ph.start_date.year,
-                    adjustment=adjustment,
-                    title=f"{ph.title} Adjustment",
-                    record_type=type_public_holiday_adjustment,
-                    holiday_plan_id=p.pk,
-                )
+                add(p, ph.start_date, adjustment, f"{ph.title} Adjustment", type_ph_adj)
+
+    return records
+
+
+def _record_key(record):
+    return (
+        record.holiday_plan_id,
+        record.record_type_id,
+        record.start_date,
+        record.title,
+    )
+
+
+def apply_plan_records(existing, desired):
+    """
+    Brings the existing derived records in line with the desired ones, only touching records that
+    differ.
+
+    :return: True if anything was written
+    """
+    existing_by_key = {}
+    for record in existing:
+        existing_by_key.setdefault(_record_key(record), []).append(record)
+
+    to_create = []
+    to_update = []
+    now = timezone.now()
+    for record in desired:
+        matches = existing_by_key.get(_record_key(record))
+        if not matches:
+            to_create.append(record)
+            continue
+
+        current = matches.pop(0)
+        if (current.adjustment, current.end_date, current.year) != (
+            record.adjustment,
+            record.end_date,
+            record.year,
+        ):
+            current.adjustment = record.adjustment
+            current.end_date = record.end_date
+            current.year = record.year
+            current.last_modified = now
+            to_update.append(current)
 
+    to_delete = [r.pk for matches in existing_by_key.values() for r in matches]
 
-def recalculate_all_plans():
+    if to_delete:
+        HolidayRecord.objects.filter(pk__in=to_delete).delete()
+    if to_update:
+        HolidayRecord.objects.bulk_update(
+            to_update, ["adjustment", "end_date", "year", "last_modified"]
+        )
+    if to_create:
+        HolidayRecord.objects.bulk_create(to_create)
+
+    return bool(to_delete or to_update or to_create)
+
+
+class PlanRecalculation:
+    """
+    Recalculates the records derived from holiday plans for many users and years. Plans, public
+    holidays and stored fingerprints are loaded once up front, so users whose inputs have not changed
+    since the last calculation cost no further queries.
+    """
+
+    def __init__(self, users=None, years=None, force=False, states=None):
+        """
+        :param states: optionally the already loaded HolidayYears for the users and years
+        """
+        self.force = force
+
+        plans = HolidayPlan.objects.all()
+        public_holidays = HolidayRecord.objects.filter(
+            record_type_id=HolidayRecordType.objects.id_for("PH")
+        )
+        if users is not None:
+            plans = plans.filter(user__in=users)
+        if years is not None:
+            public_holidays = public_holidays.filter(year__in=years)
+        if states is None:
+            states = HolidayYear.objects.all()
+            if users is not None:
+                states = states.filter(user__in=users)
+            if years is not None:
+                states = states.filter(year__in=years)
+
+        self.plans = {}
+        for plan in plans:
+            self.plans.setdefault(plan.user_id, []).append(plan)
+
+        self.public_holidays = {}
+        for ph in public_holidays:
+            self.public_holidays.setdefault(ph.year, []).append(ph)
+
+        derived = HolidayRecord.objects.filter(holiday_plan__isnull=False)
+        if users is not None:
+            derived = derived.filter(holiday_plan__user__in=users)
+        if years is not None:
+            derived = derived.filter(year__in=years)
+        self.record_counts = {
+            (row["holiday_plan__user"], row["year"]): row["count"]
+            for row in derived.order_by()
+            .values("holiday_plan__user", "year")
+            .annotate(count=Count("id"))
+        }
+
+        self.checksums = {}
+        self.closed = set()
+        for state in states:
+            self.checksums[(state.user_id, state.year)] = state.checksum
+            if state.is_closed:
+                self.closed.add((state.user_id, state.year))
+
+        self.type_entitlement = HolidayRecordType.objects.get_for_code("ENT")
+        self.type_public_holiday_adjustment = HolidayRecordType.objects.get_for_code(
+            "PHADJ"
+        )
+
+    def _checksum(self, user, year, record_count=None):
+        if record_count is None:
+            record_count = self.record_counts.get((user.pk, year), 0)
+        return plan_fingerprint(
+            self.plans.get(user.pk, []),
+            self.public_holidays.get(year, []),
+            year,
+            record_count,
+        )
+
+    def is_current(self, user, year):
+        """
+        True if the records for the year were calculated from the current inputs, or the year is closed
+        """
+        if len(self.plans.get(user.pk, [])) == 0 or (user.pk, year) in self.closed:
+            return True
+        return self.checksums.get((user.pk, year)) == self._checksum(user, year)
+
+    def recalculate(self, user, year):
+        """
+        Callers should hold the year_lock for the user and year, see recalculate_user_plans.
+
+        :param user: a HolidayUser
+        :return: True if any records changed
+        """
+        plans = self.plans.get(user.pk, [])
+        if len(plans) == 0 or (user.pk, year) in self.closed:
+            return False
+
+        public_holidays = self.public_holidays.get(year, [])
+        if not self.force and self.checksums.get((user.pk, year)) == self._checksum(
+            user, year
+        ):
+            return False
+
+        desired = compute_plan_records(
+            plans,
+            public_holidays,
+            year,
+            self.type_entitlement,
+            self.type_public_holiday_adjustment,
+        )
+
+        with transaction.atomic():
+            existing = HolidayRecord.objects.filter(holiday_plan__user=user, year=year)
+            changed = apply_plan_records(existing, desired)
+            checksum = self._checksum(user, year, len(desired))
+            HolidayYear.objects.update_or_create(
+                user=user,
+                year=year,
+                defaults=dict(checksum=checksum, last_calculated=timezone.now()),
+            )
+
+        self.checksums[(user.pk, year)] = checksum
+        self.record_counts[(user.pk, year)] = len(desired)
+        if changed:
+            # The derived records are written in bulk, without signals
+            update_ledger_for_year(user.pk, year, kind=LeaveEvent.PLAN)
+            leave_cache.invalidate_users([user.user_id])
+        return changed
+
+
+def recalculate_user_plans(user, years, force=False):
+    """
+    Recalculates a user's plan records for the given years while holding the locks for those years.
+
+    Concurrent triggers are coalesced through the fingerprint: the plans are only loaded once the locks
+    are held, so a trigger that queued behind a recalculation of the same inputs finds the fingerprint
+    already matches and writes nothing. A trigger whose own changes are not yet committed still sees
+    them, and recalculates.
+
+    :param user: a HolidayUser
+    :return: True if any records changed
+    """
+    years = sorted(set(years))
+
+    changed = False
+    with ExitStack() as stack:
+        states = []
+        for year in years:  # Always lock in the same order to avoid deadlocks
+            states.append(stack.enter_context(year_lock(user, year)))
+
+        recalculation = PlanRecalculation(
+            users=[user], years=years, force=force, states=states
+        )
+        for year in years:
+            changed = recalculation.recalculate(user, year) or changed
+
+    return changed
+
+
+def recalculate_plans(user, year, force=False):
+    return recalculate_user_plans(user, [year], force=force)
+
+
+def recalculate_all_plans(force=False):
     year_list = (
-        HolidayRecord.objects.filter(record_type__code__in=("PH", "CLS"))
+        HolidayRecord.objects.filter(
+            record_type_id__in=HolidayRecordType.objects.ids_for("PH", "CLS")
+        )
         .values("year")
         .distinct()
     )
+    years = [year["year"] for year in year_list]
+    recalculation = PlanRecalculation(years=years)
     for user in HolidayUser.objects.all():
-        for year in year_list:
-            recalculate_plans(user, year["year"])
+        stale = [y for y in years if force or not recalculation.is_current(user, y)]
+        if stale:
+            recalculate_user_plans(user, stale, force=force)
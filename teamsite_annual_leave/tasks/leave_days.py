@@ -0,0 +1,211 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ..models.holiday_plan import HolidayPlan
+from ..models.holiday_record import HolidayRecord
+from ..models.holiday_record_type import HolidayRecordType
+from ..models.holiday_user import HolidayUser
+from ..models.leave_day import LeaveDay
+from ..util.date import daterange
+from .previous_dates import get_previous_dates, track_when
+
+
+def is_enabled():
+    """
+    The LeaveDay table is only kept up to date when ANNUAL_LEAVE_LEAVE_DAYS is set
+    """
+    return getattr(settings, "ANNUAL_LEAVE_LEAVE_DAYS", False)
+
+
+track_when(is_enabled)
+
+
+def _plan_for(plans, day):
+    found = None
+    for p in plans:
+        if p.start_date <= day:
+            found = p
+    return found
+
+
+def _closure_for(system_records, day):
+    for r in system_records:
+        if r.start_date <= day <= r.end_date:
+            return r.adjustment if r.adjustment is not None else 1
+    return 0
+
+
+def compute_leave_days(user_id, plans, records, system_records, start, end):
+    """
+    Calculates a user's LeaveDays between two dates in the same way build_holiday_report calculates
+    the allowance used. Nothing is read from or written to the database.
+
+    :param plans: the user's plans ordered by start date
+    :param records: the user's leave records overlapping the dates
+    :param system_records: public holidays and office closures overlapping the dates
+    :return: list of unsaved LeaveDays, one per day from the user's first plan
+    """
+    days = {}
+    for day, _ in daterange(start, end):
+        plan = _plan_for(plans, day)
+        if plan is None:
+            continue
+        working = plan.get_days_for_day_of_week(day.weekday())
+        days[day] = LeaveDay(
+            user_id=user_id,
+            date=day,
+            year=day.year,
+            working=working if plan.allowance != 0 else 0,
+            closure=_closure_for(system_records, day),
+        )
+
+    for record in records:
+        for day, type in daterange(
+            max(record.start_date, start), min(record.end_date, end)
+        ):
+            leave_day = days.get(day)
+            if leave_day is None:
+                continue
+            days_requested = 1
+            if record.start_half and day == record.start_date:
+                days_requested = 0.5
+            elif record.end_half and day == record.end_date:
+                days_requested = 0.5
+
+            plan = _plan_for(plans, day)
+            taken = Decimal(
+                min(plan.get_days_for_day_of_week(day.weekday()), days_requested)
+            )
+            taken = max(0, taken - leave_day.closure)
+            leave_day.taken += taken
+            leave_day.year = record.year
+
+    return list(days.values())
+
+
+def _get_materialized_range():
+    result = LeaveDay.objects.aggregate(start=Min("date"), end=Max("date"))
+    if result["start"] is None:
+        return None, None
+    return date(result["start"].year, 1, 1), date(result["end"].year, 12, 31)
+
+
+def rebuild_leave_days(start, end, users=None):
+    """
+    Recalculates the LeaveDays between two dates for the users, or everyone. Inputs are loaded with a
+    query each and rows are replaced with bulk queries.
+
+    :param users: optional queryset or list of HolidayUsers
+    :return: the number of rows written
+    """
+    holiday_users = HolidayUser.objects.all() if users is None else users
+    leave_type = HolidayRecordType.objects.id_for("AL")
+
+    plans = {}
+    for plan in HolidayPlan.objects.filter(user__in=holiday_users).order_by(
+        "start_date"
+    ):
+        plans.setdefault(plan.user_id, []).append(plan)
+
+    records = {}
+    for record in HolidayRecord.objects.filter(
+        user__in=holiday_users,
+        record_type_id=leave_type,
+        start_date__lte=end,
+        end_date__gte=start,
+    ):
+        records.setdefault(record.user_id, []).append(record)
+
+    system_records = list(
+        HolidayRecord.objects.filter(
+            user__isnull=True,
+            record_type_id__in=HolidayRecordType.objects.ids_for("PH", "CLS"),
+            start_date__lte=end,
+            end_date__gte=start,
+        )
+    )
+
+    rows = []
+    for user_id, user_plans in plans.items():
+        rows += compute_leave_days(
+            user_id, user_plans, records.get(user_id, []), system_records, start, end
+        )
+
+    existing = LeaveDay.objects.filter(date__gte=start, date__lte=end)
+    if users is not None:
+        existing = existing.filter(user__in=holiday_users)
+    with transaction.atomic():
+        existing.delete()
+        LeaveDay.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def rebuild_leave_year(year, users=None):
+    return rebuild_leave_days(date(year, 1, 1), date(year, 12, 31), users=users)
+
+
+def refresh_leave_days(start, end, users=None):
+    """
+    Brings the LeaveDays between two dates up to date after a change, if the table is enabled. Only
+    years that have been built, e.g. with the rebuild-leave-days command, are kept up to date.
+    """
+    if not is_enabled():
+        return
+    first, last = _get_materialized_range()
+    if first is None:
+        return
+    start, end = max(start, first), min(end, last)
+    if start <= end:
+        rebuild_leave_days(start, end, users=users)
+
+
+def _record_range(record):
+    start, end = record.start_date, record.end_date
+    previous = get_previous_dates(record)
+    if previous is not None:
+        start, end = min(start, previous[0]), max(end, previous[1])
+    return start, end
+
+
+def refresh_leave_days_for_records(user, records):
+    """
+    For writes that don't send signals, e.g. bulk_create. Use previous_dates.set_previous_dates on
+    changed records to also refresh the days they moved from.
+    """
+    if not is_enabled() or len(records) == 0:
+        return
+    ranges = [_record_range(r) for r in records]
+    refresh_leave_days(
+        min(start for start, _ in ranges), max(end for _, end in ranges), users=[user]
+    )
+
+
+@receiver([post_save, post_delete], sender=HolidayRecord)
+def leave_days_record_receiver(sender, instance, raw=False, **kwargs):
+    if not is_enabled() or raw:
+        return
+    start, end = _record_range(instance)
+    if instance.user_id is None:
+        if instance.record_type_id in HolidayRecordType.objects.ids_for("PH", "CLS"):
+            refresh_leave_days(start, end)
+    elif instance.record_type_id == HolidayRecordType.objects.id_for("AL"):
+        refresh_leave_days(start, end, users=[instance.user_id])
+
+
+@receiver([post_save, post_delete], sender=HolidayPlan)
+def leave_days_plan_receiver(sender, instance, raw=False, **kwargs):
+    if not is_enabled() or raw:
+        return
+    previous = get_previous_dates(instance)
+    start = (
+        instance.start_date
+        if previous is None
+        else min(instance.start_date, previous[0])
+    )
+    refresh_leave_days(start, date.max - timedelta(days=1), users=[instance.user_id])
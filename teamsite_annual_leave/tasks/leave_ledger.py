@@ -0,0 +1,375 @@
+from contextlib import ExitStack
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ..models.holiday_plan import HolidayPlan
+from ..models.holiday_record import HolidayRecord
+from ..models.holiday_record_type import HolidayRecordType
+from ..models.holiday_user import HolidayUser
+from ..models.leave_event import LeaveEvent
+from ..models.leave_snapshot import LeaveSnapshot
+from ..util.locks import year_lock
+from .leave_days import compute_leave_days
+from .previous_dates import get_previous_dates, track_when
+
+# A user's balance for a year is snapshotted after this many events
+DEFAULT_SNAPSHOT_EVERY = 50
+
+
+def is_enabled():
+    """
+    The ledger is only appended to when ANNUAL_LEAVE_LEDGER is set. Build it with the
+    rebuild-leave-ledger command first.
+    """
+    return getattr(settings, "ANNUAL_LEAVE_LEDGER", False)
+
+
+track_when(is_enabled)
+
+
+def _snapshot_every():
+    return getattr(
+        settings, "ANNUAL_LEAVE_LEDGER_SNAPSHOT_EVERY", DEFAULT_SNAPSHOT_EVERY
+    )
+
+
+def record_contributions(user_id, records, plans=None):
+    """
+    Each record's effect on the balance for its year, as in the holiday report: the adjustment minus
+    the allowance used
+
+    :param plans: optionally the user's plans ordered by start date
+    :return: dict of record id to Decimal
+    """
+    leave_type = HolidayRecordType.objects.id_for("AL")
+    leave = [r for r in records if r.record_type_id == leave_type]
+    taken = {}
+    if leave:
+        if plans is None:
+            plans = list(
+                HolidayPlan.objects.filter(user_id=user_id).order_by("start_date")
+            )
+        start = min(r.start_date for r in leave)
+        end = max(r.end_date for r in leave)
+        system_records = list(
+            HolidayRecord.objects.filter(
+                user__isnull=True,
+                record_type_id__in=HolidayRecordType.objects.ids_for("PH", "CLS"),
+                start_date__lte=end,
+                end_date__gte=start,
+            )
+        )
+        for record in leave:
+            days = compute_leave_days(
+                user_id,
+                plans,
+                [record],
+                system_records,
+                record.start_date,
+                record.end_date,
+            )
+            taken[record.pk] = sum((d.taken for d in days), Decimal(0))
+
+    return {
+        r.pk: Decimal(r.adjustment or 0) - taken.get(r.pk, Decimal(0)) for r in records
+    }
+
+
+def _kind_for(record_type_id, previous):
+    code = HolidayRecordType.objects.code_for(record_type_id)
+    if code == "AL":
+        return LeaveEvent.BOOKED if previous is None else LeaveEvent.CHANGED
+    if code == "ROL":
+        return LeaveEvent.ROLLOVER
+    return LeaveEvent.ENTITLEMENT
+
+
+def _latest_events(user_id, record_ids):
+    """
+    :return: dict of record id to the record's last event
+    """
+    latest = {}
+    for event in LeaveEvent.objects.filter(
+        user_id=user_id, record_id__in=record_ids
+    ).order_by("id"):
+        latest[event.record_id] = event
+    return latest
+
+
+def _append(user_id, records, removed_ids, kind=None, plans=None):
+    """
+    Each event's delta is worked out from the record's last event, so the years are locked while it
+    is read and the new events written. Otherwise two concurrent changes to the same record would both
+    build on the same last event and the balance would drift for good.
+    """
+    contributions = record_contributions(user_id, records, plans=plans)
+    record_ids = set(contributions) | set(removed_ids)
+    years = {r.year for r in records} | set(
+        LeaveEvent.objects.filter(user_id=user_id, record_id__in=record_ids)
+        .values_list("year", flat=True)
+        .distinct()
+    )
+
+    with ExitStack() as stack:
+        for year in sorted(years):  # Always lock in the same order to avoid deadlocks
+            stack.enter_context(year_lock(user_id, year))
+        return _append_locked(user_id, records, removed_ids, contributions, kind)
+
+
+def _append_locked(user_id, records, removed_ids, contributions, kind):
+    latest = _latest_events(user_id, set(contributions) | set(removed_ids))
+
+    events = []
+    for record in records:
+        previous = latest.get(record.pk)
+        if previous is not None and previous.year != record.year:
+            # Moved to another year: take it out of the old one
+            if previous.contribution != 0:
+                events.append(
+                    LeaveEvent(
+                        user_id=user_id,
+                        year=previous.year,
+                        kind=kind or LeaveEvent.CHANGED,
+                        record_id=record.pk,
+                        delta=-previous.contribution,
+                        contribution=0,
+                    )
+                )
+            previous = None
+
+        contribution = contributions[record.pk]
+        before = Decimal(0) if previous is None else previous.contribution
+        if previous is None or contribution != before:
+            events.append(
+                LeaveEvent(
+                    user_id=user_id,
+                    year=record.year,
+                    kind=kind or _kind_for(record.record_type_id, previous),
+                    record_id=record.pk,
+                    delta=contribution - before,
+                    contribution=contribution,
+                )
+            )
+
+    for record_id in removed_ids:
+        previous = latest.get(record_id)
+        if previous is not None and previous.contribution != 0:
+            events.append(
+                LeaveEvent(
+                    user_id=user_id,
+                    year=previous.year,
+                    kind=kind or LeaveEvent.CANCELLED,
+                    record_id=record_id,
+                    delta=-previous.contribution,
+                    contribution=0,
+                )
+            )
+
+    if events:
+        LeaveEvent.objects.bulk_create(events)
+        for year in {e.year for e in events}:
+            _maybe_snapshot(user_id, year)
+    return events
+
+
+def update_ledger_for_records(user_id, records=(), removed_ids=(), kind=None):
+    """
+    Appends events for the changes to some of a user's records, if the ledger is enabled. Also for
+    writes that don't send signals, e.g. bulk_create.
+
+    :param user_id: the pk of the HolidayUser
+    :param records: the records as they are now
+    :param removed_ids: ids of records that have been deleted
+    :param kind: the LeaveEvent kind, by default worked out from each record
+    :return: list of the new LeaveEvents
+    """
+    if not is_enabled() or (len(records) == 0 and len(removed_ids) == 0):
+        return []
+    return _append(user_id, list(records), list(removed_ids), kind=kind)
+
+
+def update_ledger_for_year(user_id, year, kind=None):
+    """
+    Appends events for any differences between a user's records for a year and the ledger, e.g. after
+    their plans change
+    """
+    if not is_enabled():
+        return []
+    records = list(HolidayRecord.objects.filter(user_id=user_id, year=year))
+    current = {r.pk for r in records}
+    removed_ids = (
+        LeaveEvent.objects.filter(user_id=user_id, year=year)
+        .exclude(record_id__in=current)
+        .values_list("record_id", flat=True)
+        .distinct()
+    )
+    return _append(user_id, records, list(removed_ids), kind=kind)
+
+
+def _maybe_snapshot(user_id, year):
+    last = (
+        LeaveSnapshot.objects.filter(user_id=user_id, year=year)
+        .order_by("-event_id")
+        .first()
+    )
+    tail = LeaveEvent.objects.filter(user_id=user_id, year=year)
+    if last is not None:
+        tail = tail.filter(id__gt=last.event_id)
+    result = tail.aggregate(count=Count("id"), last=Max("id"), delta=Sum("delta"))
+    if (result["count"] or 0) < _snapshot_every():
+        return None
+    balance = result["delta"] + (last.balance if last is not None else 0)
+    return LeaveSnapshot.objects.create(
+        user_id=user_id, year=year, event_id=result["last"], balance=balance
+    )
+
+
+def take_snapshots(years=None, users=None):
+    """
+    Snapshots every user's balance for the years that have changed since their last snapshot, e.g.
+    monthly from the snapshot-leave-ledger command
+
+    :param users: optional queryset or list of HolidayUsers
+    :return: the number of snapshots taken
+    """
+    events = LeaveEvent.objects.all()
+    snapshots = LeaveSnapshot.objects.all()
+    if years is not None:
+        events = events.filter(year__in=years)
+        snapshots = snapshots.filter(year__in=years)
+    if users is not None:
+        events = events.filter(user__in=users)
+        snapshots = snapshots.filter(user__in=users)
+
+    taken = {
+        (s["user_id"], s["year"]): s["last"]
+        for s in snapshots.values("user_id", "year").annotate(last=Max("event_id"))
+    }
+    to_create = [
+        LeaveSnapshot(
+            user_id=e["user_id"],
+            year=e["year"],
+            event_id=e["last"],
+            balance=e["balance"],
+        )
+        for e in events.values("user_id", "year").annotate(
+            last=Max("id"), balance=Sum("delta")
+        )
+        if taken.get((e["user_id"], e["year"]), 0) < e["last"]
+    ]
+    LeaveSnapshot.objects.bulk_create(to_create)
+    return len(to_create)
+
+
+def rebuild_ledger(year, users=None):
+    """
+    Starts the ledger for a year again from the current records, with an opening event per record and
+    a snapshot per user
+
+    :param users: optional queryset or list of HolidayUsers
+    :return: the number of events written
+    """
+    holiday_users = HolidayUser.objects.all() if users is None else users
+
+    records = {}
+    for record in HolidayRecord.objects.filter(user__in=holiday_users, year=year):
+        records.setdefault(record.user_id, []).append(record)
+    plans = {}
+    for plan in HolidayPlan.objects.filter(user__in=records.keys()).order_by(
+        "start_date"
+    ):
+        plans.setdefault(plan.user_id, []).append(plan)
+
+    count = 0
+    with transaction.atomic():
+        events = LeaveEvent.objects.filter(year=year)
+        snapshots = LeaveSnapshot.objects.filter(year=year)
+        if users is not None:
+            events = events.filter(user__in=holiday_users)
+            snapshots = snapshots.filter(user__in=holiday_users)
+        events.delete()
+        snapshots.delete()
+
+        for user_id, user_records in records.items():
+            count += len(
+                _append(
+                    user_id,
+                    user_records,
+                    [],
+                    kind=LeaveEvent.OPENING,
+                    plans=plans.get(user_id, []),
+                )
+            )
+        take_snapshots(years=[year], users=users)
+    return count
+
+
+def _closure_receiver(instance):
+    """
+    A public holiday or office closure changes the days used by everyone's leave on those days
+    """
+    start, end = instance.start_date, instance.end_date
+    previous = get_previous_dates(instance)
+    if previous is not None:
+        start, end = min(start, previous[0]), max(end, previous[1])
+
+    records = {}
+    for record in HolidayRecord.objects.filter(
+        record_type_id=HolidayRecordType.objects.id_for("AL"),
+        start_date__lte=end,
+        end_date__gte=start,
+    ):
+        records.setdefault(record.user_id, []).append(record)
+    for user_id, user_records in records.items():
+        update_ledger_for_records(user_id, user_records, kind=LeaveEvent.CLOSURE)
+
+
+@receiver(post_save, sender=HolidayRecord)
+def leave_ledger_record_receiver(sender, instance, raw=False, **kwargs):
+    if not is_enabled() or raw:
+        return
+    if instance.user_id is not None:
+        update_ledger_for_records(instance.user_id, [instance])
+    elif instance.record_type_id in HolidayRecordType.objects.ids_for("PH", "CLS"):
+        _closure_receiver(instance)
+
+
+@receiver(post_delete, sender=HolidayRecord)
+def leave_ledger_delete_receiver(sender, instance, **kwargs):
+    if not is_enabled():
+        return
+    if instance.user_id is not None:
+        kind = _kind_for(instance.record_type_id, None)
+        if kind == LeaveEvent.BOOKED:
+            kind = LeaveEvent.CANCELLED
+        update_ledger_for_records(
+            instance.user_id, removed_ids=[instance.pk], kind=kind
+        )
+    elif instance.record_type_id in HolidayRecordType.objects.ids_for("PH", "CLS"):
+        _closure_receiver(instance)
+
+
+@receiver([post_save, post_delete], sender=HolidayPlan)
+def leave_ledger_plan_receiver(sender, instance, raw=False, **kwargs):
+    """
+    Plans change the days used by leave from their start, see also PlanRecalculation for the
+    entitlement records
+    """
+    if not is_enabled() or raw:
+        return
+    start = instance.start_date
+    previous = get_previous_dates(instance)
+    if previous is not None:
+        start = min(start, previous[0])
+    years = (
+        HolidayRecord.objects.filter(user_id=instance.user_id, end_date__gte=start)
+        .values_list("year", flat=True)
+        .distinct()
+    )
+    for year in sorted(years):
+        update_ledger_for_year(instance.user_id, year, kind=LeaveEvent.PLAN)
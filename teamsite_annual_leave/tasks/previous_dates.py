@@ -0,0 +1,51 @@
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from ..models.holiday_plan import HolidayPlan
+from ..models.holiday_record import HolidayRecord
+
+# Callables that say whether a feature using the previous dates is enabled, see track_when
+_conditions = []
+
+
+def track_when(is_enabled):
+    """
+    Remembers the dates before each change while is_enabled() is true, e.g. for the leave days and the
+    leave ledger, which both need to update what depended on the old dates
+    """
+    _conditions.append(is_enabled)
+
+
+def get_previous_dates(instance):
+    """
+    :return: the (start_date, end_date) of a HolidayRecord or HolidayPlan before it was changed, or
+             None for new objects and when no feature needs them
+    """
+    return getattr(instance, "_previous_dates", None)
+
+
+def set_previous_dates(instance, start_date, end_date):
+    """
+    For writes that don't send signals, e.g. bulk_update
+    """
+    instance._previous_dates = (start_date, end_date)
+
+
+@receiver(pre_save, sender=HolidayRecord)
+@receiver(pre_save, sender=HolidayPlan)
+def previous_dates_receiver(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None or not any(c() for c in _conditions):
+        return
+    if sender == HolidayRecord:
+        instance._previous_dates = (
+            HolidayRecord.objects.filter(pk=instance.pk)
+            .values_list("start_date", "end_date")
+            .first()
+        )
+    else:
+        previous = (
+            HolidayPlan.objects.filter(pk=instance.pk)
+            .values_list("start_date", flat=True)
+            .first()
+        )
+        instance._previous_dates = previous and (previous, previous)
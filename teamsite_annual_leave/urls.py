@@ -1,12 +1,35 @@
 from django.urls import include, path, re_path
 from rest_framework import routers
 
-from .views import ConfirmationViewSet, HolidayRecordViewSet
+from . import async_views
+from .views import (
+    AvailabilityViewSet,
+    ConfirmationViewSet,
+    ExportJobViewSet,
+    HolidayRecordViewSet,
+    TeamCalendarViewSet,
+)
 
 router = routers.DefaultRouter()
 router.register(r"me", HolidayRecordViewSet, basename="holiday")
 router.register(r"confirmation", ConfirmationViewSet, basename="holiday/confirmation")
+router.register(r"availability", AvailabilityViewSet, basename="holiday/availability")
+router.register(r"calendar", TeamCalendarViewSet, basename="holiday/calendar")
+router.register(r"export", ExportJobViewSet, basename="holiday/export")
+
+# Async versions of the read-heavy actions for ASGI deployments, see async_views
+async_urlpatterns = [
+    path("me/", async_views.records, name="async-holiday-list"),
+    path("me/activity/", async_views.activity, name="async-holiday-activity"),
+    path("me/public/", async_views.public, name="async-holiday-public"),
+    path(
+        "confirmation/",
+        async_views.confirmations,
+        name="async-holiday-confirmation-list",
+    ),
+]
 
 urlpatterns = [
     path("", include(router.urls)),
+    path("async/", include(async_urlpatterns)),
 ]
@@ -1,9 +1,12 @@
+import hashlib
+
 from django.contrib.contenttypes.models import ContentType
-from django.db.models import Count
+from django.db.models import Count, Max
 
 from ..models.confirmation import Confirmation
 from ..models.holiday_plan import HolidayPlan
 from ..models.holiday_record import HolidayRecord
+from ..models.holiday_record_type import HolidayRecordType
 
 
 def get_holiday_change_key():
@@ -18,3 +21,27 @@ def get_holiday_change_key():
 
     key = f"{c1}.{c2}.{c3}"
     return key
+
+
+def get_records_change_key(queryset):
+    """
+    A cheap key that changes whenever a record in the queryset is added, changed or removed. Uses a
+    single aggregate query rather than loading the records.
+    """
+    result = queryset.aggregate(count=Count("id"), last_modified=Max("last_modified"))
+    last_modified = result["last_modified"]
+    if last_modified is not None:
+        last_modified = last_modified.timestamp()
+    return f"{result['count']}.{last_modified}"
+
+
+def get_record_types_change_key():
+    """
+    A key that changes whenever a record type is added, renamed or removed, or becomes a system type.
+    Read from the database rather than the manager's cache, which other processes only clear when
+    they restart.
+    """
+    record_types = HolidayRecordType.objects.order_by("pk").values_list(
+        "pk", "code", "title", "system_option"
+    )
+    return hashlib.sha1(repr(list(record_types)).encode("utf-8")).hexdigest()
@@ -0,0 +1,216 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+
+from ..models.holiday_user import HolidayUser
+from .holiday_export import (
+    DETAIL_COLUMNS,
+    SUMMARY_COLUMNS,
+    get_detail_rows,
+    get_summary_rows,
+    get_users,
+)
+from .holiday_report import generate_holiday_reports
+from .read_replica import reporting
+
+# The same rows as the Summary and Detailed Report sheets of the XLSX export
+DATASETS = {
+    "summary": (SUMMARY_COLUMNS, get_summary_rows),
+    "detail": (DETAIL_COLUMNS, get_detail_rows),
+}
+
+
+@lru_cache(maxsize=None)
+def get_pyarrow():
+    """
+    :return: the pyarrow module, or None if it isn't installed
+    """
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def _plain(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+class CsvWriter:
+    extension = "csv"
+
+    def __init__(self, fh, columns):
+        self.stream = io.TextIOWrapper(
+            fh, encoding="utf-8", newline="", write_through=True
+        )
+        self.writer = csv.writer(self.stream)
+        self.writer.writerow([c.name for c in columns])
+
+    def write_rows(self, rows):
+        self.writer.writerows(
+            ["" if v is None else _plain(v) for v in row] for row in rows
+        )
+
+    def close(self):
+        self.stream.flush()
+        self.stream.detach()  # Leave the underlying file open for the caller
+
+
+class NdjsonWriter:
+    extension = "ndjson"
+
+    def __init__(self, fh, columns):
+        self.fh = fh
+        self.names = [c.name for c in columns]
+
+    def write_rows(self, rows):
+        lines = [
+            json.dumps({n: _plain(v) for n, v in zip(self.names, row)}) + "\n"
+            for row in rows
+        ]
+        self.fh.write("".join(lines).encode("utf-8"))
+
+    def close(self):
+        pass
+
+
+class ArrowWriter:
+    """
+    Writes an Arrow IPC file, or Parquet with parquet=True. Each call to write_rows becomes one record
+    batch or row group. Requires pyarrow.
+    """
+
+    def __init__(self, fh, columns, parquet=False):
+        pyarrow = self.pyarrow = get_pyarrow()
+        if pyarrow is None:
+            raise ImportError("pyarrow is required for the Arrow and Parquet formats")
+
+        types = {
+            "str": pyarrow.string(),
+            "int": pyarrow.int64(),
+            "float": pyarrow.float64(),
+            "date": pyarrow.date32(),
+            "datetime": pyarrow.timestamp("us"),
+        }
+        self.columns = columns
+        self.schema = pyarrow.schema([(c.name, types[c.type]) for c in columns])
+        if parquet:
+            self.writer = pyarrow.parquet.ParquetWriter(fh, self.schema)
+        else:
+            self.writer = pyarrow.ipc.new_file(fh, self.schema)
+
+    def write_rows(self, rows):
+        pyarrow = self.pyarrow
+        arrays = []
+        for ix, column in enumerate(self.columns):
+            values = [row[ix] for row in rows]
+            if column.type == "float":
+                values = [None if v is None else float(v) for v in values]
+            arrays.append(pyarrow.array(values, type=self.schema.field(ix).type))
+        batch = pyarrow.record_batch(arrays, schema=self.schema)
+        self.writer.write_table(pyarrow.Table.from_batches([batch]))
+
+    def close(self):
+        self.writer.close()
+
+
+class ArrowFileWriter(ArrowWriter):
+    extension = "arrow"
+
+
+class ParquetWriter(ArrowWriter):
+    extension = "parquet"
+
+    def __init__(self, fh, columns):
+        super().__init__(fh, columns, parquet=True)
+
+
+FORMATS = {
+    "csv": CsvWriter,
+    "ndjson": NdjsonWriter,
+    "arrow": ArrowFileWriter,
+    "parquet": ParquetWriter,
+}
+
+
+def get_writer_class(format):
+    """
+    :param format: one of FORMATS, or "columnar" for Parquet if pyarrow is installed and NDJSON if not
+    """
+    if format == "columnar":
+        return ParquetWriter if get_pyarrow() is not None else NdjsonWriter
+    return FORMATS[format]
+
+
+def iter_report_batches(years, usernames=None, batch_size=200):
+    """
+    Generates the reports for the users a batch at a time, in username order within each year, using
+    the same selection as the XLSX export.
+
+    :return: iterator of lists of (user, report) tuples
+    """
+    users = list(get_users(usernames))
+    for year in years:
+        for start in range(0, len(users), batch_size):
+            chunk = users[start : start + batch_size]
+            holiday_users = {
+                hu.user_id: hu for hu in HolidayUser.objects.filter(user__in=chunk)
+            }
+            reports = generate_holiday_reports(list(holiday_users.values()), year)
+
+            batch = []
+            for user in chunk:
+                holiday_user = holiday_users.get(user.pk)
+                if holiday_user is None:
+                    continue
+                report = reports[holiday_user.pk]
+                if len(report["details"]) > 0 and report.get("allowance", 0) > 0:
+                    batch.append((user, report))
+            yield batch
+
+
+def write_analytics_export(
+    fh, dataset, format, years, usernames=None, row_group_size=10000
+):
+    """
+    Streams a dataset to fh (opened in binary mode). Rows are handed to the writer in groups of
+    row_group_size as the reports are generated, so memory use does not grow with the extract.
+
+    :param dataset: "summary" or "detail"
+    :param format: see get_writer_class
+    :return: the number of rows written
+    """
+    with reporting():
+        return _write_analytics_export(
+            fh, dataset, format, years, usernames, row_group_size
+        )
+
+
+def _write_analytics_export(fh, dataset, format, years, usernames, row_group_size):
+    columns, get_rows = DATASETS[dataset]
+    writer = get_writer_class(format)(fh, columns)
+
+    count = 0
+    group = []
+    for batch in iter_report_batches(years, usernames=usernames):
+        for row in get_rows(batch):
+            group.append(row)
+            if len(group) >= row_group_size:
+                writer.write_rows(group)
+                count += len(group)
+                group = []
+    if group:
+        writer.write_rows(group)
+        count += len(group)
+
+    writer.close()
+    return count
@@ -0,0 +1,232 @@
+import threading
+from datetime import date, timedelta
+
+from ..models.holiday_plan import HolidayPlan
+from ..models.holiday_record import HolidayRecord
+from ..models.holiday_user import HolidayUser
+from ..util import get_records_change_key, leave_cache
+from ..util.read_replica import reporting_for_everyone
+
+OUT_LEAVE = "leave"
+OUT_HALF_DAY = "half_day"
+OUT_NON_WORKING = "non_working"
+OUT_CLOSED = "closed"
+
+
+def _popcount(value):
+    return bin(value).count("1")
+
+
+class AvailabilityIndex:
+    """
+    Day × user availability for a date range. Each day holds a set of integer bitmaps with one bit per
+    user, so "who is out" and headcount questions are answered with a handful of bitwise operations
+    rather than by iterating records.
+    """
+
+    def __init__(self, start, end, users):
+        self.start = start
+        self.end = end
+        self.users = list(users)
+        self.positions = {u.pk: ix for ix, u in enumerate(self.users)}
+
+        days = (end - start).days + 1
+        self.employed = [
+            0
+        ] * days  # Covered by a plan with an allowance, i.e. not yet left
+        self.working = [0] * days  # Scheduled to work according to their plan
+        self.leave = [0] * days  # Full day of leave
+        self.half_day = [0] * days  # Half day of leave
+        self.closed = [0] * days  # Public holiday / office closure - 1 is a full day
+
+    def _offset(self, day):
+        if not self.start <= day <= self.end:
+            raise KeyError(f"{day} is outside the index range {self.start}/{self.end}")
+        return (day - self.start).days
+
+    def _days(self, start, end):
+        start = max(start, self.start)
+        end = min(end, self.end)
+        for offset in range((start - self.start).days, (end - self.start).days + 1):
+            yield offset
+
+    def add_plans(self, user_id, plans):
+        """
+        Marks the working days of a user. Plans must be ordered by start date.
+        """
+        bit = 1 << self.positions[user_id]
+        for ix, plan in enumerate(plans):
+            if plan.allowance == 0:
+                continue
+            plan_end = (
+                plans[ix + 1].start_date - timedelta(days=1)
+                if ix + 1 < len(plans)
+                else self.end
+            )
+            weights = plan.days_as_list
+            for offset in self._days(plan.start_date, plan_end):
+                self.employed[offset] |= bit
+                day = self.start + timedelta(days=offset)
+                if weights[day.weekday()] > 0:
+                    self.working[offset] |= bit
+
+    def add_leave(self, user_id, start_date, end_date, start_half, end_half):
+        bit = 1 << self.positions[user_id]
+        for offset in self._days(start_date, end_date):
+            day = self.start + timedelta(days=offset)
+            if (start_half and day == start_date) or (end_half and day == end_date):
+                self.half_day[offset] |= bit
+            else:
+                self.leave[offset] |= bit
+
+    def add_closure(self, start_date, end_date, adjustment):
+        amount = adjustment if adjustment is not None else 1
+        for offset in self._days(start_date, end_date):
+            self.closed[offset] = max(self.closed[offset], amount)
+
+    def available_mask(self, day):
+        """Users working a full day on the given day"""
+        offset = self._offset(day)
+        if self.closed[offset] > 0:
+            return 0
+        return self.working[offset] & ~self.leave[offset] & ~self.half_day[offset]
+
+    def out_on(self, day):
+        """
+        Returns a list of (HolidayUser, reason) tuples for everyone not available for the full day.
+        Users without a plan for the day, or who have left, are not included.
+        """
+        offset = self._offset(day)
+        employed = self.employed[offset]
+        closed = self.closed[offset] > 0
+        working = self.working[offset]
+        leave = self.leave[offset]
+        half_day = self.half_day[offset]
+
+        result = []
+        for ix, user in enumerate(self.users):
+            bit = 1 << ix
+            if not employed & bit:
+                continue
+            elif not working & bit:
+                reason = OUT_NON_WORKING
+            elif leave & bit:
+                reason = OUT_LEAVE
+            elif closed:
+                reason = OUT_CLOSED
+            elif half_day & bit:
+                reason = OUT_HALF_DAY
+            else:
+                continue
+            result.append((user, reason))
+        return result
+
+    def headcount(self, day):
+        """Returns a tuple of (available, partially available) user counts for the given day"""
+        offset = self._offset(day)
+        if self.closed[offset] >= 1:
+            return 0, 0
+        present = self.working[offset] & ~self.leave[offset]
+        partial = present & self.half_day[offset]
+        if self.closed[offset] > 0:
+            return 0, _popcount(present)
+        return _popcount(present & ~partial), _popcount(partial)
+
+    def first_all_available(self, user_ids, start, end):
+        """
+        The first day between start and end (inclusive) on which all the given users are working a full
+        day, or None.
+        """
+        mask = 0
+        for user_id in user_ids:
+            mask |= 1 << self.positions[user_id]
+
+        for offset in self._days(start, end):
+            day = self.start + timedelta(days=offset)
+            if self.available_mask(day) & mask == mask:
+                return day
+        return None
+
+
+def build_availability_index(start, end):
+    """
+    Builds an AvailabilityIndex from plans, leave records and company closures using three queries.
+    """
+    users = HolidayUser.objects.select_related("user").order_by("user__username")
+    index = AvailabilityIndex(start, end, users)
+
+    plans_by_user = {}
+    for plan in HolidayPlan.objects.filter(start_date__lte=end).order_by(
+        "user_id", "start_date"
+    ):
+        plans_by_user.setdefault(plan.user_id, []).append(plan)
+    for user_id, plans in plans_by_user.items():
+        index.add_plans(user_id, plans)
+
+    records = HolidayRecord.objects.filter(
+        start_date__lte=end, end_date__gte=start
+    ).values_list(
+        "user_id",
+        "record_type__system_option",
+        "start_date",
+        "end_date",
+        "start_half",
+        "end_half",
+        "adjustment",
+    )
+    for user_id, system, start_date, end_date, start_half, end_half, adj in records:
+        if user_id is None:
+            index.add_closure(start_date, end_date, adj)
+        elif not system:
+            index.add_leave(user_id, start_date, end_date, start_half, end_half)
+
+    return index
+
+
+_lock = threading.Lock()
+_indexes = {}
+
+
+def get_availability_change_key():
+    return "/".join(
+        [
+            get_records_change_key(HolidayRecord.objects.all()),
+            get_records_change_key(HolidayPlan.objects.all()),
+            str(HolidayUser.objects.count()),
+        ]
+    )
+
+
+def _build_year_index(year):
+    with reporting_for_everyone():
+        return build_availability_index(date(year, 1, 1), date(year, 12, 31))
+
+
+def get_availability_index(year):
+    """
+    Returns the AvailabilityIndex for a calendar year. Indexes are held in-process and rebuilt when
+    the records or plans change, or held in the leave cache if it is enabled.
+    """
+    if leave_cache.is_enabled():
+        return leave_cache.cached(
+            "availability",
+            year,
+            [leave_cache.GLOBAL, leave_cache.USERS],
+            lambda: _build_year_index(year),
+        )
+
+    change_key = get_availability_change_key()
+    with _lock:
+        cached = _indexes.get(year)
+        if cached is not None and cached[0] == change_key:
+            return cached[1]
+
+    index = _build_year_index(year)
+    with _lock:
+        _indexes[year] = (change_key, index)
+    return index
+
+
+def clear_availability_indexes():
+    with _lock:
+        _indexes.clear()
@@ -24,7 +24,7 @@ def parse_bank_holiday_def(value: str) -> HolidayRecord:
     type_name = match.group(4)
     title = match.group(5)
 
-    type_model = HolidayRecordType.objects.get(title=type_name.strip())
+    type_model = HolidayRecordType.objects.get_for_title(type_name.strip())
 
     if end is None:
         end = start
@@ -68,7 +68,10 @@ def load_holiday_fixtures(fixtures_file=None):
 
 def synchronise_holidays(holidays, testrun=False):
     current_records = HolidayRecord.objects.filter(
-        record_type__title__in=["Public Holiday", "Office Closed"]
+        record_type__in=[
+            HolidayRecordType.objects.get_for_title("Public Holiday"),
+            HolidayRecordType.objects.get_for_title("Office Closed"),
+        ]
     )
     current_records_by_date = {r.start_date: r for r in current_records}
 
@@ -0,0 +1,151 @@
+import time
+from collections import namedtuple
+
+from ..models.holiday_user import HolidayUser
+from ..routers import read_from
+from . import leave_cache
+from .availability import get_availability_index
+from .holiday_report import _generate_holiday_reports, get_system_records
+from .parallel_reports import can_run_in_parallel, generate_reports_parallel
+from .public_holidays import get_public_holiday_data
+from .read_replica import reporting, split_by_read_database
+
+# What one stage of the warm-up covered: entries already cached, entries calculated, and the total
+WarmupStage = namedtuple("WarmupStage", ["name", "year", "cached", "warmed", "total"])
+
+
+class CacheWarmup:
+    """
+    Fills the leave cache for some years: the public holidays and closures, then everyone's report
+    summaries, then the availability index. Summaries are generated in batches, across worker
+    processes if requested, and the warm-up stops between batches once the time budget is spent.
+    """
+
+    def __init__(self, years, workers=1, budget=None, chunk_size=50, progress=None):
+        """
+        :param budget: optional number of seconds to stop after
+        :param progress: optional callable, called as progress(stage, done, total)
+        """
+        self.years = years
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.deadline = None if budget is None else time.monotonic() + budget
+        self.stages = []
+
+    def out_of_time(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def _warm(self, name, year, kind, total, warm):
+        """
+        Runs `warm` and records its coverage from the difference in the cache stats. Stages that
+        are not reached in time are recorded as not covered.
+        """
+        if self.out_of_time():
+            self.stages.append(WarmupStage(name, year, 0, 0, total))
+            return self.stages[-1]
+
+        before = leave_cache.get_cache_stats().get(kind, dict(hits=0, misses=0))
+        warm()
+        after = leave_cache.get_cache_stats().get(kind, dict(hits=0, misses=0))
+        stage = WarmupStage(
+            name,
+            year,
+            after["hits"] - before["hits"],
+            after["misses"] - before["misses"],
+            total,
+        )
+        self.stages.append(stage)
+        if self.progress is not None:
+            self.progress(f"{name} {year}", stage.cached + stage.warmed, total)
+        return stage
+
+    def _generate(self, holiday_users, year):
+        """
+        As in generate_holiday_reports, users who have just written are read from the primary
+        """
+        reports = {}
+        for alias, users in split_by_read_database(holiday_users):
+            with read_from(alias):
+                reports.update(self._generate_from(users, year))
+        return reports
+
+    def _generate_from(self, holiday_users, year):
+        # A single slice would be generated in this process anyway
+        if (
+            self.workers == 1
+            or len(holiday_users) <= self.chunk_size
+            or not can_run_in_parallel()
+        ):
+            return _generate_holiday_reports(holiday_users, year)
+        reports = dict(
+            generate_reports_parallel(
+                [u.user for u in holiday_users],
+                year,
+                self.workers,
+                chunk_size=self.chunk_size,
+            )
+        )
+        return {u.pk: reports[u.user] for u in holiday_users}
+
+    def _warm_summaries(self, holiday_users, year):
+        batch_size = self.chunk_size * self.workers
+        for start in range(0, len(holiday_users), batch_size):
+            if self.out_of_time():
+                break
+            leave_cache.get_cached_summaries(
+                holiday_users[start : start + batch_size],
+                year,
+                lambda missing: self._generate(missing, year),
+            )
+            if self.progress is not None:
+                self.progress(
+                    f"summaries {year}",
+                    min(start + batch_size, len(holiday_users)),
+                    len(holiday_users),
+                )
+
+    def run(self):
+        """
+        :return: list of WarmupStage
+        """
+        holiday_users = list(
+            HolidayUser.objects.select_related("user").order_by("user__username")
+        )
+        with reporting():
+            for year in self.years:
+                self._warm(
+                    "closures", year, "closures", 1, lambda: get_system_records(year)
+                )
+                self._warm(
+                    "public holidays",
+                    year,
+                    "public_holidays",
+                    1,
+                    lambda: get_public_holiday_data(year),
+                )
+                self._warm(
+                    "summaries",
+                    year,
+                    "summary",
+                    len(holiday_users),
+                    lambda: self._warm_summaries(holiday_users, year),
+                )
+                self._warm(
+                    "availability",
+                    year,
+                    "availability",
+                    1,
+                    lambda: get_availability_index(year),
+                )
+        return self.stages
+
+
+def get_coverage(stages):
+    """
+    :return: the fraction of the entries that are now cached
+    """
+    total = sum(s.total for s in stages)
+    if total == 0:
+        return 1.0
+    return sum(s.cached + s.warmed for s in stages) / total
@@ -0,0 +1,28 @@
+from ..models.holiday_year import HolidayYear
+
+
+def find_closed(records):
+    """
+    Reports for closed years are served from their snapshots, so their records must not change. One
+    query for any number of records.
+
+    :param records: saved or unsaved HolidayRecords, as they are or will be
+    :return: the set of the (HolidayUser pk, year) pairs of the records whose year is closed
+    """
+    keys = {(r.user_id, r.year) for r in records if r.user_id is not None}
+    if len(keys) == 0:
+        return set()
+    closed = HolidayYear.objects.filter(
+        user__in={user_id for user_id, _ in keys},
+        year__in={year for _, year in keys},
+        closed__isnull=False,
+    ).values_list("user_id", "year")
+    return keys & set(closed)
+
+
+def is_closed(record):
+    return len(find_closed([record])) > 0
+
+
+def closed_message(year):
+    return f"{year} is closed"
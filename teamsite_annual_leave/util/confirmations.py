@@ -0,0 +1,30 @@
+def diff_records(before, after):
+    """
+    Compares two sets of confirmed records, as returned by `Confirmation.records`.
+
+    :return: dict of added and removed records, and the changed fields of records in both
+    """
+    added = [after[pk] for pk in sorted(after.keys() - before.keys())]
+    removed = [before[pk] for pk in sorted(before.keys() - after.keys())]
+    changed = []
+    for pk in sorted(before.keys() & after.keys()):
+        fields = {
+            field: [value, after[pk].get(field)]
+            for field, value in before[pk].items()
+            if after[pk].get(field) != value
+        }
+        if fields:
+            changed.append(dict(id=pk, changes=fields))
+    return dict(added=added, removed=removed, changed=changed)
+
+
+def diff_confirmations(before, after):
+    """
+    Compares what was confirmed in two confirmations. Confirmations sharing a snapshot are identical,
+    so their snapshots are not read at all.
+
+    :param before: the earlier Confirmation, or None to compare against nothing
+    """
+    if before is not None and before.snapshot_id == after.snapshot_id:
+        return dict(added=[], removed=[], changed=[])
+    return diff_records({} if before is None else before.records, after.records)
@@ -1,6 +1,3 @@
-from xlsxwriter.utility import xl_col_to_name
-
-
 class ColumnCounter:
     def __init__(self, start=0):
         self.current = start
@@ -33,6 +30,8 @@ class ColumnCounter:
         :param count: How many columns to include in range
         :return: the Excel range string, e.g. 'A:A'
         """
+        from xlsxwriter.utility import xl_col_to_name
+
         start_range = xl_col_to_name(self.current)
         self.current += count
         end_range = xl_col_to_name(self.current - 1)
@@ -0,0 +1,25 @@
+import importlib
+
+# The optional extras in pyproject.toml, by the top level modules they install
+EXTRAS = {
+    "report": ["xlsxwriter", "xlrd", "tablib"],
+    "api": ["rest_framework"],
+    "graphql": ["graphene", "graphene_django", "django_filters"],
+}
+
+
+def require(module, extra):
+    """
+    Imports a module from an optional extra when it is first needed, rather than when the importing
+    module loads, so commands and workers that don't use the extra don't pay for it.
+
+    :param module: the module to import, e.g. "xlsxwriter"
+    :param extra: the extra that installs it, named in the error if it is missing
+    :return: the module
+    """
+    try:
+        return importlib.import_module(module)
+    except ImportError as e:
+        raise ImportError(
+            f"{module} is not installed. Install teamsite-annual-leave[{extra}] to use this feature."
+        ) from e
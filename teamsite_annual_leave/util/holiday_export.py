@@ -1,12 +1,10 @@
 import calendar
+from collections import namedtuple
 from datetime import date, datetime, timedelta
 from functools import reduce
 from io import BytesIO
 from math import ceil
 
-import pytz
-import xlsxwriter
-from dateutil.relativedelta import relativedelta
 from django.contrib.auth.models import User
 from django.db.models import Q
 from django.utils import timezone
@@ -15,7 +13,11 @@ from ..models.holiday_plan import HolidayPlan, HolidayPlanCacheLookup
 from ..models.holiday_record import HolidayRecord
 from ..models.holiday_user import HolidayUser
 from ..util.excel_column_counter import ColumnCounter
+from ..util.extras import require
 from ..util.holiday_report import _search_system_records, generate_holiday_report
+from ..util.parallel_reports import generate_reports_parallel, get_chunk_size
+from ..util.read_replica import reporting
+from ..util.running_balance import get_running_balance_rows, supports_running_balance
 
 
 def get_users(usernames=None):
@@ -32,68 +34,148 @@ def get_users(usernames=None):
     return users.order_by("username")
 
 
-def get_user_reports(users, year):
+def get_user_reports(users, year, progress=None, workers=1):
+    """
+    :param progress: optional callable, called as progress(stage, done, total) after each user
+    :param workers: number of processes to generate the reports with, see generate_reports_parallel
+    """
+    with reporting():
+        return _get_user_reports(users, year, progress, workers)
+
+
+def _get_user_reports(users, year, progress, workers):
+    users = list(users)
+    if workers > 1:
+        return [
+            (user, report)
+            for user, report in generate_reports_parallel(
+                users,
+                year,
+                workers,
+                chunk_size=get_chunk_size(len(users), workers),
+                progress=progress,
+            )
+            if report is not None and len(report["details"]) > 0
+        ]
+
     reports = []
-    for user in users:
+    for ix, user in enumerate(users):
         report = generate_holiday_report(user, year)
         if report is not None and len(report["details"]) > 0:
             reports.append((user, report))
+        if progress is not None:
+            progress("users", ix + 1, len(users))
     return reports
 
 
-def add_summary_view(workbook, reports):
-    summary_data = []
-
+Column = namedtuple("Column", ["header", "name", "type"])
+
+SUMMARY_COLUMNS = [
+    Column("Email", "email", "str"),
+    Column("Name", "name", "str"),
+    Column("Year", "year", "int"),
+    Column("Allowance", "allowance", "float"),
+    Column("Rollover", "rollover", "float"),
+    Column("Public Holiday Adjustments", "public_holiday_adjustment", "float"),
+    Column("Other Adjustments", "other_adjustments", "float"),
+    Column("Total Debits", "total_allowance", "float"),
+    Column("Total Credits", "total_used", "float"),
+    Column("Remaining", "remainder", "float"),
+    Column("Initial Allowance (-Rollover)", "allowance_minus_rollover", "float"),
+    Column("January to August", "jan_to_aug", "float"),
+    Column("January to August Fraction", "jan_to_aug_frac", "float"),
+    Column("September to November", "sep_to_nov", "float"),
+    Column("Last Confirmed", "last_confirmed", "datetime"),
+]
+
+DETAIL_COLUMNS = [
+    Column("Email", "email", "str"),
+    Column("Name", "name", "str"),
+    Column("Year", "year", "int"),
+    Column("Title", "title", "str"),
+    Column("Start Date", "start_date", "date"),
+    Column("End Date", "end_date", "date"),
+    Column("Adjustment", "adjustment", "float"),
+    Column("Days Taken", "days_taken", "float"),
+    Column("Days Taken (to date)", "days_taken_to_date", "float"),
+    Column("Remaining Days", "remaining_days", "float"),
+    Column("Remaining Days (exact)", "remaining_days_exact", "float"),
+    Column("Approved By", "approved_by", "str"),
+]
+
+
+def get_display_name(user):
+    """
+    The short name from the teamsite profile, falling back to the full name where there is none
+    """
+    profile = getattr(user, "profile", None)
+    if profile is not None:
+        return profile.short_name
+    return user.get_full_name()
+
+
+def get_summary_rows(reports):
+    """
+    :param reports: list of (user, report) tuples
+    :return: iterator of rows in SUMMARY_COLUMNS order
+    """
+    import pytz
+
+    london = pytz.timezone("Europe/London")
     for user, report in reports:
         last_confirmed = report.get("last_confirmed")
         if last_confirmed is not None:
-            last_confirmed = last_confirmed.astimezone(
-                pytz.timezone("Europe/London")
-            ).replace(tzinfo=None)
+            last_confirmed = last_confirmed.astimezone(london).replace(tzinfo=None)
+
+        yield [
+            user.email,
+            get_display_name(user),
+            report["year"],
+            report["allowance"],
+            report["rollover"],
+            report["public_holiday_adjustment"],
+            report["total_allowance"]
+            - report["rollover"]
+            - report["allowance"]
+            - report["public_holiday_adjustment"],
+            report["total_allowance"],
+            report["total_used"],
+            report["remainder"],
+            report["allowance_minus_rollover"],
+            report["jan_to_aug"],
+            report["jan_to_aug_frac"],
+            report["sep_to_nov"],
+            last_confirmed,
+        ]
 
-        summary_data.append(
-            [
+
+def get_detail_rows(reports):
+    """
+    :param reports: list of (user, report) tuples
+    :return: iterator of rows in DETAIL_COLUMNS order
+    """
+    for user, report in reports:
+        name = get_display_name(user)
+        for record in report["details"]:
+            yield [
                 user.email,
-                user.profile.short_name,
+                name,
                 report["year"],
-                report["allowance"],
-                report["rollover"],
-                report["public_holiday_adjustment"],
-                report["total_allowance"]
-                - report["rollover"]
-                - report["allowance"]
-                - report["public_holiday_adjustment"],
-                report["total_allowance"],
-                report["total_used"],
-                report["remainder"],
-                report["allowance_minus_rollover"],
-                report["jan_to_aug"],
-                report["jan_to_aug_frac"],
-                report["sep_to_nov"],
-                last_confirmed,
+                record["title"],
+                record["start"],
+                record["end"],
+                record["adjustment"],
+                record["allowance_used"],
+                record["total_used"],
+                ceil(record["remainder"] * 2) / 2,
+                record["remainder"],
+                record["approved_by"],
             ]
-        )
 
-    summary_columns = [
-        {"header": c}
-        for c in [
-            "Email",
-            "Name",
-            "Year",
-            "Allowance",
-            "Rollover",
-            "Public Holiday Adjustments",
-            "Other Adjustments",
-            "Total Debits",
-            "Total Credits",
-            "Remaining",
-            "Initial Allowance (-Rollover)",
-            "January to August",
-            "January to August Fraction",
-            "September to November",
-            "Last Confirmed",
-        ]
-    ]
+
+def add_summary_view(workbook, reports):
+    summary_data = list(get_summary_rows(reports))
+    summary_columns = [{"header": c.header} for c in SUMMARY_COLUMNS]
 
     pct_format = workbook.add_format()
     pct_format.set_num_format("0%")
@@ -137,60 +219,31 @@ def add_summary_view(workbook, reports):
     worksheet.freeze_panes(1, 2)
 
 
-def add_detail_view(workbook, reports):
-    detailed_data = []
-    for user, report in reports:
-        for record in report["details"]:
-            detailed_data.append(
-                [
-                    user.email,
-                    user.profile.short_name,
-                    report["year"],
-                    record["title"],
-                    record["start"],
-                    record["end"],
-                    record["adjustment"],
-                    record["allowance_used"],
-                    record["total_used"],
-                    ceil(record["remainder"] * 2) / 2,
-                    record["remainder"],
-                    record["approved_by"],
-                ]
-            )
-
-    detailed_columns = [
-        {"header": c}
-        for c in [
-            "Email",
-            "Name",
-            "Year",
-            "Title",
-            "Start Date",
-            "End Date",
-            "Adjustment",
-            "Days Taken",
-            "Days Taken (to date)",
-            "Remaining Days",
-            "Remaining Days (exact)",
-            "Approved By",
-        ]
-    ]
+def add_detail_view(workbook, reports, rows=None):
+    """
+    :param rows: optional iterator of rows in DETAIL_COLUMNS order to use instead of the reports,
+                 e.g. from running_balance.get_running_balance_rows. Rows are written as they are
+                 read.
+    """
+    if rows is None:
+        rows = get_detail_rows(reports)
+    detailed_columns = [{"header": c.header} for c in DETAIL_COLUMNS]
 
     date_format = workbook.add_format()
     date_format.set_num_format("d mmm yyyy")
 
     worksheet = workbook.add_worksheet(name="Detailed Report")
 
+    count = 0
+    for count, row in enumerate(rows, start=1):
+        worksheet.write_row(count, 0, row)
+
     worksheet.add_table(
         0,
         0,
-        len(detailed_data),
+        count,
         len(detailed_columns) - 1,
-        {
-            "data": detailed_data,
-            "columns": detailed_columns,
-            "name": "HolidaysDetailed",
-        },
+        {"columns": detailed_columns, "name": "HolidaysDetailed"},
     )
 
     cc = ColumnCounter()
@@ -206,6 +259,8 @@ def add_detail_view(workbook, reports):
 
 
 def add_calendar(workbook, reports, year, upcoming=False, next_year=None):
+    from dateutil.relativedelta import relativedelta
+
     worksheet = workbook.add_worksheet(name="Calendar")
     if next_year is not None:
         next_year = {r[0]: r[1] for r in next_year}
@@ -323,7 +378,7 @@ def add_calendar(workbook, reports, year, upcoming=False, next_year=None):
         format = format_row_odd if user_row % 2 == 0 else format_row_even
 
         worksheet.write(user_row, 0, user.email, format)
-        worksheet.write(user_row, 1, user.profile.short_name, format)
+        worksheet.write(user_row, 1, get_display_name(user), format)
         worksheet.write_row(user_row, 2, empty_row, format)
 
         for day_of_year in range(0, days_in_year):
@@ -401,7 +456,7 @@ def add_plan_view(workbook):
         plan_rows.append(
             [
                 plan.user.user.email,
-                plan.user.user.profile.short_name,
+                get_display_name(plan.user.user),
                 plan.start_date,
                 plan.end_date,
                 plan.allowance,
@@ -447,32 +502,55 @@ def add_plan_view(workbook):
     worksheet.freeze_panes(1, 2)
 
 
-def create_holiday_report(output, usernames, year, config="csd"):
+def create_holiday_report(
+    output, usernames, year, config="csd", progress=None, workers=1
+):
+    """
+    Writes the holiday report workbook to output. The config string lists the sheets to include:
+    c(alendar), u(pcoming calendar), s(ummary), d(etail) and p(lans).
+
+    :param progress: optional callable, called as progress(stage, done, total) after each user
+                     report and after each sheet
+    :param workers: generate the user reports in this many processes. The workbook is the same as
+                    with a single process.
+    """
+    with reporting():
+        _create_holiday_report(output, usernames, year, config, progress, workers)
+
+
+def _create_holiday_report(output, usernames, year, config, progress, workers):
     users = get_users(usernames)
-    reports = get_user_reports(users, year)
+    reports = get_user_reports(users, year, progress=progress, workers=workers)
     reports = [
         r for r in reports if r[1].get("allowance", 0) > 0
     ]  # Not the most optimal, should consider query filter
 
+    xlsxwriter = require("xlsxwriter", "report")
     workbook = xlsxwriter.Workbook(output)
     # workbook.set_readonly_recommended(True)
 
-    for char in config:
+    for ix, char in enumerate(config):
         if char == "c":
             add_calendar(workbook, reports, year)
         elif char == "u":
             if timezone.now().month >= 6:
-                next_year = get_user_reports(users, year + 1)
+                next_year = get_user_reports(users, year + 1, workers=workers)
             else:
                 next_year = None
             add_calendar(workbook, reports, year, upcoming=True, next_year=next_year)
         elif char == "s":
             add_summary_view(workbook, reports)
         elif char == "d":
-            add_detail_view(workbook, reports)
+            rows = None
+            if supports_running_balance(year, users):
+                rows = get_running_balance_rows(year, users)
+            add_detail_view(workbook, reports, rows=rows)
         elif char == "p":
             add_plan_view(workbook)
         else:
             raise Exception(f"Unknown option string encountered: {config}")
 
+        if progress is not None:
+            progress("sheets", ix + 1, len(config))
+
     workbook.close()
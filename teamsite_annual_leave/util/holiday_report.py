@@ -1,13 +1,20 @@
 from collections import OrderedDict
 from decimal import Decimal
 
+from asgiref.sync import sync_to_async
 from django.db.models import Q
 
 from ..models.confirmation import Confirmation
-from ..models.holiday_plan import HolidayPlanCacheLookup
+from ..models.holiday_plan import HolidayPlan, HolidayPlanCacheLookup
 from ..models.holiday_record import HolidayRecord
+from ..models.holiday_record_type import HolidayRecordType
 from ..models.holiday_user import HolidayUser
+from ..models.holiday_year import HolidayYear
+from ..routers import read_from
+from ..util import snapshot
 from ..util.date import daterange
+from ..util.read_replica import get_read_database, reporting, split_by_read_database
+from . import leave_cache
 
 
 def _search_system_records(records, day):
@@ -16,7 +23,32 @@ def _search_system_records(records, day):
             return r
 
 
+def _get_system_records(year):
+    return HolidayRecord.objects.filter(
+        Q(user__isnull=True) & (Q(year=year) | Q(year=year + 1))
+    ).order_by("start_date")
+
+
+def get_system_records(year):
+    """
+    The public holidays and office closures for a report, from the cache if enabled
+    """
+    return leave_cache.get_cached_system_records(
+        year, lambda: list(_get_system_records(year))
+    )
+
+
 def generate_holiday_report(user, year):
+    """
+    Reads from the read replica, if one is configured, see util.read_replica
+    """
+    with reporting(user):
+        return leave_cache.get_cached_summary(
+            user, year, lambda: _generate_holiday_report(user, year)
+        )
+
+
+def _generate_holiday_report(user, year):
     try:
         user = HolidayUser.objects.get(user=user)
     except HolidayUser.DoesNotExist:
@@ -24,23 +56,143 @@ def generate_holiday_report(user, year):
 
     year = int(year)
 
+    closed = (
+        HolidayYear.objects.filter(user=user, year=year, closed__isnull=False)
+        .values_list("snapshot", flat=True)
+        .first()
+    )
+    if closed is not None:
+        return snapshot.loads(closed)
+
     plan_lookup = HolidayPlanCacheLookup()
+    if leave_cache.is_enabled():
+        plan_lookup.prime(
+            [user],
+            leave_cache.get_cached_plans(
+                user,
+                lambda: list(
+                    HolidayPlan.objects.filter(user=user).order_by("-start_date")
+                ),
+            ),
+        )
     holiday_records = HolidayRecord.objects.filter(user=user, year=year).order_by(
-        "start_date"
+        "start_date", "id"
     )
-    system_records = HolidayRecord.objects.filter(
-        Q(user__isnull=True) & (Q(year=year) | Q(year=year + 1))
-    ).order_by("start_date")
+    system_records = get_system_records(year)
 
     try:
         last_confirmation = Confirmation.objects.filter(user=user, year=year).latest()
     except Confirmation.DoesNotExist:
         last_confirmation = None
 
+    return build_holiday_report(
+        user, year, holiday_records, system_records, plan_lookup, last_confirmation
+    )
+
+
+async def agenerate_holiday_report(user, year):
+    """
+    Async version of generate_holiday_report for ASGI views. Django runs async ORM queries one at a
+    time on a single thread, so the report is built by the sync loader in one hop to that thread
+    rather than a hop per query.
+    """
+    with read_from(await sync_to_async(get_read_database)(user)):
+        return await leave_cache.aget_cached_summary(
+            user, year, lambda: sync_to_async(_generate_holiday_report)(user, year)
+        )
+
+
+def generate_holiday_reports(holiday_users, year, plan_lookup=None):
+    """
+    Generates reports for many users at once. Records, plans, public holidays and confirmations are
+    each loaded with a single query rather than once per user. Closed years are read from their
+    snapshots. Inside a `reporting` block, users who have just written are read from the primary.
+
+    :param holiday_users: a HolidayUser queryset or list
+    :param year: the leave year
+    :param plan_lookup: optional HolidayPlanCacheLookup to prime, so callers can reuse the plans
+    :return: dict of reports keyed by HolidayUser pk
+    """
+    year = int(year)
+    if plan_lookup is not None or not leave_cache.is_enabled():
+        return _generate_routed_reports(holiday_users, year, plan_lookup)
+    # Reports are looked up in the cache together and only the missing ones are generated
+    return leave_cache.get_cached_summaries(
+        list(holiday_users),
+        year,
+        lambda missing: _generate_routed_reports(missing, year),
+    )
+
+
+def _generate_routed_reports(holiday_users, year, plan_lookup=None):
+    reports = {}
+    for alias, users in split_by_read_database(holiday_users):
+        with read_from(alias):
+            reports.update(_generate_holiday_reports(users, year, plan_lookup))
+    return reports
+
+
+def _generate_holiday_reports(holiday_users, year, plan_lookup=None):
+    if plan_lookup is None:
+        plan_lookup = HolidayPlanCacheLookup()
+
+    closed = {
+        state.user_id: snapshot.loads(state.snapshot)
+        for state in HolidayYear.objects.filter(
+            user__in=holiday_users, year=year, closed__isnull=False
+        )
+    }
+
+    users = list(holiday_users)
+    plan_lookup.prime(
+        users,
+        HolidayPlan.objects.filter(user__in=holiday_users).order_by("-start_date"),
+    )
+
+    records_by_user = {u.pk: [] for u in users}
+    for record in HolidayRecord.objects.filter(
+        user__in=holiday_users, year=year
+    ).order_by("start_date", "id"):
+        records_by_user[record.user_id].append(record)
+
+    confirmations = {
+        c.user_id: c
+        for c in Confirmation.objects.filter(
+            user__in=holiday_users, year=year
+        ).order_by("confirmed")
+    }
+
+    system_records = get_system_records(year)
+
+    return {
+        user.pk: closed[user.pk]
+        if user.pk in closed
+        else build_holiday_report(
+            user,
+            year,
+            records_by_user[user.pk],
+            system_records,
+            plan_lookup,
+            confirmations.get(user.pk),
+        )
+        for user in users
+    }
+
+
+def build_holiday_report(
+    user, year, holiday_records, system_records, plan_lookup, last_confirmation=None
+):
+    """
+    Calculates the holiday summary for a user from already loaded data - no queries are made other than
+    through the plan lookup.
+    """
     result_list = []
     allowance = 0
     rollover = 0
     public_holiday_adjustment = 0
+    type_ent, type_rol, type_phadj, type_al = HolidayRecordType.objects.ids_for(
+        "ENT", "ROL", "PHADJ", "AL"
+    )
     for record in holiday_records:
         start = record.start_date
         end = record.end_date
@@ -55,16 +207,16 @@ def generate_holiday_report(user, year):
             approved_by=record.approved_by,
         )
 
-        if record.record_type.code == "ENT":
+        if record.record_type_id == type_ent:
             allowance += record.adjustment
 
-        if record.record_type.code == "ROL":
+        if record.record_type_id == type_rol:
             rollover += record.adjustment
 
-        if record.record_type.code == "PHADJ":
+        if record.record_type_id == type_phadj:
             public_holiday_adjustment += record.adjustment
 
-        if record.record_type_id == 5:
+        if record.record_type_id == type_al:
             item["days"] = []
             for day, type in daterange(start, end):
                 days_requested = 1
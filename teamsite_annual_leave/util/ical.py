@@ -0,0 +1,128 @@
+import hashlib
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+
+from django.core.cache import cache
+from django.utils import timezone
+
+CRLF = "\r\n"
+PRODID = "-//Social Finance//Teamsite Annual Leave//EN"
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _escape(value):
+    """Escapes a TEXT value as described in RFC 5545 section 3.3.11"""
+    if value is None:
+        return ""
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def _fold(line):
+    """
+    Folds content lines longer than 75 octets.
+
+    >>> _fold("A" * 80)
+    'AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA\\r\\n AAAAA'
+    """
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line
+
+    parts = []
+    limit = 75
+    while len(encoded) > limit:
+        cut = limit
+        # Never split a multibyte character
+        while cut > 0 and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+        limit = 74  # Continuation lines start with a space
+    parts.append(encoded.decode("utf-8"))
+    return (CRLF + " ").join(parts)
+
+
+def _format_date(value):
+    return value.strftime("%Y%m%d")
+
+
+def _format_timestamp(value):
+    if value is None:
+        value = timezone.now()
+    return value.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _event_summary(record):
+    summary = record.title
+    if record.start_half and record.start_date == record.end_date:
+        summary = f"{summary} (half day)"
+    elif record.start_half or record.end_half:
+        summary = f"{summary} (incl. half days)"
+    return summary
+
+
+def render_calendar(records, name):
+    """
+    Renders the given HolidayRecords as an iCalendar (RFC 5545) document. Every record becomes an
+    all-day event - iCalendar end dates are exclusive so we add one day to the record end date.
+
+    :param records: iterable of HolidayRecord objects
+    :param name: the display name of the calendar
+    :return: the calendar as a string
+    """
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_escape(name)}",
+    ]
+    for record in records:
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:holiday-record-{record.pk}@teamsite-annual-leave",
+            f"DTSTAMP:{_format_timestamp(record.last_modified)}",
+            f"DTSTART;VALUE=DATE:{_format_date(record.start_date)}",
+            f"DTEND;VALUE=DATE:{_format_date(record.end_date + timedelta(days=1))}",
+            f"SUMMARY:{_escape(_event_summary(record))}",
+            "TRANSP:TRANSPARENT",
+        ]
+        if record.comment:
+            lines.append(f"DESCRIPTION:{_escape(record.comment)}")
+        lines.append("END:VEVENT")
+    lines.append("END:VCALENDAR")
+
+    return CRLF.join(_fold(line) for line in lines) + CRLF
+
+
+def calendar_etag(scope, change_key):
+    digest = hashlib.sha1(f"{scope}:{change_key}".encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+
+def get_cached_calendar(scope, change_key, render):
+    """
+    Returns the rendered calendar for the given scope, only calling `render` if no calendar has been
+    cached for the current change key. Stale entries are never read again as the change key forms part
+    of the cache key, so they simply expire.
+
+    :param scope: identifies the calendar, e.g. "user-12" or "public"
+    :param change_key: a value that changes whenever the calendar content changes
+    :param render: callable returning the calendar body
+    :return: tuple of (etag, body)
+    """
+    etag = calendar_etag(scope, change_key)
+    cache_key = f"teamsite_annual_leave:ical:{scope}:{etag[1:-1]}"
+    body = cache.get(cache_key)
+    if body is None:
+        body = render()
+        cache.set(cache_key, body, timeout=CACHE_TIMEOUT)
+    return etag, body
@@ -0,0 +1,57 @@
+import subprocess
+import sys
+from collections import namedtuple
+
+from django.conf import settings
+
+from .extras import EXTRAS
+
+ImportTimes = namedtuple("ImportTimes", ["total_us", "modules", "extras"])
+
+
+def parse_importtime(output):
+    """
+    Parses the report written to stderr by `python -X importtime`
+
+    :return: ImportTimes with the total time, a dict of cumulative microseconds for each top level
+             import, and the set of optional extras that were loaded
+    """
+    modules = {}
+    loaded = set()
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # The header
+
+        module = name[1:]
+        top_level = not module.startswith(" ")
+        module = module.strip()
+        loaded.add(module.split(".")[0])
+        if top_level:
+            modules[module] = int(cumulative)
+
+    extras = {
+        extra
+        for extra, extra_modules in EXTRAS.items()
+        if loaded.intersection(extra_modules)
+    }
+    return ImportTimes(sum(modules.values()), modules, extras)
+
+
+def measure_importtime(args):
+    """
+    Runs python -X importtime with the arguments in the project directory
+
+    :param args: e.g. ["manage.py", "help"] or ["-c", "import django_site.wsgi"]
+    :return: ImportTimes
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime"] + list(args),
+        cwd=settings.BASE_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    return parse_importtime(result.stderr)
@@ -0,0 +1,274 @@
+import threading
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ..models.confirmation import Confirmation
+from ..models.holiday_plan import HolidayPlan
+from ..models.holiday_record import HolidayRecord
+from ..models.holiday_record_type import HolidayRecordType
+from ..models.holiday_user import HolidayUser
+from .read_replica import _get_user_id
+
+# Entries are only read for the versions they were stored with, so stale ones simply expire
+DEFAULT_TIMEOUT = 60 * 60 * 24
+
+PREFIX = "teamsite_annual_leave:cache"
+
+# Version scopes. Public holidays, closures and record types affect everyone; USERS changes with any
+# user's leave or plans.
+GLOBAL = "global"
+USERS = "users"
+
+_missing = object()
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def is_enabled():
+    """
+    Computed leave data is cached in the Django cache named by ANNUAL_LEAVE_CACHE, e.g. "default"
+    """
+    return getattr(settings, "ANNUAL_LEAVE_CACHE", None) is not None
+
+
+def get_cache():
+    return caches[settings.ANNUAL_LEAVE_CACHE]
+
+
+def _timeout():
+    return getattr(settings, "ANNUAL_LEAVE_CACHE_TIMEOUT", DEFAULT_TIMEOUT)
+
+
+def user_scope(user_id):
+    """
+    :param user_id: the pk of the (Django) User
+    """
+    return f"user:{user_id}"
+
+
+def _version_key(scope):
+    return f"{PREFIX}:version:{scope}"
+
+
+def _get_versions(scopes):
+    """
+    :return: dict of scope to its current version. Scopes without one, e.g. after eviction, get a new
+             version so that no entry stored before can be read.
+    """
+    cache = get_cache()
+    keys = {_version_key(s): s for s in scopes}
+    found = cache.get_many(keys.keys())
+    for key in keys.keys() - found.keys():
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        found[key] = cache.get(key)
+    return {scope: found[key] for key, scope in keys.items()}
+
+
+def _bump(scopes):
+    get_cache().set_many(
+        {_version_key(s): uuid.uuid4().hex for s in scopes}, timeout=None
+    )
+
+
+def invalidate(*scopes):
+    """
+    Makes every entry stored for the scopes unreadable. Inside a transaction the versions are bumped
+    again once it commits: until then other connections read the old rows, and may have cached them
+    under the versions bumped now.
+    """
+    if not is_enabled():
+        return
+    _bump(scopes)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(scopes))
+
+
+def invalidate_users(user_ids):
+    """
+    :param user_ids: pks of (Django) Users whose leave, plans or confirmations changed
+    """
+    invalidate(USERS, *[user_scope(user_id) for user_id in user_ids])
+
+
+def _count(kind, hits=0, misses=0):
+    with _stats_lock:
+        stats = _stats.setdefault(kind, dict(hits=0, misses=0))
+        stats["hits"] += hits
+        stats["misses"] += misses
+
+
+def get_cache_stats():
+    """
+    :return: dict of kind to a dict of hits and misses in this process
+    """
+    with _stats_lock:
+        return {kind: dict(stats) for kind, stats in _stats.items()}
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _entry_key(kind, key, scopes, versions):
+    return ":".join([PREFIX, kind, str(key)] + [versions[s] for s in scopes])
+
+
+def cached(kind, key, scopes, compute):
+    """
+    Returns the value for the key, only calling `compute` if nothing is cached for the current
+    versions of the scopes. Calls `compute` directly if caching is disabled.
+
+    :param kind: what is cached, e.g. "summary", used for the stats
+    :param scopes: the scopes whose changes invalidate the value
+    """
+    if not is_enabled():
+        return compute()
+
+    cache = get_cache()
+    entry_key = _entry_key(kind, key, scopes, _get_versions(scopes))
+    value = cache.get(entry_key, _missing)
+    if value is _missing:
+        _count(kind, misses=1)
+        value = compute()
+        cache.set(entry_key, value, timeout=_timeout())
+    else:
+        _count(kind, hits=1)
+    return value
+
+
+def cached_many(kind, scopes_by_key, compute):
+    """
+    Like cached, for many keys with one round trip for the versions and one for the values
+
+    :param scopes_by_key: dict of key to its scopes
+    :param compute: callable given the list of keys that missed, returning a dict of key to value
+    :return: dict of key to value
+    """
+    if not is_enabled():
+        return compute(list(scopes_by_key))
+
+    cache = get_cache()
+    versions = _get_versions({s for scopes in scopes_by_key.values() for s in scopes})
+    entry_keys = {
+        key: _entry_key(kind, key, scopes, versions)
+        for key, scopes in scopes_by_key.items()
+    }
+    found = cache.get_many(entry_keys.values())
+    values = {
+        key: found[entry_key]
+        for key, entry_key in entry_keys.items()
+        if entry_key in found
+    }
+
+    missing = [key for key in entry_keys if key not in values]
+    _count(kind, hits=len(values), misses=len(missing))
+    if missing:
+        computed = compute(missing)
+        cache.set_many(
+            {entry_keys[key]: value for key, value in computed.items()},
+            timeout=_timeout(),
+        )
+        values.update(computed)
+    return values
+
+
+def get_cached_summary(user, year, compute):
+    """
+    :param user: a (Django) User
+    """
+    return cached(
+        "summary", f"{user.pk}:{year}", [GLOBAL, user_scope(user.pk)], compute
+    )
+
+
+async def aget_cached_summary(user, year, compute):
+    """
+    Async version of get_cached_summary, `compute` returns an awaitable
+    """
+    if not is_enabled():
+        return await compute()
+
+    scopes = [GLOBAL, user_scope(user.pk)]
+    versions = await sync_to_async(_get_versions)(scopes)
+    entry_key = _entry_key("summary", f"{user.pk}:{year}", scopes, versions)
+    cache = get_cache()
+    value = await cache.aget(entry_key, _missing)
+    if value is _missing:
+        _count("summary", misses=1)
+        value = await compute()
+        await cache.aset(entry_key, value, timeout=_timeout())
+    else:
+        _count("summary", hits=1)
+    return value
+
+
+def get_cached_summaries(holiday_users, year, compute):
+    """
+    :param compute: callable given a list of HolidayUsers, returning their reports keyed by pk
+    :return: dict of reports keyed by HolidayUser pk
+    """
+    by_key = {f"{u.user_id}:{year}": u for u in holiday_users}
+
+    def compute_missing(keys):
+        reports = compute([by_key[key] for key in keys])
+        return {key: reports[by_key[key].pk] for key in keys}
+
+    reports = cached_many(
+        "summary",
+        {key: [GLOBAL, user_scope(u.user_id)] for key, u in by_key.items()},
+        compute_missing,
+    )
+    return {by_key[key].pk: report for key, report in reports.items()}
+
+
+def get_cached_plans(holiday_user, compute):
+    """
+    A user's plans, most recent first
+    """
+    return cached("plans", holiday_user.pk, [user_scope(holiday_user.user_id)], compute)
+
+
+def get_cached_system_records(year, compute):
+    """
+    Public holidays and office closures
+    """
+    return cached("closures", year, [GLOBAL], compute)
+
+
+def get_cached_public_holidays(year, compute):
+    return cached("public_holidays", year, [GLOBAL], compute)
+
+
+@receiver([post_save, post_delete], sender=HolidayRecord)
+@receiver([post_save, post_delete], sender=HolidayPlan)
+@receiver([post_save, post_delete], sender=Confirmation)
+def leave_cache_receiver(sender, instance, raw=False, **kwargs):
+    if not is_enabled() or raw:
+        return
+    user_id = _get_user_id(instance)
+    if user_id is None:
+        invalidate(GLOBAL)
+    else:
+        invalidate_users([user_id])
+
+
+@receiver([post_save, post_delete], sender=HolidayUser)
+def leave_cache_user_receiver(sender, instance, raw=False, **kwargs):
+    """
+    New users and leavers change who is in the availability index
+    """
+    if is_enabled() and not raw:
+        invalidate_users([instance.user_id])
+
+
+@receiver([post_save, post_delete], sender=HolidayRecordType)
+def leave_cache_record_type_receiver(sender, raw=False, **kwargs):
+    if is_enabled() and not raw:
+        invalidate(GLOBAL)
@@ -0,0 +1,61 @@
+from django.db.models import Count, F, Q, Sum
+
+from ..models.leave_day import LeaveDay
+
+
+def get_leave_totals(year, users=None):
+    """
+    Leave taken by everyone in a year, aggregated from the LeaveDay table in a single query rather
+    than by generating a report per user. See tasks.leave_days.
+
+    :param users: optional queryset or list of HolidayUsers to limit the totals to
+    :return: dict of HolidayUser pk to a dict with total_used, monthly_breakdown, jan_to_aug and
+             sep_to_nov, as in the holiday report
+    """
+    days = LeaveDay.objects.filter(year=year)
+    if users is not None:
+        days = days.filter(user__in=users)
+
+    months = {f"month_{m}": Sum("taken", filter=Q(date__month=m)) for m in range(1, 13)}
+    totals = {}
+    for row in days.values("user_id").annotate(total_used=Sum("taken"), **months):
+        breakdown = {m: row[f"month_{m}"] or 0 for m in range(1, 13)}
+        totals[row["user_id"]] = dict(
+            total_used=row["total_used"],
+            monthly_breakdown=breakdown,
+            jan_to_aug=sum(breakdown[m] for m in range(1, 9)),
+            sep_to_nov=sum(breakdown[m] for m in range(9, 12)),
+        )
+    return totals
+
+
+def get_daily_headcount(start, end, users=None):
+    """
+    How many people are working each day, in a single query
+
+    :return: dict of date to (available, partially available, out) counts. Out counts the people
+             due to work who are on leave or closed for the whole day.
+    """
+    days = LeaveDay.objects.filter(date__gte=start, date__lte=end, working__gt=0)
+    if users is not None:
+        days = days.filter(user__in=users)
+
+    available = Q(taken=0, closure=0)
+    out = Q(closure__gte=1) | Q(taken__gte=F("working") - F("closure"))
+    rows = (
+        days.values("date")
+        .annotate(
+            available=Count("id", filter=available),
+            out=Count("id", filter=out & ~available),
+            total=Count("id"),
+        )
+        .order_by("date")
+    )
+    return {
+        row["date"]: (
+            row["available"],
+            row["total"] - row["available"] - row["out"],
+            row["out"],
+        )
+        for row in rows
+    }
@@ -0,0 +1,40 @@
+from decimal import Decimal
+
+from django.db.models import Sum
+
+from ..models.leave_event import LeaveEvent
+from ..models.leave_snapshot import LeaveSnapshot
+
+
+def get_ledger_balance(holiday_user, year, at=None):
+    """
+    A user's remaining leave for a year from the ledger: the latest snapshot plus the events after it.
+    See tasks.leave_ledger.
+
+    :param at: optional datetime to get the balance as it was then, e.g. before a change
+    :return: Decimal, the same as the remainder in the holiday report
+    """
+    snapshots = LeaveSnapshot.objects.filter(user=holiday_user, year=year)
+    events = LeaveEvent.objects.filter(user=holiday_user, year=year)
+    if at is not None:
+        snapshots = snapshots.filter(created__lte=at)
+        events = events.filter(created__lte=at)
+
+    snapshot = snapshots.order_by("-event_id").first()
+    balance = Decimal(0)
+    if snapshot is not None:
+        balance = snapshot.balance
+        events = events.filter(id__gt=snapshot.event_id)
+    return balance + (events.aggregate(delta=Sum("delta"))["delta"] or 0)
+
+
+def get_ledger_history(holiday_user, year):
+    """
+    :return: list of (LeaveEvent, balance after the event) tuples, oldest first
+    """
+    balance = Decimal(0)
+    history = []
+    for event in LeaveEvent.objects.filter(user=holiday_user, year=year).order_by("id"):
+        balance += event.delta
+        history.append((event, balance))
+    return history
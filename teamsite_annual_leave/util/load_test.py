@@ -0,0 +1,421 @@
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth import (
+    BACKEND_SESSION_KEY,
+    HASH_SESSION_KEY,
+    SESSION_KEY,
+    get_user_model,
+)
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.utils.crypto import get_random_string
+
+from ..models.holiday_plan import HolidayPlan
+from ..models.holiday_record import HolidayRecord
+from ..models.holiday_record_type import HolidayRecordType
+from ..models.holiday_user import HolidayUser
+
+User = get_user_model()
+
+# The read-heavy endpoints, as served by the sync DRF views and by async_views
+ENDPOINTS = {
+    "records": ("/holiday/me/", "/holiday/async/me/"),
+    "activity": ("/holiday/me/activity/", "/holiday/async/me/activity/"),
+    "public": ("/holiday/me/public/", "/holiday/async/me/public/"),
+    "confirmations": ("/holiday/confirmation/", "/holiday/async/confirmation/"),
+    "graphql": ("/graphql/", "/graphql/"),
+}
+
+GRAPHQL_QUERY = (
+    "{ holidays(upcoming: true, first: 20) "
+    "{ edges { node { title startDate endDate startHalf endHalf today } } } }"
+)
+
+# Request bodies for the endpoints that are POSTed to
+BODIES = {"graphql": json.dumps({"query": GRAPHQL_QUERY})}
+
+# How often a simulated user requests each endpoint, relative to the others
+DEFAULT_MIX = {
+    "activity": 4,
+    "records": 3,
+    "public": 2,
+    "confirmations": 1,
+    "graphql": 1,
+}
+
+Request = namedtuple("Request", ["name", "method", "path", "body"])
+
+USERNAME_PREFIX = "loadtest-"
+
+
+def _installed(module):
+    return importlib.util.find_spec(module) is not None
+
+
+def get_server_command(mode, port):
+    """
+    :param mode: "wsgi" or "asgi"
+    :return: the command line to serve the site on the port
+    """
+    app = f"django_site.{mode}:application"
+    bind = f"127.0.0.1:{port}"
+    if mode == "wsgi":
+        if _installed("gunicorn"):
+            workers = str(os.cpu_count() or 1)
+            return ["gunicorn", "-b", bind, "-w", workers, "--threads", "8", app]
+        return [sys.executable, "manage.py", "runserver", "--noreload", bind]
+
+    if _installed("uvicorn"):
+        return [sys.executable, "-m", "uvicorn", "--port", str(port), app]
+    if _installed("daphne"):
+        return [sys.executable, "-m", "daphne", "-p", str(port), app]
+    if _installed("hypercorn"):
+        return [sys.executable, "-m", "hypercorn", "-b", bind, app]
+    raise RuntimeError("Serving ASGI needs uvicorn, daphne or hypercorn installed")
+
+
+@contextmanager
+def throwaway_database():
+    """
+    Creates an empty database with the record types loaded for the duration of the block, in the
+    same way as the test runner, and destroys it afterwards. Nothing is written to the configured
+    database.
+
+    :return: the name of the database, for the servers to use, see serve
+    """
+    from django.test.utils import setup_databases, teardown_databases
+
+    with tempfile.TemporaryDirectory() as directory:
+        if connection.vendor == "sqlite":
+            # The servers run in other processes, so the database can't be in memory
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(
+                directory, "load-test.sqlite3"
+            )
+        old_config = setup_databases(
+            verbosity=0, interactive=False, aliases={DEFAULT_DB_ALIAS}
+        )
+        try:
+            call_command("loaddata", "record-types", verbosity=0)
+            yield connection.settings_dict["NAME"]
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+
+@contextmanager
+def serve(mode, port, database=None, timeout=30):
+    """
+    Runs the site in a subprocess for the duration of the block
+
+    :param database: optional name of the database for the site to use instead of the configured
+                     one, see django_site.settings
+    """
+    env = dict(os.environ)
+    if database is not None:
+        env["ANNUAL_LEAVE_DATABASE_NAME"] = str(database)
+        env.pop("ANNUAL_LEAVE_READ_REPLICA", None)
+    process = subprocess.Popen(
+        get_server_command(mode, port),
+        cwd=settings.BASE_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError(f"The {mode} server did not start")
+                time.sleep(0.2)
+        yield process
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def get_available_endpoints():
+    """
+    The GraphQL endpoint is only served when the graphql extra is installed, see django_site.urls
+    """
+    return sorted(
+        e for e in ENDPOINTS if e != "graphql" or _installed("graphene_django")
+    )
+
+
+def validate_mix(mix, endpoints):
+    """
+    :param mix: dict of endpoint name to weight
+    :raises ValueError: for unknown endpoints or negative weights, or if none of the endpoints would
+                        be requested
+    """
+    for name, weight in mix.items():
+        if name not in get_available_endpoints():
+            raise ValueError(f"Unknown endpoint {name} in the mix")
+        if weight < 0:
+            raise ValueError(f"The weight for {name} can't be negative")
+    if sum(mix.get(e, 1) for e in endpoints) <= 0:
+        raise ValueError("At least one endpoint needs a weight above 0")
+
+
+def get_requests(mode, endpoints):
+    """
+    :return: list of Requests for the endpoints as served in the mode, "wsgi" or "asgi"
+    """
+    return [
+        Request(
+            name,
+            "POST" if name in BODIES else "GET",
+            ENDPOINTS[name][0 if mode == "wsgi" else 1],
+            BODIES.get(name),
+        )
+        for name in endpoints
+    ]
+
+
+def _seed_records(holiday_user, year, count, rng):
+    """
+    Books leave in `count` different weeks of the year, from a day to a whole week
+    """
+    first_monday = date(year, 1, 1) + timedelta(days=-date(year, 1, 1).weekday() % 7)
+    leave_type = HolidayRecordType.objects.get_for_code("AL")
+    for week in sorted(rng.sample(range(50), count)):
+        start = first_monday + timedelta(weeks=week, days=rng.randint(0, 2))
+        HolidayRecord.objects.create(
+            user=holiday_user,
+            record_type=leave_type,
+            title="Annual leave",
+            start_date=start,
+            end_date=start + timedelta(days=rng.randint(0, 4 - start.weekday())),
+            start_half=rng.random() < 0.1,
+            year=year,
+        )
+
+
+def seed_users(count, records_per_user=6):
+    """
+    Makes sure there are `count` load test users, a synthetic organisation with a mix of full and
+    part time plans and some leave booked across the current year. Users that already exist are left
+    as they are.
+
+    :return: list of the load test Users
+    """
+    year = date.today().year
+    existing = {
+        u.username: u for u in User.objects.filter(username__startswith=USERNAME_PREFIX)
+    }
+    users = []
+    with transaction.atomic():
+        for ix in range(count):
+            username = f"{USERNAME_PREFIX}{ix:04d}"
+            user = existing.get(username)
+            if user is None:
+                rng = random.Random(ix)
+                user = User.objects.create_user(username, f"{username}@example.com")
+                holiday_user = HolidayUser.objects.create(user=user)
+                # One in five works part time, without Fridays
+                HolidayPlan.objects.create(
+                    user=holiday_user,
+                    start_date=date(year, 1, 1),
+                    fri_days=0 if ix % 5 == 4 else 1,
+                )
+                _seed_records(holiday_user, year, records_per_user, rng)
+            users.append(user)
+    return users
+
+
+def create_session(user):
+    """
+    :return: a session key logging in the user, without going through a login view
+    """
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return session.session_key
+
+
+def count_queries(user, requests):
+    """
+    Makes each request once in this process, after a first request to warm up, and counts the
+    database queries it runs. The servers run in subprocesses, where queries can't be counted.
+
+    :return: dict of endpoint name to the number of queries
+    """
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    client = Client(HTTP_HOST="localhost")
+    client.force_login(user)
+
+    def make(request):
+        if request.method == "GET":
+            return client.get(request.path)
+        return client.post(request.path, request.body, content_type="application/json")
+
+    counts = {}
+    for request in requests:
+        make(request)
+        with CaptureQueriesContext(connection) as queries:
+            make(request)
+        counts[request.name] = len(queries)
+    return counts
+
+
+class LoadStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.latencies = []
+        self.elapsed = 0
+
+    @property
+    def throughput(self):
+        return self.requests / self.elapsed if self.elapsed else 0
+
+    @property
+    def mean_latency(self):
+        return sum(self.latencies) / len(self.latencies) if self.latencies else 0
+
+    @property
+    def error_rate(self):
+        return self.errors / self.requests if self.requests else 0
+
+    def percentile(self, p):
+        """
+        :param p: e.g. 95 for the latency 95% of requests were at least as fast as
+        :return: the latency in seconds, by the nearest rank
+        """
+        if not self.latencies:
+            return 0
+        ordered = sorted(self.latencies)
+        rank = max(1, -(-len(ordered) * p // 100))
+        return ordered[int(rank) - 1]
+
+    def add(self, latency, ok):
+        self.requests += 1
+        self.latencies.append(latency)
+        if not ok:
+            self.errors += 1
+
+
+async def _read_response(reader):
+    """
+    Reads one HTTP/1.1 response
+    :return: (status, keep_alive)
+    """
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ")[1])
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+    if headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    else:
+        await reader.read()
+        return status, False
+
+    return status, headers.get("connection", "").lower() != "close"
+
+
+def _encode_request(request, session_key, csrf_token):
+    """
+    POSTs carry a CSRF token in both the cookie and the header, as a browser client would
+    """
+    lines = [
+        f"{request.method} {request.path} HTTP/1.1",
+        "Host: localhost",
+        f"Cookie: {settings.SESSION_COOKIE_NAME}={session_key}; "
+        f"{settings.CSRF_COOKIE_NAME}={csrf_token}",
+    ]
+    body = b""
+    if request.body is not None:
+        body = request.body.encode("utf-8")
+        lines += [
+            f"X-CSRFToken: {csrf_token}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+        ]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+async def _simulated_user(port, session_key, requests, weights, deadline, stats, rng):
+    csrf_token = get_random_string(32)
+    reader = writer = None
+    while time.monotonic() < deadline:
+        request = rng.choices(requests, weights)[0]
+        started = time.monotonic()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(_encode_request(request, session_key, csrf_token))
+            await writer.drain()
+            status, keep_alive = await _read_response(reader)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            status, keep_alive = None, False
+
+        stats[request.name].add(time.monotonic() - started, status == 200)
+        if not keep_alive and writer is not None:
+            writer.close()
+            reader = writer = None
+
+    if writer is not None:
+        writer.close()
+
+
+async def _drive(port, session_keys, requests, weights, duration):
+    stats = {r.name: LoadStats() for r in requests}
+    started = time.monotonic()
+    deadline = started + duration
+    await asyncio.gather(
+        *[
+            _simulated_user(
+                port, key, requests, weights, deadline, stats, random.Random(ix)
+            )
+            for ix, key in enumerate(session_keys)
+        ]
+    )
+    for endpoint_stats in stats.values():
+        endpoint_stats.elapsed = time.monotonic() - started
+    return stats
+
+
+def run_load(port, session_keys, requests, duration, mix=None):
+    """
+    Each session key is one simulated user, making requests over a keep-alive connection until the
+    duration (in seconds) is up. Each request is picked at random, weighted by the mix.
+
+    :param requests: list of Requests, see get_requests
+    :param mix: optional dict of endpoint name to weight, defaults to DEFAULT_MIX
+    :return: dict of endpoint name to LoadStats
+    """
+    mix = DEFAULT_MIX if mix is None else mix
+    weights = [mix.get(r.name, 1) for r in requests]
+    return asyncio.run(_drive(port, session_keys, requests, weights, duration))
@@ -0,0 +1,92 @@
+import hashlib
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from ..models.holiday_year import HolidayYear
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+_registry_lock = threading.Lock()
+_local_locks = {}
+# The (user, year) keys held by each thread
+_held = threading.local()
+
+
+def _local_lock(key):
+    with _registry_lock:
+        lock = _local_locks.get(key)
+        if lock is None:
+            lock = _local_locks[key] = threading.Lock()
+        return lock
+
+
+@contextmanager
+def _file_lock(user_id, year):
+    """
+    Stand-in for row locks on databases without SELECT ... FOR UPDATE (i.e. SQLite), so that separate
+    processes sharing the same database file also queue up.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    lock_dir = getattr(settings, "ANNUAL_LEAVE_LOCK_DIR", None) or tempfile.gettempdir()
+    database = hashlib.sha1(str(connection.settings_dict["NAME"]).encode()).hexdigest()
+    path = os.path.join(
+        lock_dir, f"teamsite-annual-leave-{database[:12]}-{user_id}-{year}.lock"
+    )
+    with open(path, "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+@contextmanager
+def year_lock(user, year):
+    """
+    Holds an exclusive lock on a user's leave year for the duration of the block, which runs inside a
+    transaction. Threads in this process queue on a local lock, other processes on a row lock on the
+    HolidayYear row - or on a lock file where the database has no row locks.
+
+    The lock is re-entrant: a thread that already holds it, e.g. when a plan recalculation updates the
+    leave ledger, just gets the HolidayYear again.
+
+    :param user: a HolidayUser or its pk
+    :return: the locked HolidayYear
+    """
+    user_id = getattr(user, "pk", user)
+    key = (user_id, year)
+    held = _held.__dict__.setdefault("keys", set())
+    if key in held:
+        with transaction.atomic():
+            state, _ = HolidayYear.objects.get_or_create(user_id=user_id, year=year)
+            yield state
+        return
+
+    with _local_lock(key):
+        held.add(key)
+        try:
+            if connection.features.has_select_for_update:
+                with transaction.atomic():
+                    HolidayYear.objects.get_or_create(user_id=user_id, year=year)
+                    yield HolidayYear.objects.select_for_update().get(
+                        user_id=user_id, year=year
+                    )
+            else:
+                with _file_lock(user_id, year), transaction.atomic():
+                    state, _ = HolidayYear.objects.get_or_create(
+                        user_id=user_id, year=year
+                    )
+                    yield state
+        finally:
+            held.discard(key)
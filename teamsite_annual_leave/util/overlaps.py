@@ -0,0 +1,78 @@
+from ..models.holiday_record import HolidayRecord
+from ..models.holiday_record_type import HolidayRecordType
+
+
+def _half_on(record, day):
+    """
+    True if the record only takes half of the day
+    """
+    if record.start_date == record.end_date:
+        return record.start_half or record.end_half
+    if day == record.start_date:
+        return record.start_half
+    if day == record.end_date:
+        return record.end_half
+    return False
+
+
+def records_overlap(a, b):
+    """
+    True if two records take leave on the same day. Records that share a single day are allowed if
+    both only take half of it.
+    """
+    if a.start_date > b.start_date:
+        a, b = b, a
+    if b.start_date > a.end_date:
+        return False
+    if b.start_date == a.end_date and b.end_date >= a.end_date:
+        day = b.start_date
+        return not (_half_on(a, day) and _half_on(b, day))
+    return True
+
+
+def find_overlaps(records):
+    """
+    :param records: objects with start_date, end_date, start_half and end_half
+    :return: list of (a, b) pairs of overlapping records, a starting no later than b
+    """
+    overlaps = []
+    active = []
+    for record in sorted(records, key=lambda r: (r.start_date, r.end_date)):
+        active = [a for a in active if a.end_date >= record.start_date]
+        overlaps += [(a, record) for a in active if records_overlap(a, record)]
+        active.append(record)
+    return overlaps
+
+
+def overlapping_records(user, start_date, end_date):
+    """
+    The user's leave records with any day between start_date and end_date. A range query on the
+    (user, end_date, start_date) index, so the cost depends on how many records end after
+    start_date, not on the length of the user's history.
+
+    :param user: a HolidayUser or its pk
+    """
+    return HolidayRecord.objects.filter(
+        user=user,
+        end_date__gte=start_date,
+        start_date__lte=end_date,
+        record_type_id__in=HolidayRecordType.objects.user_option_ids(),
+    ).order_by("start_date", "id")
+
+
+def find_overlapping(record):
+    """
+    :param record: a saved or unsaved HolidayRecord
+    :return: the first of the user's other leave records that overlaps it, or None
+    """
+    candidates = overlapping_records(record.user_id, record.start_date, record.end_date)
+    if record.pk is not None:
+        candidates = candidates.exclude(pk=record.pk)
+    for other in candidates:
+        if records_overlap(record, other):
+            return other
+    return None
+
+
+def overlap_message(other):
+    return f"Overlaps leave from {other.start_date} to {other.end_date}"
@@ -0,0 +1,81 @@
+import multiprocessing
+from math import ceil
+
+from django.db import connections
+
+from ..models.holiday_user import HolidayUser
+from .holiday_report import generate_holiday_reports
+
+
+def _generate_slice(args):
+    """
+    Runs in a worker process: bulk loads and generates the reports for one slice of users
+    """
+    year, user_ids = args
+    holiday_users = list(
+        HolidayUser.objects.filter(user_id__in=user_ids).select_related("user")
+    )
+    reports = generate_holiday_reports(holiday_users, year)
+    return {hu.user_id: reports[hu.pk] for hu in holiday_users}
+
+
+def can_run_in_parallel():
+    """
+    Workers are forked so they inherit the configured Django. They use their own database
+    connections, so they cannot see data from a transaction that is still open in this process -
+    except for in-memory SQLite, where the forked copy of the database is used.
+    """
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return False
+    for conn in connections.all():
+        in_memory = conn.vendor == "sqlite" and conn.is_in_memory_db()
+        if conn.in_atomic_block and not in_memory:
+            return False
+    return True
+
+
+def generate_reports_parallel(users, year, workers, chunk_size=50, progress=None):
+    """
+    Generates reports for the users across a pool of worker processes. The users are split into
+    slices, each loaded and calculated by one worker, and the results are put back in the order of
+    `users`. Falls back to generating the slices in this process when workers can't be used.
+
+    :param users: Users, in the order the results should be in
+    :param workers: number of processes
+    :param progress: optional callable, called as progress("users", done, total) after each slice
+    :return: list of (user, report) tuples; the report is None for users without a HolidayUser
+    """
+    users = list(users)
+    slices = [
+        (year, [u.pk for u in users[start : start + chunk_size]])
+        for start in range(0, len(users), chunk_size)
+    ]
+
+    reports = {}
+    done = 0
+
+    def collect(results):
+        nonlocal done
+        for result in results:
+            reports.update(result)
+            done += len(result)
+            if progress is not None:
+                progress("users", done, len(users))
+
+    if workers > 1 and len(slices) > 1 and can_run_in_parallel():
+        # Connections must not be shared with the forked workers
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        with context.Pool(min(workers, len(slices))) as pool:
+            collect(pool.imap(_generate_slice, slices))
+    else:
+        collect(_generate_slice(s) for s in slices)
+
+    return [(u, reports.get(u.pk)) for u in users]
+
+
+def get_chunk_size(user_count, workers):
+    """
+    A few slices per worker so that a slow slice doesn't hold up the others
+    """
+    return max(1, ceil(user_count / (workers * 4)))
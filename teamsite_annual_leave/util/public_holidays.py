@@ -0,0 +1,22 @@
+from ..models.holiday_record import HolidayRecord
+from . import leave_cache
+from .extras import require
+
+
+def get_public_holiday_data(year):
+    """
+    The public holidays and office closures for a year as served by the API, from the leave cache if
+    it is enabled
+    """
+
+    def serialize():
+        # Imported here so the cache warm-up doesn't need the api extra until it gets this far
+        require("rest_framework", "api")
+        from ..serializers.holiday_record_serializer import HolidayRecordSerializer
+
+        records = HolidayRecord.objects.filter(user__isnull=True, year=year).order_by(
+            "start_date"
+        )
+        return list(HolidayRecordSerializer(records, many=True).data)
+
+    return leave_cache.get_cached_public_holidays(year, serialize)
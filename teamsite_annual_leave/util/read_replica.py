@@ -0,0 +1,147 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ..models.confirmation import Confirmation
+from ..models.holiday_plan import HolidayPlan
+from ..models.holiday_record import HolidayRecord
+from ..models.holiday_user import HolidayUser
+from ..routers import get_read_alias, get_routed_alias, read_from
+
+# Reads for a user go to the primary for this long after they change their leave, so they see
+# their own changes even if the replica is behind
+DEFAULT_READ_YOUR_WRITES_SECONDS = 30
+
+ALL_USERS = "all"
+ANY_USER = "any"
+
+
+def _last_write_key(user_id):
+    return f"teamsite_annual_leave:last_write:{user_id}"
+
+
+def mark_write(user_id=None):
+    """
+    Records that a user's leave has just changed, or everyone's if user_id is None (e.g. for public
+    holidays). Stored in the cache so that it is seen by all processes sharing it.
+
+    :param user_id: the pk of the (Django) User
+    """
+    timeout = getattr(
+        settings,
+        "ANNUAL_LEAVE_READ_YOUR_WRITES_SECONDS",
+        DEFAULT_READ_YOUR_WRITES_SECONDS,
+    )
+    key = ALL_USERS if user_id is None else user_id
+    now = time.time()
+    cache.set_many({_last_write_key(key): now, _last_write_key(ANY_USER): now}, timeout)
+
+
+def wrote_recently(user=None):
+    """
+    :param user: a User, or None to only check for changes affecting everyone
+    """
+    keys = [_last_write_key(ALL_USERS)]
+    if user is not None:
+        keys.append(_last_write_key(user.pk))
+    return len(cache.get_many(keys)) > 0
+
+
+def recent_writers(user_ids):
+    """
+    Like wrote_recently, for many users with one cache lookup
+
+    :param user_ids: pks of (Django) Users
+    :return: the set of those whose reads should stay on the primary
+    """
+    keys = {_last_write_key(user_id): user_id for user_id in user_ids}
+    found = cache.get_many(list(keys) + [_last_write_key(ALL_USERS)])
+    if _last_write_key(ALL_USERS) in found:
+        return set(user_ids)
+    return {keys[key] for key in found}
+
+
+def anyone_wrote_recently():
+    """
+    True if any user's reads are currently kept on the primary
+    """
+    return len(cache.get_many([_last_write_key(ANY_USER)])) > 0
+
+
+def split_by_read_database(holiday_users):
+    """
+    Groups users by the database their reports should be read from in the current `reporting`
+    block. Users who have just written already have new cache versions, so their reports are read
+    from the primary rather than from a replica that may not have caught up.
+
+    :param holiday_users: HolidayUsers, a queryset is passed on as is when there is no replica
+    :return: list of (alias, holiday_users), without empty groups
+    """
+    alias = get_routed_alias()
+    if alias is None:
+        return [(DEFAULT_DB_ALIAS, holiday_users)]
+
+    recent = recent_writers([u.user_id for u in holiday_users])
+    groups = [
+        (DEFAULT_DB_ALIAS, [u for u in holiday_users if u.user_id in recent]),
+        (alias, [u for u in holiday_users if u.user_id not in recent]),
+    ]
+    return [(alias, users) for alias, users in groups if users]
+
+
+def get_read_database(user=None):
+    """
+    The alias to read reporting data for the user from: the replica, unless the user has just
+    written.
+    """
+    alias = get_read_alias()
+    if alias is None or wrote_recently(user):
+        return DEFAULT_DB_ALIAS
+    return alias
+
+
+def reporting(user=None):
+    """
+    Sends the reads made in the block to the read replica, if one is configured. Use it only around
+    read-only code. Writes still go to the primary.
+
+    :param user: the User the report is for. Their reads stay on the primary right after they have
+                 changed their leave.
+    """
+    return read_from(get_read_database(user))
+
+
+def reporting_for_everyone():
+    """
+    Like reporting, for data covering all users such as the availability index. It is cached under
+    the USERS version that any user's write bumps, so it is read from the primary while anyone has
+    just written.
+    """
+    alias = get_routed_alias()
+    if alias is not None and anyone_wrote_recently():
+        alias = DEFAULT_DB_ALIAS
+    return read_from(alias)
+
+
+def _get_user_id(instance):
+    if instance.user_id is None:
+        return None
+    if type(instance).user.is_cached(instance):
+        return instance.user.user_id
+    return (
+        HolidayUser.objects.filter(pk=instance.user_id)
+        .values_list("user_id", flat=True)
+        .first()
+    )
+
+
+@receiver([post_save, post_delete], sender=HolidayRecord)
+@receiver([post_save, post_delete], sender=HolidayPlan)
+@receiver([post_save, post_delete], sender=Confirmation)
+def read_your_writes_receiver(sender, instance, **kwargs):
+    if get_read_alias() is not None:
+        mark_write(_get_user_id(instance))
@@ -0,0 +1,36 @@
+from datetime import date
+
+from rest_framework import serializers
+
+
+def _get_date(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise serializers.ValidationError({name: "Expected a date as YYYY-MM-DD"})
+
+
+def filter_records(queryset, params):
+    """
+    Filters HolidayRecords by the query parameters `year`, and `from` and `to` for records that
+    overlap the date range.
+    """
+    year = params.get("year")
+    if year:
+        try:
+            queryset = queryset.filter(year=int(year))
+        except ValueError:
+            raise serializers.ValidationError({"year": "Expected a year"})
+
+    from_date = _get_date(params, "from")
+    if from_date is not None:
+        queryset = queryset.filter(end_date__gte=from_date)
+
+    to_date = _get_date(params, "to")
+    if to_date is not None:
+        queryset = queryset.filter(start_date__lte=to_date)
+
+    return queryset
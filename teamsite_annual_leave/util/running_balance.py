@@ -0,0 +1,155 @@
+from decimal import Decimal
+from math import ceil
+
+from django.db import connections, router
+from django.db.models import (
+    Case,
+    DecimalField,
+    Exists,
+    F,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+    Window,
+)
+from django.db.models.functions import Coalesce
+
+from ..models.holiday_record import HolidayRecord
+from ..models.holiday_record_type import HolidayRecordType
+from ..models.holiday_year import HolidayYear
+from ..models.leave_day import LeaveDay
+from ..tasks.leave_days import is_enabled
+
+_decimal = DecimalField(max_digits=6, decimal_places=2)
+
+
+def supports_running_balance(year, users=None):
+    """
+    The running balance is calculated in the database when it supports window functions and the
+    LeaveDay table has been built for the year, see tasks.leave_days. Closed years are reported from
+    their snapshots, so if any of the users' years is closed the report's rows are used instead.
+
+    :param users: optional queryset or list of (Django) Users
+    """
+    alias = router.db_for_read(HolidayRecord)
+    closed = HolidayYear.objects.filter(year=year, closed__isnull=False)
+    if users is not None:
+        closed = closed.filter(user__user__in=users)
+    return (
+        connections[alias].features.supports_over_clause
+        and is_enabled()
+        and LeaveDay.objects.filter(year=year).exists()
+        and not closed.exists()
+    )
+
+
+def get_running_balance_queryset(year, users=None):
+    """
+    Everyone's records for the year with the days taken and the running totals, as in the details
+    of the holiday report. The totals are window functions,
+    SUM(...) OVER (PARTITION BY user ORDER BY start_date, id), so no second pass is needed.
+
+    Like the workbook, only users with an allowance for the year are included.
+
+    :param users: optional queryset or list of (Django) Users
+    """
+    # LeaveDay has one row per user per day, so a day shared by two records - a morning and an
+    # afternoon off booked separately, see util.overlaps - is split between them
+    leave_type = HolidayRecordType.objects.id_for("AL")
+    shared = Exists(
+        HolidayRecord.objects.filter(
+            user=OuterRef("user"),
+            record_type_id=leave_type,
+            start_date__lte=OuterRef("date"),
+            end_date__gte=OuterRef("date"),
+        ).exclude(pk=OuterRef(OuterRef("pk")))
+    )
+    days_taken = Subquery(
+        LeaveDay.objects.filter(
+            user=OuterRef("user"),
+            year=OuterRef("year"),
+            date__gte=OuterRef("start_date"),
+            date__lte=OuterRef("end_date"),
+        )
+        .annotate(
+            share=Case(
+                When(
+                    (Q(date=OuterRef("start_date")) | Q(date=OuterRef("end_date")))
+                    & Q(taken__gt=0)
+                    & shared,
+                    then=F("taken") * Value(Decimal("0.5")),
+                ),
+                default=F("taken"),
+                output_field=_decimal,
+            )
+        )
+        .values("user")
+        .annotate(taken=Sum("share"))
+        .values("taken"),
+        output_field=_decimal,
+    )
+    window = dict(partition_by=[F("user")], order_by=[F("start_date"), F("id")])
+
+    with_allowance = (
+        HolidayRecord.objects.filter(
+            year=year, record_type_id=HolidayRecordType.objects.id_for("ENT")
+        )
+        .values("user")
+        .annotate(allowance=Sum("adjustment"))
+        .filter(allowance__gt=0)
+        .values("user")
+    )
+
+    records = HolidayRecord.objects.filter(year=year, user__in=with_allowance)
+    if users is not None:
+        records = records.filter(user__user__in=users)
+
+    return (
+        records.select_related("user__user")
+        .annotate(
+            days_taken=Case(
+                When(
+                    record_type_id=leave_type,
+                    then=Coalesce(days_taken, Value(Decimal(0)), output_field=_decimal),
+                ),
+                default=Value(Decimal(0)),
+                output_field=_decimal,
+            ),
+            total_allowance=Window(
+                Sum(Coalesce("adjustment", Value(Decimal(0)), output_field=_decimal)),
+                **window,
+            ),
+            total_used=Window(Sum("days_taken"), **window),
+        )
+        .order_by("user__user__username", "start_date", "id")
+    )
+
+
+def get_running_balance_rows(year, users=None):
+    """
+    The detailed report straight from one cursor
+
+    :return: iterator of rows in holiday_export.DETAIL_COLUMNS order
+    """
+    from .holiday_export import get_display_name
+
+    for record in get_running_balance_queryset(year, users).iterator(chunk_size=2000):
+        user = record.user.user
+        remainder = record.total_allowance - record.total_used
+        yield [
+            user.email,
+            get_display_name(user),
+            year,
+            record.title,
+            record.start_date,
+            record.end_date,
+            record.adjustment,
+            record.days_taken,
+            record.total_used,
+            ceil(remainder * 2) / 2,
+            remainder,
+            record.approved_by,
+        ]
@@ -0,0 +1,122 @@
+import copy
+
+from ..models.confirmation import Confirmation
+from ..models.holiday_plan import HolidayPlan, HolidayPlanCacheLookup
+from ..models.holiday_record import HolidayRecord
+from ..models.holiday_record_type import HolidayRecordType
+from ..models.holiday_year import HolidayYear
+from ..tasks.holiday_plan_tasks import compute_plan_records
+from . import snapshot
+from .closed_years import closed_message
+from .holiday_report import build_holiday_report, get_system_records
+
+
+def _sort_key(record):
+    return record.start_date, record.pk is None, record.pk or 0
+
+
+class LeaveLedger:
+    """
+    A user's records, plans and public holidays for a year, loaded once so that the report can be
+    recalculated for hypothetical changes in memory. Nothing is written to the database. Closed years
+    are reported from their snapshot, as generate_holiday_report does.
+    """
+
+    def __init__(self, holiday_user, year):
+        self.user = holiday_user
+        self.year = int(year)
+        self.closed = (
+            HolidayYear.objects.filter(
+                user=holiday_user, year=self.year, closed__isnull=False
+            )
+            .values_list("snapshot", flat=True)
+            .first()
+        )
+        self.records = list(
+            HolidayRecord.objects.filter(user=holiday_user, year=self.year)
+        )
+        self.system_records = get_system_records(self.year)
+        self.plans = list(HolidayPlan.objects.filter(user=holiday_user))
+        self.last_confirmation = (
+            Confirmation.objects.filter(user=holiday_user, year=self.year)
+            .defer("data")
+            .order_by("-confirmed")
+            .first()
+        )
+
+    def _is_recalculated(self):
+        """
+        Saving a plan only recalculates the years with public holidays or office closures, see
+        holiday_receiver
+        """
+        types = HolidayRecordType.objects.ids_for("PH", "CLS")
+        return any(
+            r.record_type_id in types and r.year == self.year
+            for r in self.system_records
+        )
+
+    def _plan_records(self, plans):
+        """
+        The entitlement and public holiday adjustment records the plans would produce, as
+        recalculate_plans would save them
+        """
+        ph_type = HolidayRecordType.objects.id_for("PH")
+        public_holidays = [
+            r
+            for r in self.system_records
+            if r.record_type_id == ph_type and r.year == self.year
+        ]
+        return compute_plan_records(
+            plans,
+            public_holidays,
+            self.year,
+            HolidayRecordType.objects.get_for_code("ENT"),
+            HolidayRecordType.objects.get_for_code("PHADJ"),
+        )
+
+    def report(self, records=(), deleted=(), plans=None):
+        """
+        :param records: new or changed HolidayRecords. Records with a pk replace the saved record.
+        :param deleted: ids of saved records to leave out
+        :param plans: optionally all of the user's plans, saved or not, replacing the saved ones. The
+                      records derived from plans are then calculated from these.
+        :return: the report as generate_holiday_report would return it after the changes
+        :raises ValueError: if the changes touch the leave of a closed year
+        """
+        changed = {r.pk: r for r in records if r.pk is not None}
+        removed = set(deleted) | set(changed)
+
+        if self.closed is not None:
+            # Plans are not recalculated into closed years, so only leave changes affect them
+            saved = {r.pk for r in self.records}
+            if removed & saved or any(r.year == self.year for r in records):
+                raise ValueError(closed_message(self.year))
+            return snapshot.loads(self.closed)
+        ledger = [r for r in self.records if r.pk not in removed]
+
+        if plans is None:
+            plans = self.plans
+        else:
+            # compute_plan_records tells plans apart by pk, so unsaved plans get a temporary one
+            plans = [copy.copy(p) for p in plans]
+            for ix, plan in enumerate(p for p in plans if p.pk is None):
+                plan.pk = -(ix + 1)
+            if self._is_recalculated():
+                ledger = [r for r in ledger if r.holiday_plan_id is None]
+                ledger += self._plan_records(plans)
+
+        ledger += [r for r in records if r.year == self.year]
+        ledger.sort(key=_sort_key)
+
+        plan_lookup = HolidayPlanCacheLookup()
+        plan_lookup.prime(
+            [self.user], sorted(plans, key=lambda p: p.start_date, reverse=True)
+        )
+        return build_holiday_report(
+            self.user,
+            self.year,
+            ledger,
+            self.system_records,
+            plan_lookup,
+            self.last_confirmation,
+        )
@@ -0,0 +1,54 @@
+import json
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+
+
+def _freeze(value):
+    if isinstance(value, Decimal):
+        return {"$d": str(value)}
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    if isinstance(value, dict):
+        if all(isinstance(k, str) for k in value):
+            return {k: _freeze(v) for k, v in value.items()}
+        return {"$map": [[_freeze(k), _freeze(v)] for k, v in value.items()]}
+    if isinstance(value, (list, tuple)):
+        return [_freeze(v) for v in value]
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, list):
+        return [_thaw(v) for v in value]
+    if isinstance(value, dict):
+        if len(value) == 1:
+            key, item = next(iter(value.items()))
+            if key == "$d":
+                return Decimal(item)
+            if key == "$dt":
+                return datetime.fromisoformat(item)
+            if key == "$date":
+                return date.fromisoformat(item)
+            if key == "$map":
+                return OrderedDict((_thaw(k), _thaw(v)) for k, v in item)
+        return {k: _thaw(v) for k, v in value.items()}
+    return value
+
+
+def dumps(value):
+    """
+    Serialises reports and other nested structures to JSON, keeping Decimals, dates, datetimes and
+    non-string dictionary keys intact so that `loads` returns an equal structure.
+
+    >>> from decimal import Decimal
+    >>> loads(dumps({"total": Decimal("1.5"), "months": {1: Decimal(2)}}))["months"][1]
+    Decimal('2')
+    """
+    return json.dumps(_freeze(value), separators=(",", ":"))
+
+
+def loads(data):
+    return _thaw(json.loads(data))
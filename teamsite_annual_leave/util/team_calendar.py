@@ -0,0 +1,177 @@
+from datetime import timedelta
+
+from ..models.holiday_plan import HolidayPlan
+from ..models.holiday_record import HolidayRecord
+
+# Day states, named after the cell formats used by the calendar sheet in holiday_export.add_calendar
+WORKING = "working"
+NON_WORKING = "non_working"
+NON_WORKING_HALF = "non_working_half"
+HOLIDAY = "holiday"
+HOLIDAY_HALF = "holiday_half"
+NON_WORKING_HOLIDAY = "non_working_holiday"
+WEEKEND = "weekend"
+BANK_HOLIDAY = "bank_holiday"
+
+
+def run_length_encode(values):
+    """
+    >>> run_length_encode(["a", "a", "b", "a"])
+    [['a', 2], ['b', 1], ['a', 1]]
+    """
+    spans = []
+    for value in values:
+        if spans and spans[-1][0] == value:
+            spans[-1][1] += 1
+        else:
+            spans.append([value, 1])
+    return spans
+
+
+class CalendarIndex:
+    """
+    The shared part of the team calendar - which columns are weekends or company closures - plus a
+    per-day lookup of each user's plan. Built once per request and reused for every user row.
+    """
+
+    def __init__(self, start, end, plans, closures):
+        self.start = start
+        self.end = end
+        self.days = [start + timedelta(days=d) for d in range((end - start).days + 1)]
+
+        self.closures = {}
+        for closure in closures:
+            day = max(closure.start_date, start)
+            while day <= min(closure.end_date, end):
+                self.closures.setdefault(day, closure)
+                day += timedelta(days=1)
+
+        self.columns = []
+        for day in self.days:
+            if day.weekday() >= 5:
+                self.columns.append(WEEKEND)
+            elif day in self.closures:
+                self.columns.append(BANK_HOLIDAY)
+            else:
+                self.columns.append(None)
+
+        self.plans = {}
+        for plan in plans:
+            self.plans.setdefault(plan.user_id, []).append(plan)
+
+    def plan_weights(self, user_id):
+        """
+        Returns the working weight for every day in the range. Days without a plan, or covered by a
+        plan with no allowance, have no weight.
+        """
+        plans = self.plans.get(user_id, [])
+        weights = []
+        ix = -1
+        for day in self.days:
+            while ix + 1 < len(plans) and plans[ix + 1].start_date <= day:
+                ix += 1
+            plan = plans[ix] if ix >= 0 else None
+            if plan is None or plan.allowance == 0:
+                weights.append(0)
+            else:
+                weights.append(plan.get_days_for_day_of_week(day.weekday()))
+        return weights
+
+    def user_states(self, user_id, leave_records):
+        weights = self.plan_weights(user_id)
+        states = []
+        for weight in weights:
+            if weight == 0:
+                states.append(NON_WORKING)
+            elif weight < 1:
+                states.append(NON_WORKING_HALF)
+            else:
+                states.append(WORKING)
+
+        for record in leave_records:
+            day = max(record.start_date, self.start)
+            while day <= min(record.end_date, self.end):
+                days_requested = 1
+                if record.start_half and day == record.start_date:
+                    days_requested = 0.5
+                elif record.end_half and day == record.end_date:
+                    days_requested = 0.5
+
+                offset = (day - self.start).days
+                working_hours = weights[offset]
+                allowance_used = min(working_hours, days_requested)
+                if allowance_used > 0:
+                    if allowance_used == 1:
+                        states[offset] = HOLIDAY
+                    elif working_hours < 1:
+                        states[offset] = NON_WORKING_HOLIDAY
+                    else:
+                        states[offset] = HOLIDAY_HALF
+                day += timedelta(days=1)
+
+        return states
+
+    def user_spans(self, user_id, leave_records):
+        """
+        Run-length encoded row for a user. Weekend and closure columns are the same for everyone, so
+        they are sent once in `columns` and the row state simply carries across them rather than
+        breaking every run twice a week.
+        """
+        states = self.user_states(user_id, leave_records)
+        previous = None
+        for offset, column in enumerate(self.columns):
+            if column is None:
+                previous = states[offset]
+            elif previous is not None:
+                states[offset] = previous
+
+        # Leading weekend / closure columns take the state of the first normal day
+        first = next((s for s, c in zip(states, self.columns) if c is None), None)
+        for offset, column in enumerate(self.columns):
+            if column is None or first is None:
+                break
+            states[offset] = first
+
+        return run_length_encode(states)
+
+
+def build_team_calendar(start, end, users):
+    """
+    Builds the team calendar grid for a queryset of HolidayUsers between start and end (inclusive),
+    with every user row run-length encoded.
+    """
+    plans = HolidayPlan.objects.filter(user__in=users, start_date__lte=end).order_by(
+        "user_id", "start_date"
+    )
+    closures = HolidayRecord.objects.filter(
+        user__isnull=True, start_date__lte=end, end_date__gte=start
+    ).order_by("start_date")
+    index = CalendarIndex(start, end, plans, closures)
+
+    leave = {}
+    for record in HolidayRecord.objects.filter(
+        user__in=users,
+        record_type__system_option=False,
+        start_date__lte=end,
+        end_date__gte=start,
+    ):
+        leave.setdefault(record.user_id, []).append(record)
+
+    return dict(
+        start=start,
+        end=end,
+        columns=run_length_encode([c or "" for c in index.columns]),
+        closures=[
+            dict(date=day, title=closure.title)
+            for day, closure in sorted(index.closures.items())
+        ],
+        users=[
+            dict(
+                id=user.pk,
+                username=user.user.username,
+                name=user.user.get_full_name(),
+                spans=index.user_spans(user.pk, leave.get(user.pk, [])),
+            )
+            for user in users.select_related("user")
+        ],
+    )
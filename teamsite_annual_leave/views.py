@@ -1,17 +1,96 @@
-from datetime import date
+import copy
+from datetime import date, timedelta
 
-from rest_framework import permissions, serializers, viewsets
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response
+from rest_framework import mixins, permissions, serializers, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from .models.confirmation import Confirmation
+from .models.export_job import ExportJob
 from .models.holiday_record import HolidayRecord
+from .models.holiday_record_type import HolidayRecordType
 from .models.holiday_user import HolidayUser
+from .pagination import RecordKeysetPagination
 from .permissions import IsEditableHoliday
+from .renderers import ICalendarRenderer
 from .serializers.activity_serializers import ActivitySummarySerializer
+from .serializers.availability_serializers import (
+    HeadcountSerializer,
+    OutOfOfficeSerializer,
+)
 from .serializers.confirmation_serializer import ConfirmationSerializer
+from .serializers.export_job_serializer import ExportJobSerializer
 from .serializers.holiday_record_serializer import HolidayRecordSerializer
+from .serializers.record_batch_serializer import RecordBatchSerializer
+from .serializers.team_calendar_serializer import TeamCalendarSerializer
+from .tasks.export_jobs import get_export_storage, request_export
+from .util import get_record_types_change_key, get_records_change_key
+from .util.availability import get_availability_index
+from .util.closed_years import closed_message, find_closed
+from .util.confirmations import diff_confirmations
 from .util.holiday_report import generate_holiday_report
+from .util.ical import calendar_etag, get_cached_calendar, render_calendar
+from .util.overlaps import find_overlapping, overlap_message
+from .util.public_holidays import get_public_holiday_data
+from .util.record_filters import filter_records
+from .util.simulation import LeaveLedger
+from .util.team_calendar import build_team_calendar
+
+MAX_RANGE_DAYS = 731
+
+
+def _get_date_param(request, name, default=None):
+    value = request.query_params.get(name)
+    if value is None:
+        if default is None:
+            raise serializers.ValidationError({name: "This parameter is required"})
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise serializers.ValidationError({name: "Dates must be YYYY-MM-DD"})
+
+
+def _get_date_range_params(request, default_days=0, default_start=None):
+    start = _get_date_param(request, "start", default_start or date.today())
+    end = _get_date_param(request, "end", start + timedelta(days=default_days))
+    if end < start:
+        raise serializers.ValidationError({"end": "End must not be before start"})
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise serializers.ValidationError(
+            {"end": f"Ranges are limited to {MAX_RANGE_DAYS} days"}
+        )
+    return start, end
+
+
+def _check_overlaps(record):
+    other = find_overlapping(record)
+    if other is not None:
+        raise serializers.ValidationError(overlap_message(other))
+
+
+def _check_open(*records):
+    closed = find_closed(records)
+    if closed:
+        raise serializers.ValidationError(closed_message(min(y for _, y in closed)))
+
+
+def _calendar_response(request, scope, change_key, render):
+    """
+    Serves a cached calendar, answering conditional requests with a 304 without touching the cache.
+    The record types decide which records are in a feed, so their changes are part of the key.
+    """
+    change_key = f"{change_key}.{get_record_types_change_key()}"
+    etag = calendar_etag(scope, change_key)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        etag, body = get_cached_calendar(scope, change_key, render)
+        response = Response(body)
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, max-age=0, must-revalidate"
+    return response
 
 
 class HolidayRecordViewSet(viewsets.ModelViewSet):
@@ -21,37 +100,105 @@ class HolidayRecordViewSet(viewsets.ModelViewSet):
 
     permission_classes = [permissions.IsAuthenticated, IsEditableHoliday]
     serializer_class = HolidayRecordSerializer
+    pagination_class = RecordKeysetPagination
 
     def get_queryset(self):
-        return HolidayRecord.objects.filter(user__user=self.request.user).order_by(
-            "start_date"
+        return (
+            HolidayRecord.objects.filter(user__user=self.request.user)
+            .select_related("record_type")
+            .order_by("start_date")
         )
 
+    def filter_queryset(self, queryset):
+        if self.action == "list":
+            queryset = filter_records(queryset, self.request.query_params)
+        return queryset
+
     def perform_create(self, serializer):
         start_date = serializer.validated_data.get("start_date")
         if start_date < date.today():
             raise serializers.ValidationError("Leave cannot be in the past")
         holiday_user = HolidayUser.objects.get(user=self.request.user)
-        serializer.save(user=holiday_user, record_type_id=5)
+        record = HolidayRecord(user=holiday_user, **serializer.validated_data)
+        _check_open(record)
+        _check_overlaps(record)
+        serializer.save(
+            user=holiday_user, record_type_id=HolidayRecordType.objects.id_for("AL")
+        )
 
     def perform_update(self, serializer):
-        id = serializer.initial_data["id"]
-
         start_date = serializer.validated_data.get("start_date", date.today())
-
-        original = HolidayRecord.objects.get(id=id)
-        start_date = min(start_date, original.start_date)
+        start_date = min(start_date, serializer.instance.start_date)
 
         if start_date < date.today():
             raise serializers.ValidationError("Leave cannot be in the past")
 
+        record = copy.copy(serializer.instance)
+        for field, value in serializer.validated_data.items():
+            setattr(record, field, value)
+        _check_open(serializer.instance, record)
+        _check_overlaps(record)
+
         super().perform_update(serializer)
 
     def perform_destroy(self, instance):
         if instance.start_date < date.today():
             raise serializers.ValidationError("Leave cannot be in the past")
+        _check_open(instance)
         super().perform_destroy(instance)
 
+    @action(detail=False, methods=["post"])
+    def batch(self, request):
+        """
+        Creates, updates and deletes many records at once, e.g.
+        {"create": [{...}], "update": [{"id": 1, ...}], "delete": [2, 3]}. Nothing is changed if any
+        operation is invalid. Returns the changed records and the activity summary for the year, or
+        optionally another year.
+        """
+        holiday_user = HolidayUser.objects.get(user=request.user)
+        serializer = RecordBatchSerializer(
+            data=request.data,
+            context=dict(queryset=self.get_queryset(), holiday_user=holiday_user),
+        )
+        serializer.is_valid(raise_exception=True)
+        result = serializer.save()
+
+        year = request.query_params.get("year", date.today().year)
+        summary = generate_holiday_report(request.user, year)
+
+        return Response(
+            dict(
+                created=HolidayRecordSerializer(result["created"], many=True).data,
+                updated=HolidayRecordSerializer(result["updated"], many=True).data,
+                deleted=result["deleted"],
+                activity=ActivitySummarySerializer(summary).data,
+            )
+        )
+
+    @action(detail=False, methods=["post"])
+    def simulate(self, request):
+        """
+        The activity summary for the year, or optionally another year, as it would be after a batch
+        of changes (see batch). The changes are validated the same way but not saved.
+        """
+        holiday_user = HolidayUser.objects.get(user=request.user)
+        serializer = RecordBatchSerializer(
+            data=request.data,
+            context=dict(queryset=self.get_queryset(), holiday_user=holiday_user),
+        )
+        serializer.is_valid(raise_exception=True)
+        changes = serializer.validated_data
+
+        year = request.query_params.get("year", date.today().year)
+        try:
+            summary = LeaveLedger(holiday_user, year).report(
+                records=changes["create"] + [record for record, _ in changes["update"]],
+                deleted=changes["delete"],
+            )
+        except ValueError as e:
+            raise serializers.ValidationError({"year": str(e)})
+        return Response(ActivitySummarySerializer(summary).data)
+
     @action(detail=False)
     def activity(self, request):
         """
@@ -70,10 +217,47 @@ class HolidayRecordViewSet(viewsets.ModelViewSet):
     @action(detail=False)
     def public(self, request):
         year = request.query_params.get("year", date.today().year)
-        qs = HolidayRecord.objects.filter(user__isnull=True, year=year).order_by(
-            "start_date"
+        return Response(get_public_holiday_data(year))
+
+    @action(detail=False, renderer_classes=[ICalendarRenderer])
+    def ical(self, request):
+        """
+        iCalendar feed of the current user's leave, suitable for calendar subscriptions
+        """
+        holiday_user = HolidayUser.objects.get(user=request.user)
+        records = HolidayRecord.objects.filter(user=holiday_user)
+        name = request.user.get_full_name() or request.user.username
+
+        return _calendar_response(
+            request,
+            f"user-{holiday_user.pk}",
+            get_records_change_key(records),
+            lambda: render_calendar(
+                records.filter(record_type__system_option=False).order_by("start_date"),
+                f"Annual Leave - {name}",
+            ),
+        )
+
+    @action(
+        detail=False,
+        url_path="public/ical",
+        url_name="public-ical",
+        renderer_classes=[ICalendarRenderer],
+    )
+    def public_ical(self, request):
+        """
+        iCalendar feed of public holidays and office closures
+        """
+        records = HolidayRecord.objects.filter(user__isnull=True)
+
+        return _calendar_response(
+            request,
+            "public",
+            get_records_change_key(records),
+            lambda: render_calendar(
+                records.order_by("start_date"), "Public Holidays & Closures"
+            ),
         )
-        return Response(HolidayRecordSerializer(qs, many=True).data)
 
 
 class ConfirmationViewSet(viewsets.ModelViewSet):
@@ -81,10 +265,172 @@ class ConfirmationViewSet(viewsets.ModelViewSet):
     serializer_class = ConfirmationSerializer
 
     def get_queryset(self):
-        return Confirmation.objects.filter(user=self.request.user).order_by(
-            "-confirmed"
+        return (
+            Confirmation.objects.filter(user__user=self.request.user)
+            .select_related("snapshot")
+            .defer("snapshot__data", "data")
+            .order_by("-confirmed")
         )
 
     def perform_create(self, serializer):
         holiday_user = HolidayUser.objects.get(user=self.request.user)
         serializer.save(user=holiday_user)
+
+    @action(detail=True)
+    def diff(self, request, pk=None):
+        """
+        What changed between this confirmation and the one given in `against`, which defaults to the
+        previous confirmation for the same year
+        """
+        confirmation = self.get_object()
+        against = request.query_params.get("against")
+        if against:
+            try:
+                before = self.get_queryset().get(pk=int(against))
+            except (ValueError, Confirmation.DoesNotExist):
+                raise serializers.ValidationError({"against": "Unknown confirmation"})
+        else:
+            before = (
+                self.get_queryset()
+                .filter(year=confirmation.year, confirmed__lt=confirmation.confirmed)
+                .first()
+            )
+
+        data = diff_confirmations(before, confirmation)
+        data["id"] = confirmation.pk
+        data["against"] = None if before is None else before.pk
+        return Response(data)
+
+
+class AvailabilityViewSet(viewsets.ViewSet):
+    """
+    Organisation-wide availability, answered from the in-process availability index.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    @action(detail=False)
+    def out(self, request):
+        """
+        Lists everyone who is not working a full day on the given date (defaults to today)
+        """
+        day = _get_date_param(request, "date", date.today())
+        index = get_availability_index(day.year)
+        data = dict(
+            date=day,
+            headcount=index.headcount(day)[0],
+            out=[dict(user=u, reason=reason) for u, reason in index.out_on(day)],
+        )
+        return Response(OutOfOfficeSerializer(data).data)
+
+    @action(detail=False)
+    def headcount(self, request):
+        """
+        Number of people available for each day between start and end (inclusive)
+        """
+        start, end = _get_date_range_params(request)
+        indexes = {
+            year: get_availability_index(year)
+            for year in range(start.year, end.year + 1)
+        }
+        result = []
+        day = start
+        while day <= end:
+            available, partial = indexes[day.year].headcount(day)
+            result.append(dict(date=day, available=available, partial=partial))
+            day += timedelta(days=1)
+        return Response(HeadcountSerializer(result, many=True).data)
+
+    @action(detail=False)
+    def first_available(self, request):
+        """
+        The first date on which all the listed users (comma separated usernames) are working a full day
+        """
+        usernames = request.query_params.get("users")
+        if not usernames:
+            raise serializers.ValidationError({"users": "This parameter is required"})
+        usernames = {u.strip().lower() for u in usernames.split(",") if u.strip()}
+        start, end = _get_date_range_params(request, default_days=365)
+
+        for year in range(start.year, end.year + 1):
+            index = get_availability_index(year)
+            user_ids = [
+                u.pk for u in index.users if u.user.username.lower() in usernames
+            ]
+            if len(user_ids) != len(usernames):
+                raise serializers.ValidationError({"users": "Unknown user"})
+
+            day = index.first_all_available(user_ids, start, end)
+            if day is not None:
+                return Response(dict(date=day))
+
+        return Response(dict(date=None))
+
+
+class TeamCalendarViewSet(viewsets.ViewSet):
+    """
+    The team calendar grid as JSON, with each user's row run-length encoded.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        """
+        Optional parameters: start & end dates (defaults to the next six months from the start of this
+        week) and users, a comma separated list of usernames
+        """
+        monday = date.today() - timedelta(days=date.today().weekday())
+        start, end = _get_date_range_params(
+            request, default_days=181, default_start=monday
+        )
+
+        users = HolidayUser.objects.filter(holiday_plans__isnull=False).distinct()
+        usernames = request.query_params.get("users")
+        if usernames:
+            usernames = [u.strip() for u in usernames.split(",") if u.strip()]
+            users = users.filter(user__username__in=usernames)
+        users = users.order_by("user__username")
+
+        calendar = build_team_calendar(start, end, users)
+        return Response(TeamCalendarSerializer(calendar).data)
+
+
+class ExportJobViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.ListModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Holiday report exports. Created jobs are run by the run-export-jobs worker; poll the job for
+    progress and fetch the workbook from download once it is done.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+    serializer_class = ExportJobSerializer
+
+    def get_queryset(self):
+        return ExportJob.objects.select_related("requested_by").order_by("-created")
+
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        serializer.instance = request_export(
+            data["year"],
+            usernames=data.get("usernames"),
+            config=data.get("config", "csd"),
+            requested_by=self.request.user,
+        )
+
+    @action(detail=True)
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != ExportJob.DONE:
+            raise serializers.ValidationError({"status": "The export has not finished"})
+        storage = get_export_storage()
+        if not storage.exists(job.artifact):
+            raise serializers.ValidationError({"status": "The export has expired"})
+        return FileResponse(
+            storage.open(job.artifact, "rb"),
+            as_attachment=True,
+            filename=job.filename,
+        )
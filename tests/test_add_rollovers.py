@@ -0,0 +1,120 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from teamsite_annual_leave.models.holiday_plan import HolidayPlan
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.models.holiday_user import HolidayUser
+from teamsite_annual_leave.tasks.add_rollovers import add_rollovers
+from teamsite_annual_leave.util.bank_holiday_parser import (
+    load_holiday_fixtures,
+    synchronise_holidays,
+)
+
+User = get_user_model()
+
+
+class AddRolloversTest(TestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        synchronise_holidays(load_holiday_fixtures())
+        self.users = {}
+        for username, days_taken in (("alice", 10), ("bob", 24)):
+            holiday_user = HolidayUser.objects.create(
+                user=User.objects.create_user(username)
+            )
+            HolidayPlan.objects.create(
+                user=holiday_user, start_date="2022-01-01", allowance=25
+            )
+            self._book(holiday_user, date(2022, 2, 1), days_taken)
+            self.users[username] = holiday_user
+
+    def _book(self, holiday_user, start_date, working_days):
+        end_date = start_date
+        while working_days > 0:
+            if end_date.weekday() < 5:
+                working_days -= 1
+            end_date += timedelta(days=1)
+
+        return HolidayRecord.objects.create(
+            user=holiday_user,
+            start_date=start_date,
+            end_date=end_date - timedelta(days=1),
+            record_type_id=5,
+            year=start_date.year,
+        )
+
+    def _rollovers(self, holiday_user):
+        return list(
+            HolidayRecord.objects.filter(user=holiday_user, record_type__code="ROL")
+            .order_by("start_date")
+            .values_list("start_date", "adjustment")
+        )
+
+    def test_add_rollovers(self):
+        changes = add_rollovers(2022)
+
+        self.assertEqual(
+            [(c.user.user.username, c.previous, c.amount) for c in changes],
+            [("alice", 0, 5), ("bob", 0, 1)],
+        )
+        self.assertEqual(
+            self._rollovers(self.users["alice"]),
+            [(date(2022, 12, 31), Decimal(-5)), (date(2023, 1, 1), Decimal(5))],
+        )
+        self.assertEqual(
+            self._rollovers(self.users["bob"]),
+            [(date(2022, 12, 31), Decimal(-1)), (date(2023, 1, 1), Decimal(1))],
+        )
+
+    def test_rerun_is_noop(self):
+        add_rollovers(2022)
+        ids = list(HolidayRecord.objects.filter(record_type__code="ROL").values("id"))
+
+        self.assertEqual(add_rollovers(2022), [])
+        self.assertEqual(
+            list(HolidayRecord.objects.filter(record_type__code="ROL").values("id")),
+            ids,
+        )
+
+    def test_dry_run(self):
+        changes = add_rollovers(2022, dry_run=True)
+
+        self.assertEqual(len(changes), 2)
+        self.assertFalse(HolidayRecord.objects.filter(record_type__code="ROL").exists())
+
+    def test_single_user(self):
+        add_rollovers(2022)
+        self._book(self.users["alice"], date(2022, 3, 14), 11)
+        self._book(self.users["bob"], date(2022, 3, 31), 1)
+
+        changes = add_rollovers(2022, users=[self.users["alice"].user])
+
+        self.assertEqual([(c.previous, c.amount) for c in changes], [(5, 4)])
+        self.assertEqual(
+            self._rollovers(self.users["alice"]),
+            [(date(2022, 12, 31), Decimal(-4)), (date(2023, 1, 1), Decimal(4))],
+        )
+        self.assertEqual(self._rollovers(self.users["bob"])[1][1], 1)
+
+    def test_query_count_does_not_grow_with_users(self):
+        with CaptureQueriesContext(connection) as two_users:
+            add_rollovers(2022, dry_run=True)
+
+        holiday_user = HolidayUser.objects.create(
+            user=User.objects.create_user("carol")
+        )
+        HolidayPlan.objects.create(
+            user=holiday_user, start_date="2022-01-01", allowance=25
+        )
+        self._book(holiday_user, date(2022, 2, 1), 5)
+
+        with CaptureQueriesContext(connection) as three_users:
+            add_rollovers(2022, dry_run=True)
+
+        self.assertEqual(len(two_users), len(three_users))
@@ -0,0 +1,115 @@
+import csv
+import io
+import json
+import zipfile
+from datetime import date
+from unittest import skipIf, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from teamsite_annual_leave.models.holiday_plan import HolidayPlan
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.models.holiday_user import HolidayUser
+from teamsite_annual_leave.util import analytics_export
+from teamsite_annual_leave.util.analytics_export import write_analytics_export
+from teamsite_annual_leave.util.bank_holiday_parser import (
+    load_holiday_fixtures,
+    synchronise_holidays,
+)
+from teamsite_annual_leave.util.holiday_export import create_holiday_report
+
+User = get_user_model()
+
+
+class AnalyticsExportTest(TestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        synchronise_holidays(load_holiday_fixtures())
+        for username in ("bob", "alice"):
+            holiday_user = HolidayUser.objects.create(
+                user=User.objects.create_user(
+                    username, email=f"{username}@example.com", first_name=username
+                )
+            )
+            HolidayPlan.objects.create(
+                user=holiday_user, start_date="2022-01-01", allowance=25
+            )
+            HolidayRecord.objects.create(
+                user=holiday_user,
+                start_date=date(2023, 8, 1),
+                end_date=date(2023, 8, 2),
+                record_type_id=5,
+                year=2023,
+            )
+
+    def _export(self, dataset, format, **kwargs):
+        fh = io.BytesIO()
+        count = write_analytics_export(fh, dataset, format, [2022, 2023], **kwargs)
+        return count, fh.getvalue().decode("utf-8")
+
+    def test_summary_csv(self):
+        count, data = self._export("summary", "csv")
+        rows = list(csv.DictReader(io.StringIO(data)))
+        self.assertEqual(count, 4)
+        self.assertEqual(
+            [(r["email"], r["year"]) for r in rows],
+            [
+                ("alice@example.com", "2022"),
+                ("bob@example.com", "2022"),
+                ("alice@example.com", "2023"),
+                ("bob@example.com", "2023"),
+            ],
+        )
+        self.assertEqual(rows[0]["name"], "alice")
+        self.assertEqual(float(rows[2]["total_used"]), 2)
+
+    def test_row_groups_do_not_change_output(self):
+        self.assertEqual(
+            self._export("detail", "csv"),
+            self._export("detail", "csv", row_group_size=1),
+        )
+
+    def test_detail_ndjson(self):
+        count, data = self._export("detail", "ndjson", usernames="alice")
+        rows = [json.loads(line) for line in data.splitlines()]
+        self.assertEqual(len(rows), count)
+        leave = [r for r in rows if r["start_date"] == "2023-08-01"]
+        self.assertEqual(len(leave), 1)
+        self.assertEqual(leave[0]["days_taken"], 2)
+
+    @skipIf(analytics_export.get_pyarrow() is not None, "pyarrow is installed")
+    def test_columnar_falls_back_to_ndjson(self):
+        self.assertEqual(
+            self._export("summary", "columnar"), self._export("summary", "ndjson")
+        )
+
+    @skipUnless(analytics_export.get_pyarrow() is not None, "pyarrow is not installed")
+    def test_parquet(self):  # pragma: no cover
+        import pyarrow.parquet
+
+        fh = io.BytesIO()
+        count = write_analytics_export(fh, "detail", "parquet", [2023])
+        table = pyarrow.parquet.read_table(io.BytesIO(fh.getvalue()))
+        self.assertEqual(table.num_rows, count)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command(
+            "export-leave-data",
+            "summary",
+            "--year=2023",
+            "--output=/dev/null",
+            stdout=out,
+        )
+        self.assertIn("Wrote 2 rows", out.getvalue())
+
+    def test_workbook_uses_same_rows(self):
+        fh = io.BytesIO()
+        create_holiday_report(fh, None, 2023, config="sd")
+        with zipfile.ZipFile(fh) as workbook:
+            strings = workbook.read("xl/sharedStrings.xml").decode("utf-8")
+        self.assertIn("alice@example.com", strings)
+        self.assertIn("Remaining Days (exact)", strings)
@@ -0,0 +1,72 @@
+import json
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from teamsite_annual_leave.models.confirmation import Confirmation
+from teamsite_annual_leave.models.holiday_plan import HolidayPlan
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.models.holiday_user import HolidayUser
+from teamsite_annual_leave.util.bank_holiday_parser import (
+    load_holiday_fixtures,
+    synchronise_holidays,
+)
+
+User = get_user_model()
+
+
+@override_settings(ROOT_URLCONF="tests.urls")
+class AsyncViewsTest(TestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        synchronise_holidays(load_holiday_fixtures())
+        self.user = User.objects.create_user("holidayuser1")
+        self.holiday_user = HolidayUser.objects.create(user=self.user)
+        HolidayPlan.objects.create(
+            user=self.holiday_user, start_date="2022-01-01", allowance=25
+        )
+        HolidayRecord.objects.create(
+            user=self.holiday_user,
+            start_date=date(2023, 5, 26),
+            end_date=date(2023, 6, 2),
+            start_half=True,
+            record_type_id=5,
+            year=2023,
+        )
+        Confirmation.objects.create(user=self.holiday_user, year=2023)
+
+        self.sync_client = APIClient()
+        self.sync_client.force_authenticate(user=self.user)
+        self.client.force_login(self.user)
+
+    def assertSameAsSync(self, path):
+        expected = self.sync_client.get(f"/holiday/{path}")
+        self.assertEqual(expected.status_code, 200)
+
+        response = self.client.get(f"/holiday/async/{path}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+    def test_records(self):
+        self.assertSameAsSync("me/")
+
+    def test_activity(self):
+        self.assertSameAsSync("me/activity/?year=2023")
+
+    def test_public(self):
+        self.assertSameAsSync("me/public/?year=2023")
+
+    def test_confirmations(self):
+        self.assertSameAsSync("confirmation/")
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.client.get("/holiday/async/me/")
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_login(self.user)
+        response = self.client.post("/holiday/async/me/")
+        self.assertEqual(response.status_code, 405)
@@ -0,0 +1,181 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from teamsite_annual_leave.models.holiday_plan import HolidayPlan
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.models.holiday_user import HolidayUser
+from teamsite_annual_leave.util.availability import (
+    OUT_CLOSED,
+    OUT_HALF_DAY,
+    OUT_LEAVE,
+    OUT_NON_WORKING,
+    clear_availability_indexes,
+    get_availability_index,
+)
+
+User = get_user_model()
+
+
+@override_settings(ROOT_URLCONF="tests.urls")
+class AvailabilityTest(TestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        clear_availability_indexes()
+        self.users = {}
+        for username in ("alice", "bob", "carol"):
+            user = User.objects.create_user(username)
+            self.users[username] = HolidayUser.objects.create(user=user)
+
+        HolidayPlan.objects.create(
+            user=self.users["alice"], start_date="2020-01-01", allowance=25
+        )
+        HolidayPlan.objects.create(
+            user=self.users["bob"], start_date="2020-01-01", allowance=25, mon_days=0
+        )
+        HolidayPlan.objects.create(
+            user=self.users["carol"], start_date="2020-01-01", allowance=25
+        )
+
+        # Alice is off Mon 3rd - Wed 5th July, Carol has Wednesday morning off
+        HolidayRecord.objects.create(
+            user=self.users["alice"],
+            start_date="2023-07-03",
+            end_date="2023-07-05",
+            record_type_id=5,
+            year=2023,
+        )
+        HolidayRecord.objects.create(
+            user=self.users["carol"],
+            start_date="2023-07-05",
+            end_date="2023-07-05",
+            start_half=True,
+            record_type_id=5,
+            year=2023,
+        )
+        HolidayRecord.objects.create(
+            start_date="2023-08-28",
+            end_date="2023-08-28",
+            record_type_id=3,
+            title="Summer Bank Holiday",
+            year=2023,
+        )
+
+    def _out(self, index, day):
+        return {u.user.username: reason for u, reason in index.out_on(day)}
+
+    def test_out_on(self):
+        index = get_availability_index(2023)
+
+        self.assertEqual(
+            self._out(index, date(2023, 7, 3)),
+            {"alice": OUT_LEAVE, "bob": OUT_NON_WORKING},
+        )
+        self.assertEqual(
+            self._out(index, date(2023, 7, 5)),
+            {"alice": OUT_LEAVE, "carol": OUT_HALF_DAY},
+        )
+        self.assertEqual(
+            self._out(index, date(2023, 8, 28)),
+            {"alice": OUT_CLOSED, "bob": OUT_NON_WORKING, "carol": OUT_CLOSED},
+        )
+        self.assertEqual(len(self._out(index, date(2023, 7, 8))), 3)  # Saturday
+
+    def test_headcount(self):
+        index = get_availability_index(2023)
+
+        self.assertEqual(index.headcount(date(2023, 7, 3)), (1, 0))
+        self.assertEqual(index.headcount(date(2023, 7, 4)), (2, 0))
+        self.assertEqual(index.headcount(date(2023, 7, 5)), (1, 1))
+        self.assertEqual(index.headcount(date(2023, 7, 6)), (3, 0))
+        self.assertEqual(index.headcount(date(2023, 8, 28)), (0, 0))
+
+    def test_first_all_available(self):
+        index = get_availability_index(2023)
+        ids = [self.users[u].pk for u in ("alice", "bob", "carol")]
+
+        self.assertEqual(
+            index.first_all_available(ids, date(2023, 7, 3), date(2023, 7, 31)),
+            date(2023, 7, 6),
+        )
+        self.assertIsNone(
+            index.first_all_available(ids, date(2023, 7, 3), date(2023, 7, 5))
+        )
+
+    def test_index_is_cached_until_change(self):
+        index = get_availability_index(2023)
+        with self.assertNumQueries(3):
+            self.assertIs(get_availability_index(2023), index)
+
+        HolidayRecord.objects.create(
+            user=self.users["carol"],
+            start_date="2023-07-06",
+            end_date="2023-07-06",
+            record_type_id=5,
+            year=2023,
+        )
+        index = get_availability_index(2023)
+        self.assertEqual(index.headcount(date(2023, 7, 6)), (2, 0))
+
+    def test_users_without_plans_and_leavers(self):
+        HolidayUser.objects.create(user=User.objects.create_user("dave"))
+        HolidayPlan.objects.create(
+            user=self.users["carol"], start_date="2023-07-01", allowance=0
+        )
+        index = get_availability_index(2023)
+        self.assertEqual(self._out(index, date(2023, 6, 26)), {"bob": OUT_NON_WORKING})
+        self.assertEqual(
+            self._out(index, date(2023, 7, 3)),
+            {"alice": OUT_LEAVE, "bob": OUT_NON_WORKING},
+        )
+
+    def test_new_user_without_records(self):
+        get_availability_index(2023)
+        HolidayUser.objects.create(user=User.objects.create_user("dave"))
+        self.assertIn(
+            "dave", [u.user.username for u in get_availability_index(2023).users]
+        )
+
+    def test_headcount_resolves_each_year_once(self):
+        client = APIClient()
+        client.force_authenticate(self.users["alice"].user)
+        get_availability_index(2022)
+        get_availability_index(2023)
+        with self.assertNumQueries(6):
+            response = client.get(
+                "/holiday/availability/headcount/",
+                {"start": "2022-01-01", "end": "2023-12-31"},
+            )
+        self.assertEqual(len(response.data), 730)
+
+    def test_api(self):
+        client = APIClient()
+        client.force_authenticate(self.users["alice"].user)
+
+        response = client.get("/holiday/availability/out/", {"date": "2023-07-05"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["headcount"], 1)
+        self.assertEqual(
+            [(o["username"], o["reason"]) for o in response.data["out"]],
+            [("alice", OUT_LEAVE), ("carol", OUT_HALF_DAY)],
+        )
+
+        response = client.get(
+            "/holiday/availability/headcount/",
+            {"start": "2023-07-03", "end": "2023-07-09"},
+        )
+        self.assertEqual([d["available"] for d in response.data], [1, 2, 1, 3, 3, 0, 0])
+
+        response = client.get(
+            "/holiday/availability/first_available/",
+            {"users": "alice,carol", "start": "2023-07-03"},
+        )
+        self.assertEqual(response.data, {"date": date(2023, 7, 6)})
+
+        response = client.get(
+            "/holiday/availability/first_available/", {"users": "nobody"}
+        )
+        self.assertEqual(response.status_code, 400)
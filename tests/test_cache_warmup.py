@@ -0,0 +1,171 @@
+from datetime import date
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from teamsite_annual_leave.models.holiday_plan import HolidayPlan
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.models.holiday_user import HolidayUser
+from teamsite_annual_leave.util import availability
+from teamsite_annual_leave.util.bank_holiday_parser import (
+    load_holiday_fixtures,
+    synchronise_holidays,
+)
+from teamsite_annual_leave.util.cache_warmup import CacheWarmup, get_coverage
+from teamsite_annual_leave.util.holiday_report import generate_holiday_report
+from teamsite_annual_leave.util.leave_cache import (
+    get_cache,
+    get_cache_stats,
+    reset_cache_stats,
+)
+from teamsite_annual_leave.util.read_replica import mark_write
+
+User = get_user_model()
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "leave": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "leave",
+    },
+}
+
+
+@override_settings(CACHES=CACHES, ANNUAL_LEAVE_CACHE="leave")
+class CacheWarmupTest(TestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        get_cache().clear()
+        synchronise_holidays(load_holiday_fixtures())
+        for ix in range(5):
+            user = User.objects.create_user(f"holidayuser{ix}")
+            holiday_user = HolidayUser.objects.create(user=user)
+            HolidayPlan.objects.create(
+                user=holiday_user, start_date=date(2022, 1, 1), allowance=25
+            )
+            HolidayRecord.objects.create(
+                user=holiday_user,
+                start_date=date(2023, 9, 4),
+                end_date=date(2023, 9, 4 + ix),
+                record_type_id=5,
+                year=2023,
+            )
+        reset_cache_stats()
+
+    def _warm(self, **kwargs):
+        return CacheWarmup([2023, 2024], chunk_size=2, **kwargs).run()
+
+    def test_warm(self):
+        stages = self._warm()
+        self.assertEqual(get_coverage(stages), 1)
+        self.assertEqual(
+            [(s.name, s.year, s.warmed, s.total) for s in stages[:4]],
+            [
+                ("closures", 2023, 1, 1),
+                ("public holidays", 2023, 1, 1),
+                ("summaries", 2023, 5, 5),
+                ("availability", 2023, 1, 1),
+            ],
+        )
+
+        reset_cache_stats()
+        user = User.objects.get(username="holidayuser3")
+        with self.assertNumQueries(0):
+            generate_holiday_report(user, 2023)
+        self.assertEqual(get_cache_stats()["summary"], dict(hits=1, misses=0))
+
+        stages = self._warm()
+        self.assertEqual(sum(s.warmed for s in stages), 0)
+        self.assertEqual(get_coverage(stages), 1)
+
+    def test_budget(self):
+        stages = self._warm(budget=0)
+        self.assertEqual(get_coverage(stages), 0)
+        self.assertEqual(len(stages), 8)
+        self.assertNotIn("summary", get_cache_stats())
+
+    def test_parallel(self):
+        stages = self._warm(workers=2)
+        self.assertEqual(get_coverage(stages), 1)
+
+        expected = {}
+        with self.settings(ANNUAL_LEAVE_CACHE=None):
+            for user in User.objects.all():
+                expected[user.pk] = generate_holiday_report(user, 2023)
+        for user in User.objects.all():
+            self.assertEqual(generate_holiday_report(user, 2023), expected[user.pk])
+
+    def test_command(self):
+        out = StringIO()
+        call_command("warm-leave-caches", "--year", "2023", stdout=out)
+        self.assertIn("summaries 2023: 0 cached, 5 warmed, 0 left of 5", out.getvalue())
+        self.assertIn("Coverage: 100%", out.getvalue())
+
+        err = StringIO()
+        with self.settings(ANNUAL_LEAVE_CACHE=None):
+            call_command("warm-leave-caches", stdout=out, stderr=err)
+        self.assertIn("ANNUAL_LEAVE_CACHE is not set", err.getvalue())
+
+
+@override_settings(
+    CACHES=CACHES, ANNUAL_LEAVE_CACHE="leave", ANNUAL_LEAVE_READ_DATABASE="replica"
+)
+class CacheWarmupReplicaTest(TransactionTestCase):
+    databases = {"default", "replica"}
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        for ix in range(3):
+            user = User.objects.create_user(f"holidayuser{ix}")
+            HolidayPlan.objects.create(
+                user=HolidayUser.objects.create(user=user),
+                start_date=date(2022, 1, 1),
+                allowance=25,
+            )
+        cache.clear()  # Forget the writes made setting up
+        get_cache().clear()
+
+    def test_recent_writers_read_from_primary(self):
+        mark_write(User.objects.get(username="holidayuser1").pk)
+
+        routed = {}
+        warmup = CacheWarmup([2023])
+        generate = warmup._generate_from
+
+        def record_routing(holiday_users, year):
+            for u in holiday_users:
+                routed[u.user.username] = HolidayRecord.objects.all().db
+            return generate(holiday_users, year)
+
+        with mock.patch.object(warmup, "_generate_from", record_routing):
+            warmup.run()
+        self.assertEqual(
+            routed,
+            {
+                "holidayuser0": "replica",
+                "holidayuser1": "default",
+                "holidayuser2": "replica",
+            },
+        )
+
+    def test_availability_read_from_primary_after_writes(self):
+        build = availability.build_availability_index
+        routed = []
+
+        def record_routing(start, end):
+            routed.append(HolidayRecord.objects.all().db)
+            return build(start, end)
+
+        with mock.patch.object(
+            availability, "build_availability_index", record_routing
+        ):
+            CacheWarmup([2023]).run()
+            get_cache().clear()
+            mark_write(User.objects.get(username="holidayuser1").pk)
+            CacheWarmup([2023]).run()
+        self.assertEqual(routed, ["replica", "default"])
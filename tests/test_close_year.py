@@ -0,0 +1,178 @@
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from teamsite_annual_leave.admin import HolidayRecordAdmin, HolidayRecordForm
+from teamsite_annual_leave.models.holiday_plan import HolidayPlan
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.models.holiday_user import HolidayUser
+from teamsite_annual_leave.models.holiday_year import HolidayYear
+from teamsite_annual_leave.tasks import close_year as close_year_module
+from teamsite_annual_leave.tasks.close_year import close_year, reopen_year
+from teamsite_annual_leave.util.bank_holiday_parser import (
+    load_holiday_fixtures,
+    synchronise_holidays,
+)
+from teamsite_annual_leave.util.holiday_report import (
+    generate_holiday_report,
+    generate_holiday_reports,
+)
+from teamsite_annual_leave.util.snapshot import dumps, loads
+
+User = get_user_model()
+
+
+@override_settings(ROOT_URLCONF="tests.urls")
+class CloseYearTest(TestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        synchronise_holidays(load_holiday_fixtures())
+        self.user = HolidayUser.objects.create(user=User.objects.create_user("alice"))
+        self.plan = HolidayPlan.objects.create(
+            user=self.user, start_date="2022-01-01", allowance=25
+        )
+        HolidayRecord.objects.create(
+            user=self.user,
+            start_date=date(2022, 3, 7),
+            end_date=date(2022, 3, 11),
+            record_type_id=5,
+            year=2022,
+        )
+
+    def _entitlements(self, year):
+        return sorted(
+            HolidayRecord.objects.filter(
+                user=self.user, year=year, record_type__code="ENT"
+            ).values_list("start_date", "adjustment")
+        )
+
+    def test_snapshot_round_trip(self):
+        report = generate_holiday_report(self.user.user, 2022)
+        self.assertEqual(loads(dumps(report)), report)
+
+    def test_closed_report_is_frozen(self):
+        report = generate_holiday_report(self.user.user, 2022)
+        self.assertEqual(close_year(2022), [self.user])
+        self.assertTrue(HolidayYear.objects.get(user=self.user, year=2022).is_closed)
+
+        HolidayRecord.objects.create(
+            user=self.user,
+            start_date=date(2022, 6, 6),
+            end_date=date(2022, 6, 6),
+            record_type_id=5,
+            year=2022,
+        )
+
+        with self.assertNumQueries(2):
+            self.assertEqual(generate_holiday_report(self.user.user, 2022), report)
+        self.assertEqual(
+            generate_holiday_reports(HolidayUser.objects.all(), 2022)[self.user.pk],
+            report,
+        )
+
+        # Closing again leaves the snapshot alone
+        self.assertEqual(close_year(2022), [])
+
+    def test_years_locked_while_closing(self):
+        bob = HolidayUser.objects.create(user=User.objects.create_user("bob"))
+        locked = []
+        held = set()
+        year_lock = close_year_module.year_lock
+        generate = close_year_module._generate_holiday_reports
+
+        @contextmanager
+        def recording_lock(user, year):
+            with year_lock(user, year) as state:
+                locked.append(user.pk)
+                held.add(user.pk)
+                yield state
+                held.remove(user.pk)
+
+        def checked_generate(holiday_users, year):
+            self.assertEqual(held, {u.pk for u in holiday_users})
+            return generate(holiday_users, year)
+
+        with mock.patch.object(
+            close_year_module, "year_lock", recording_lock
+        ), mock.patch.object(
+            close_year_module, "_generate_holiday_reports", checked_generate
+        ):
+            self.assertEqual(close_year(2022), [self.user, bob])
+        self.assertEqual(locked, sorted([self.user.pk, bob.pk]))
+        self.assertEqual(held, set())
+
+    def test_plan_change_skips_closed_year(self):
+        close_year(2022)
+        closed_entitlements = self._entitlements(2022)
+
+        self.plan.allowance = 30
+        self.plan.save()
+
+        self.assertEqual(self._entitlements(2022), closed_entitlements)
+        self.assertEqual(
+            self._entitlements(2023), [(date(2023, 1, 1), Decimal("30.0"))]
+        )
+
+    def test_reopen(self):
+        close_year(2022)
+        self.plan.allowance = 30
+        self.plan.save()
+
+        self.assertEqual(reopen_year(2022), [self.user])
+        self.assertFalse(HolidayYear.objects.get(user=self.user, year=2022).is_closed)
+        self.assertEqual(
+            self._entitlements(2022), [(date(2022, 1, 1), Decimal("30.0"))]
+        )
+        self.assertEqual(generate_holiday_report(self.user.user, 2022)["remainder"], 25)
+
+    def test_closed_year_is_read_only(self):
+        record = HolidayRecord.objects.create(
+            user=self.user,
+            start_date=date(2030, 3, 4),
+            end_date=date(2030, 3, 4),
+            record_type_id=5,
+            year=2030,
+        )
+        close_year(2030)
+
+        data = dict(
+            start_date="2030-03-11",
+            end_date="2030-03-11",
+            record_type=5,
+            user=self.user.pk,
+            title="Annual Leave",
+            year=2030,
+        )
+        for instance in (None, record):
+            form = HolidayRecordForm(data, instance=instance)
+            self.assertFalse(form.is_valid())
+            self.assertIn("2030 is closed", str(form.errors))
+        self.assertTrue(HolidayRecordForm(dict(data, year=2031)).is_valid())
+        self.assertFalse(
+            HolidayRecordAdmin(HolidayRecord, admin.site).has_delete_permission(
+                None, record
+            )
+        )
+
+        record_count = HolidayRecord.objects.filter(user=self.user, year=2030).count()
+        client = APIClient()
+        client.force_authenticate(self.user.user)
+        responses = [
+            client.post("/holiday/me/", dict(data, user=None), format="json"),
+            client.patch(f"/holiday/me/{record.pk}/", {"title": "Trip"}, format="json"),
+            client.delete(f"/holiday/me/{record.pk}/"),
+            client.post("/holiday/me/batch/", {"delete": [record.pk]}, format="json"),
+        ]
+        self.assertEqual([r.status_code for r in responses], [400] * 4)
+        self.assertEqual(HolidayRecord.objects.get(pk=record.pk).title, "Annual Leave")
+        self.assertEqual(
+            HolidayRecord.objects.filter(user=self.user, year=2030).count(),
+            record_count,
+        )
@@ -0,0 +1,133 @@
+import importlib
+from datetime import date
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core import serializers
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from teamsite_annual_leave.models.confirmation import Confirmation
+from teamsite_annual_leave.models.confirmation_snapshot import ConfirmationSnapshot
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.models.holiday_user import HolidayUser
+from teamsite_annual_leave.util.confirmations import diff_confirmations
+
+User = get_user_model()
+
+
+class ConfirmationSnapshotTest(TestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        self.user = User.objects.create_user("holidayuser1")
+        self.holiday_user = HolidayUser.objects.create(user=self.user)
+        self.record = HolidayRecord.objects.create(
+            user=self.holiday_user,
+            start_date=date(2023, 8, 1),
+            end_date=date(2023, 8, 2),
+            record_type_id=5,
+            year=2023,
+        )
+
+    def _confirm(self):
+        return Confirmation.objects.create(user=self.holiday_user, year=2023)
+
+    def test_identical_confirmations_share_a_snapshot(self):
+        first = self._confirm()
+        second = self._confirm()
+
+        self.assertEqual(first.snapshot_id, second.snapshot_id)
+        self.assertEqual(ConfirmationSnapshot.objects.count(), 1)
+        self.assertIsNone(second.data)
+        self.assertEqual(second.records[self.record.pk]["start_date"], "2023-08-01")
+        self.assertEqual(second.records[self.record.pk]["record_type"], "AL")
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                diff_confirmations(first, second),
+                dict(added=[], removed=[], changed=[]),
+            )
+
+    def test_diff(self):
+        first = self._confirm()
+        self.record.end_date = date(2023, 8, 4)
+        self.record.save()
+        added = HolidayRecord.objects.create(
+            user=self.holiday_user,
+            start_date=date(2023, 9, 1),
+            end_date=date(2023, 9, 1),
+            record_type_id=5,
+            year=2023,
+        )
+        second = self._confirm()
+
+        self.assertNotEqual(first.snapshot_id, second.snapshot_id)
+        diff = diff_confirmations(first, second)
+        self.assertEqual([r["id"] for r in diff["added"]], [added.pk])
+        self.assertEqual(diff["removed"], [])
+        self.assertEqual(
+            diff["changed"],
+            [
+                dict(
+                    id=self.record.pk,
+                    changes=dict(end_date=["2023-08-02", "2023-08-04"]),
+                )
+            ],
+        )
+
+    def test_legacy_data_is_moved_to_snapshots(self):
+        records = HolidayRecord.objects.filter(user=self.holiday_user, year=2023)
+        legacy = Confirmation.objects.create(
+            user=self.holiday_user,
+            year=2023,
+            data=serializers.serialize("json", records),
+        )
+        current = self._confirm()
+
+        migration = importlib.import_module(
+            "teamsite_annual_leave.migrations.0004_confirmation_snapshot"
+        )
+        migration.move_data_to_snapshots(apps, None)
+
+        legacy.refresh_from_db()
+        self.assertIsNone(legacy.data)
+        self.assertEqual(legacy.snapshot_id, current.snapshot_id)
+
+
+@override_settings(ROOT_URLCONF="tests.urls")
+class ConfirmationDiffViewTest(TestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        self.user = User.objects.create_user("holidayuser1")
+        self.holiday_user = HolidayUser.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_diff_against_previous(self):
+        first = Confirmation.objects.create(user=self.holiday_user, year=2023)
+        record = HolidayRecord.objects.create(
+            user=self.holiday_user,
+            start_date=date(2023, 8, 1),
+            end_date=date(2023, 8, 2),
+            record_type_id=5,
+            year=2023,
+        )
+        second = Confirmation.objects.create(user=self.holiday_user, year=2023)
+
+        response = self.client.get(f"/holiday/confirmation/{second.pk}/diff/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["against"], first.pk)
+        self.assertEqual([r["id"] for r in response.data["added"]], [record.pk])
+
+        response = self.client.get(
+            f"/holiday/confirmation/{first.pk}/diff/?against={second.pk}"
+        )
+        self.assertEqual([r["id"] for r in response.data["removed"]], [record.pk])
+
+        response = self.client.get(f"/holiday/confirmation/{first.pk}/diff/")
+        self.assertIsNone(response.data["against"])
+
+        response = self.client.get("/holiday/confirmation/")
+        self.assertEqual(response.data[0]["checksum"], second.snapshot.checksum)
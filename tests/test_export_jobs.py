@@ -0,0 +1,177 @@
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from teamsite_annual_leave.models.export_job import ExportJob
+from teamsite_annual_leave.models.holiday_plan import HolidayPlan
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.models.holiday_user import HolidayUser
+from teamsite_annual_leave.tasks.export_jobs import (
+    claim_next_job,
+    cleanup_exports,
+    get_export_storage,
+    request_export,
+    run_pending_jobs,
+)
+from teamsite_annual_leave.util.bank_holiday_parser import (
+    load_holiday_fixtures,
+    synchronise_holidays,
+)
+
+User = get_user_model()
+
+
+class ExportJobTestMixin:
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        self.export_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            ANNUAL_LEAVE_EXPORT_DIR=self.export_dir
+        )
+        self.settings_override.enable()
+
+        synchronise_holidays(load_holiday_fixtures())
+        self.user = User.objects.create_user("holidayuser1", is_staff=True)
+        self.holiday_user = HolidayUser.objects.create(user=self.user)
+        HolidayPlan.objects.create(
+            user=self.holiday_user, start_date="2022-01-01", allowance=25
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.export_dir)
+
+
+class ExportJobTest(ExportJobTestMixin, TestCase):
+    # An empty config writes a workbook without sheets, which keeps the tests independent of the
+    # user profile fields used by the sheets
+    def test_run_and_reuse(self):
+        job = request_export(2023, config="")
+        self.assertEqual(job.status, ExportJob.PENDING)
+        self.assertEqual(request_export(2023, config="").pk, job.pk)
+
+        self.assertEqual(run_pending_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.DONE)
+        self.assertEqual(job.progress, 100)
+        self.assertIsNotNone(job.started)
+        with get_export_storage().open(job.artifact, "rb") as fh:
+            self.assertEqual(fh.read(2), b"PK")
+
+        repeat = request_export(2023, config="")
+        self.assertNotEqual(repeat.pk, job.pk)
+        self.assertEqual(repeat.status, ExportJob.DONE)
+        self.assertEqual(repeat.artifact, job.artifact)
+        self.assertEqual(run_pending_jobs(), 0)
+
+    def test_data_changes_invalidate_artifact(self):
+        request_export(2023, config="")
+        run_pending_jobs()
+
+        HolidayRecord.objects.create(
+            user=self.holiday_user,
+            start_date=date(2023, 8, 1),
+            end_date=date(2023, 8, 2),
+            record_type_id=5,
+            year=2023,
+        )
+        job = request_export(2023, config="")
+        self.assertEqual(job.status, ExportJob.PENDING)
+
+    def test_failed_job(self):
+        job = request_export(2023, config="x")
+        with self.assertLogs("teamsite_annual_leave.tasks.export_jobs", "ERROR"):
+            run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.FAILED)
+        self.assertIn("Unknown option", job.error)
+
+    def test_stale_job(self):
+        job = request_export(2023, config="")
+        self.assertEqual(claim_next_job().pk, job.pk)
+        self.assertEqual(request_export(2023, config="").pk, job.pk)
+
+        # The worker died an hour ago
+        ExportJob.objects.filter(pk=job.pk).update(
+            heartbeat=timezone.now() - timedelta(hours=1)
+        )
+        repeat = request_export(2023, config="")
+        self.assertNotEqual(repeat.pk, job.pk)
+        self.assertEqual(repeat.status, ExportJob.PENDING)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.FAILED)
+
+    def test_cleanup(self):
+        old = request_export(2023, config="")
+        run_pending_jobs()
+        old.refresh_from_db()
+        storage = get_export_storage()
+        unused = storage.save("unused.xlsx", ContentFile(b"PK"))
+        week_ago = (timezone.now() - timedelta(days=8)).timestamp()
+        for name in (old.artifact, unused):
+            os.utime(storage.path(name), (week_ago, week_ago))
+
+        # A recent request still refers to the old workbook, so it is kept
+        recent = request_export(2023, config="")
+        self.assertEqual(recent.artifact, old.artifact)
+        ExportJob.objects.filter(pk=old.pk).update(
+            finished=timezone.now() - timedelta(days=8)
+        )
+        self.assertEqual(cleanup_exports(), (1, 1))
+        self.assertTrue(storage.exists(recent.artifact))
+        self.assertFalse(storage.exists(unused))
+
+        ExportJob.objects.filter(pk=recent.pk).update(
+            finished=timezone.now() - timedelta(days=8)
+        )
+        self.assertEqual(cleanup_exports(), (1, 1))
+        self.assertEqual(storage.listdir("")[1], [])
+
+
+@override_settings(ROOT_URLCONF="tests.urls")
+class ExportJobViewTest(ExportJobTestMixin, TestCase):
+    def test_export_api(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        response = client.post(
+            "/holiday/export/", dict(year=2023, config="q"), format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+        response = client.post("/holiday/export/", dict(year=2023), format="json")
+        self.assertEqual(response.status_code, 201)
+        job_id = response.data["id"]
+        self.assertEqual(response.data["status"], ExportJob.PENDING)
+        self.assertEqual(response.data["requested_by"], "holidayuser1")
+
+        response = client.get(f"/holiday/export/{job_id}/download/")
+        self.assertEqual(response.status_code, 400)
+
+        # Finish the job without running the sheets
+        storage = get_export_storage()
+        job = ExportJob.objects.get(pk=job_id)
+        job.artifact = storage.save("test.xlsx", ContentFile(b"PK"))
+        job.status = ExportJob.DONE
+        job.save()
+
+        response = client.get(f"/holiday/export/{job_id}/download/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("holiday-report-2023-csd.xlsx", response["Content-Disposition"])
+        response.close()
+
+        storage.delete(job.artifact)
+        response = client.get(f"/holiday/export/{job_id}/download/")
+        self.assertEqual(response.status_code, 400)
+
+        client.force_authenticate(user=User.objects.create_user("holidayuser2"))
+        response = client.get(f"/holiday/export/{job_id}/")
+        self.assertEqual(response.status_code, 403)
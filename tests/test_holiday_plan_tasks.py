@@ -6,6 +6,12 @@ from django.test import TestCase
 from teamsite_annual_leave.models.holiday_plan import HolidayPlan
 from teamsite_annual_leave.models.holiday_record import HolidayRecord
 from teamsite_annual_leave.models.holiday_user import HolidayUser
+from teamsite_annual_leave.models.holiday_year import HolidayYear
+from teamsite_annual_leave.tasks.holiday_plan_tasks import (
+    plan_fingerprint,
+    recalculate_all_plans,
+    recalculate_plans,
+)
 from teamsite_annual_leave.util.bank_holiday_parser import (
     load_holiday_fixtures,
     synchronise_holidays,
@@ -91,3 +97,88 @@ class ExportHolidaysTest(TestCase):
         )
 
         self.assertEqual(sum([r.adjustment for r in records]), Decimal("23.8"))
+
+
+class RecalculationFingerprintTest(TestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self) -> None:
+        synchronise_holidays(load_holiday_fixtures())
+        self.holiday_user = HolidayUser.objects.create(
+            user=User.objects.create_user("holidayuser1")
+        )
+        self.plan = HolidayPlan.objects.create(
+            user=self.holiday_user, allowance=26, start_date="2020-01-01", mon_days=0
+        )
+
+    def _records(self):
+        return {
+            r.pk: (r.title, r.adjustment, r.last_modified)
+            for r in HolidayRecord.objects.filter(user=self.holiday_user, year=2020)
+        }
+
+    def test_unchanged_inputs_are_skipped(self):
+        before = self._records()
+
+        # Lock (savepoint & year state), plans, public holidays, derived record counts - no writes
+        with self.assertNumQueries(6):
+            self.assertFalse(recalculate_plans(self.holiday_user, 2020))
+
+        self.assertEqual(self._records(), before)
+
+    def test_deleted_records_are_rebuilt(self):
+        before = self._records()
+        HolidayRecord.objects.filter(
+            user=self.holiday_user, year=2020, record_type__code="ENT"
+        ).delete()
+
+        self.assertTrue(recalculate_plans(self.holiday_user, 2020))
+        self.assertEqual(
+            sorted(t[:2] for t in self._records().values()),
+            sorted(t[:2] for t in before.values()),
+        )
+        self.assertFalse(recalculate_plans(self.holiday_user, 2020))
+
+    def test_force(self):
+        self.assertFalse(recalculate_plans(self.holiday_user, 2020))
+        self.assertFalse(recalculate_plans(self.holiday_user, 2020, force=True))
+        self.assertEqual(
+            HolidayYear.objects.get(user=self.holiday_user, year=2020).checksum,
+            plan_fingerprint(
+                [HolidayPlan.objects.get(pk=self.plan.pk)],
+                list(self._public_holidays()),
+                2020,
+                len(self._records()),
+            ),
+        )
+
+    def _public_holidays(self):
+        return HolidayRecord.objects.filter(record_type__code="PH", year=2020)
+
+    def test_only_changed_records_are_updated(self):
+        before = self._records()
+
+        self.plan.allowance = 28
+        self.plan.save()
+
+        after = self._records()
+        self.assertEqual(set(after), set(before))  # Updated in place
+
+        changed = {pk for pk in after if after[pk] != before[pk]}
+        self.assertEqual(
+            [after[pk][:2] for pk in changed],
+            [("Entitlement Year 2020 - New Plan", Decimal("22.4"))],
+        )
+
+    def test_recalculate_all_is_cheap_when_unchanged(self):
+        for ix in range(5):
+            holiday_user = HolidayUser.objects.create(
+                user=User.objects.create_user(f"user{ix}")
+            )
+            HolidayPlan.objects.create(
+                user=holiday_user, allowance=26, start_date="2020-01-01"
+            )
+
+        # Years, plans, public holidays, derived record counts, fingerprints and users
+        with self.assertNumQueries(6):
+            recalculate_all_plans()
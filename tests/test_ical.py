@@ -0,0 +1,127 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.models.holiday_record_type import HolidayRecordType
+from teamsite_annual_leave.models.holiday_user import HolidayUser
+from teamsite_annual_leave.util.ical import render_calendar
+
+User = get_user_model()
+
+
+class RenderCalendarTest(TestCase):
+    def test_render_all_day_event(self):
+        record = HolidayRecord(
+            pk=12,
+            start_date=date(2023, 8, 1),
+            end_date=date(2023, 8, 4),
+            title="Summer, finally; sun",
+            year=2023,
+        )
+        body = render_calendar([record], "Leave")
+
+        self.assertTrue(body.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertTrue(body.endswith("END:VCALENDAR\r\n"))
+        self.assertIn("UID:holiday-record-12@teamsite-annual-leave\r\n", body)
+        self.assertIn("DTSTART;VALUE=DATE:20230801\r\n", body)
+        self.assertIn("DTEND;VALUE=DATE:20230805\r\n", body)
+        self.assertIn("SUMMARY:Summer\\, finally\\; sun\r\n", body)
+
+    def test_long_lines_are_folded(self):
+        record = HolidayRecord(
+            pk=1,
+            start_date=date(2023, 8, 1),
+            end_date=date(2023, 8, 1),
+            title="ø" * 60,
+            year=2023,
+        )
+        body = render_calendar([record], "Leave")
+        for line in body.split("\r\n"):
+            self.assertLessEqual(len(line.encode("utf-8")), 75)
+
+
+@override_settings(ROOT_URLCONF="tests.urls")
+class CalendarFeedTest(TestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("holidayuser1")
+        self.holiday_user = HolidayUser.objects.create(user=self.user)
+        HolidayRecord.objects.create(
+            user=self.holiday_user,
+            start_date=date(2023, 8, 1),
+            end_date=date(2023, 8, 2),
+            record_type_id=5,
+            year=2023,
+        )
+        HolidayRecord.objects.create(
+            start_date=date(2023, 12, 25),
+            end_date=date(2023, 12, 25),
+            record_type_id=3,
+            title="Christmas Day",
+            year=2023,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_user_feed(self):
+        response = self.client.get("/holiday/me/ical/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/calendar; charset=utf-8")
+        self.assertIn(b"SUMMARY:Annual Leave", response.content)
+        self.assertNotIn(b"Christmas Day", response.content)
+
+    def test_public_feed(self):
+        response = self.client.get("/holiday/me/public/ical/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"SUMMARY:Christmas Day", response.content)
+        self.assertNotIn(b"Annual Leave\r\n", response.content)
+
+    def test_conditional_get(self):
+        etag = self.client.get("/holiday/me/ical/")["ETag"]
+
+        with self.assertNumQueries(3):  # User lookup & change keys
+            response = self.client.get("/holiday/me/ical/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        HolidayRecord.objects.create(
+            user=self.holiday_user,
+            start_date=date(2023, 9, 1),
+            end_date=date(2023, 9, 1),
+            record_type_id=5,
+            year=2023,
+        )
+        response = self.client.get("/holiday/me/ical/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.content.count(b"BEGIN:VEVENT"), 2)
+
+    def test_record_type_changes(self):
+        etag = self.client.get("/holiday/me/ical/")["ETag"]
+
+        record_type = HolidayRecordType.objects.get(code="AL")
+        record_type.title = "Holiday"
+        record_type.save()
+        response = self.client.get("/holiday/me/ical/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+        etag = response["ETag"]
+        record_type.system_option = True
+        record_type.save()
+        response = self.client.get("/holiday/me/ical/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.count(b"BEGIN:VEVENT"), 0)
+
+    def test_cached_body(self):
+        self.client.get("/holiday/me/public/ical/")
+        with self.assertNumQueries(2):  # Change keys only
+            response = self.client.get("/holiday/me/public/ical/")
+        self.assertEqual(response.status_code, 200)
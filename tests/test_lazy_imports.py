@@ -0,0 +1,55 @@
+import subprocess
+import sys
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from teamsite_annual_leave.util.importtime import parse_importtime
+
+HEAVY_MODULES = [
+    "xlsxwriter",
+    "pytz",
+    "dateutil.relativedelta",
+    "reversion",
+    "pyarrow",
+    "graphene",
+    "rest_framework",
+]
+
+SCRIPT = f"""
+import sys
+import django
+django.setup()
+import teamsite_annual_leave.tasks.add_rollovers
+import teamsite_annual_leave.tasks.export_jobs
+import teamsite_annual_leave.util.analytics_export
+import teamsite_annual_leave.util.cache_warmup
+import teamsite_annual_leave.util.holiday_export
+print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))
+"""
+
+
+class LazyImportsTest(SimpleTestCase):
+    def test_task_modules_do_not_load_extras(self):
+        result = subprocess.run(
+            [sys.executable, "-c", SCRIPT],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(result.stdout.strip(), "")
+
+    def test_parse_importtime(self):
+        output = "\n".join(
+            [
+                "import time: self [us] | cumulative | imported package",
+                "import time:       100 |        100 |   xlsxwriter.worksheet",
+                "import time:        50 |        150 | xlsxwriter",
+                "import time:        20 |         20 | json",
+            ]
+        )
+        times = parse_importtime(output)
+        self.assertEqual(times.total_us, 170)
+        self.assertEqual(times.modules, {"xlsxwriter": 150, "json": 20})
+        self.assertEqual(times.extras, {"report"})
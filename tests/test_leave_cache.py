@@ -0,0 +1,184 @@
+import shutil
+import tempfile
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from teamsite_annual_leave.models.confirmation import Confirmation
+from teamsite_annual_leave.models.holiday_plan import HolidayPlan
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.models.holiday_record_type import HolidayRecordType
+from teamsite_annual_leave.models.holiday_user import HolidayUser
+from teamsite_annual_leave.util.availability import get_availability_index
+from teamsite_annual_leave.util.bank_holiday_parser import (
+    load_holiday_fixtures,
+    synchronise_holidays,
+)
+from teamsite_annual_leave.util.holiday_report import (
+    generate_holiday_report,
+    generate_holiday_reports,
+)
+from teamsite_annual_leave.util.leave_cache import (
+    GLOBAL,
+    cached,
+    get_cache,
+    get_cache_stats,
+    reset_cache_stats,
+    user_scope,
+)
+
+User = get_user_model()
+
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "leave": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "leave",
+    },
+}
+
+
+@override_settings(
+    ROOT_URLCONF="tests.urls", CACHES=LOCMEM_CACHES, ANNUAL_LEAVE_CACHE="leave"
+)
+class LeaveCacheTest(TestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        get_cache().clear()
+        synchronise_holidays(load_holiday_fixtures())
+        self.users = []
+        for ix in range(2):
+            user = User.objects.create_user(f"holidayuser{ix}")
+            holiday_user = HolidayUser.objects.create(user=user)
+            HolidayPlan.objects.create(
+                user=holiday_user, start_date=date(2022, 1, 1), allowance=25
+            )
+            self._record(holiday_user, date(2023, 9, 4), date(2023, 9, 8))
+            self.users.append(holiday_user)
+        self.user = self.users[0].user
+        reset_cache_stats()
+
+    def _record(self, holiday_user, start, end, **kwargs):
+        return HolidayRecord.objects.create(
+            user=holiday_user,
+            start_date=start,
+            end_date=end,
+            record_type_id=5,
+            year=start.year,
+            **kwargs,
+        )
+
+    def assertStats(self, kind, hits, misses):
+        self.assertEqual(get_cache_stats()[kind], dict(hits=hits, misses=misses))
+
+    def test_summary_cached(self):
+        report = generate_holiday_report(self.user, 2023)
+        with self.assertNumQueries(0):
+            self.assertEqual(generate_holiday_report(self.user, 2023), report)
+        self.assertStats("summary", 1, 1)
+
+    def test_invalidated_by_records(self):
+        self.assertEqual(generate_holiday_report(self.user, 2023)["total_used"], 5)
+        record = self._record(self.users[0], date(2023, 10, 2), date(2023, 10, 3))
+        self.assertEqual(generate_holiday_report(self.user, 2023)["total_used"], 7)
+        record.delete()
+        self.assertEqual(generate_holiday_report(self.user, 2023)["total_used"], 5)
+        self.assertStats("summary", 0, 3)
+
+    def test_invalidated_by_plans(self):
+        generate_holiday_report(self.user, 2023)
+        plan = HolidayPlan.objects.get(user=self.users[0])
+        plan.fri_days = 0
+        plan.save()
+        self.assertEqual(generate_holiday_report(self.user, 2023)["total_used"], 4)
+
+    def test_invalidated_by_confirmations(self):
+        generate_holiday_report(self.user, 2023)
+        Confirmation.objects.create(user=self.users[0], year=2023)
+        self.assertIsNotNone(generate_holiday_report(self.user, 2023)["last_confirmed"])
+
+    def test_invalidated_on_commit(self):
+        generate_holiday_report(self.user, 2023)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self._record(self.users[0], date(2023, 10, 2), date(2023, 10, 3))
+                # A reader on another connection still sees the committed rows, and caches them
+                # under the version bumped by the save
+                cached(
+                    "summary",
+                    f"{self.user.pk}:2023",
+                    [GLOBAL, user_scope(self.user.pk)],
+                    lambda: dict(total_used=5),
+                )
+        self.assertEqual(generate_holiday_report(self.user, 2023)["total_used"], 7)
+
+    def test_only_the_changed_user(self):
+        generate_holiday_report(self.user, 2023)
+        generate_holiday_report(self.users[1].user, 2023)
+        self._record(self.users[1], date(2023, 10, 2), date(2023, 10, 3))
+
+        generate_holiday_report(self.user, 2023)
+        self.assertStats("summary", 1, 2)
+
+    def test_closures_invalidate_everyone(self):
+        generate_holiday_report(self.user, 2023)
+        HolidayRecord.objects.create(
+            start_date=date(2023, 9, 8),
+            end_date=date(2023, 9, 8),
+            title="Office closed",
+            record_type_id=4,
+            year=2023,
+        )
+        self.assertEqual(generate_holiday_report(self.user, 2023)["total_used"], 4)
+
+        record_type = HolidayRecordType.objects.get_for_code("CLS")
+        record_type.save()
+        generate_holiday_report(self.user, 2023)
+        self.assertStats("summary", 0, 3)
+
+    def test_reports_share_entries(self):
+        generate_holiday_report(self.user, 2023)
+        reports = generate_holiday_reports(HolidayUser.objects.all(), 2023)
+        self.assertEqual(set(reports), {u.pk for u in self.users})
+        self.assertStats("summary", 1, 2)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(generate_holiday_reports(self.users, 2023), reports)
+
+    def test_availability_cached(self):
+        get_availability_index(2023)
+        with self.assertNumQueries(0):
+            get_availability_index(2023)
+        self._record(self.users[1], date(2023, 10, 2), date(2023, 10, 3))
+        get_availability_index(2023)
+        self.assertStats("availability", 1, 2)
+
+    def test_public_holidays_cached(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        first = client.get("/holiday/me/public/?year=2023")
+        second = client.get("/holiday/me/public/?year=2023")
+        self.assertEqual(first.data, second.data)
+        self.assertGreater(len(first.data), 0)
+        self.assertStats("public_holidays", 1, 1)
+
+
+class FileBasedLeaveCacheTest(LeaveCacheTest):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        caches = dict(
+            LOCMEM_CACHES,
+            leave={
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": self.cache_dir,
+            },
+        )
+        settings = self.settings(CACHES=caches)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        super().setUp()
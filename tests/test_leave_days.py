@@ -0,0 +1,105 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from teamsite_annual_leave.models.holiday_plan import HolidayPlan
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.models.holiday_user import HolidayUser
+from teamsite_annual_leave.models.leave_day import LeaveDay
+from teamsite_annual_leave.tasks.leave_days import rebuild_leave_year
+from teamsite_annual_leave.util.bank_holiday_parser import (
+    load_holiday_fixtures,
+    synchronise_holidays,
+)
+from teamsite_annual_leave.util.holiday_report import generate_holiday_report
+from teamsite_annual_leave.util.leave_days import get_daily_headcount, get_leave_totals
+
+User = get_user_model()
+
+
+@override_settings(ANNUAL_LEAVE_LEAVE_DAYS=True)
+class LeaveDaysTest(TestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        synchronise_holidays(load_holiday_fixtures())
+        self.users = []
+        for ix in range(3):
+            user = User.objects.create_user(f"holidayuser{ix}")
+            holiday_user = HolidayUser.objects.create(user=user)
+            HolidayPlan.objects.create(
+                user=holiday_user,
+                start_date=date(2022, 1, 1),
+                allowance=25,
+                fri_days=ix * 0.5,
+            )
+            self.users.append(holiday_user)
+
+        # Includes the spring bank holiday and a half day
+        self.record = self._record(
+            0, date(2023, 5, 26), date(2023, 6, 2), start_half=True
+        )
+        self._record(1, date(2023, 8, 30), date(2023, 9, 8))
+        self._record(2, date(2023, 12, 22), date(2024, 1, 5))
+        rebuild_leave_year(2023)
+        rebuild_leave_year(2024)
+
+    def _record(self, ix, start, end, **kwargs):
+        return HolidayRecord.objects.create(
+            user=self.users[ix],
+            start_date=start,
+            end_date=end,
+            record_type_id=5,
+            year=start.year,
+            **kwargs,
+        )
+
+    def assertMatchesReports(self, year=2023):
+        totals = get_leave_totals(year)
+        for holiday_user in self.users:
+            report = generate_holiday_report(holiday_user.user, year)
+            for key in ("total_used", "jan_to_aug", "sep_to_nov"):
+                self.assertEqual(
+                    totals[holiday_user.pk][key], report[key], (holiday_user, key)
+                )
+
+    def test_totals_match_reports(self):
+        self.assertEqual(
+            LeaveDay.objects.filter(year=2023).count(), 3 * 365 + 5
+        )  # Includes the days in 2024 of leave logged in 2023
+        self.assertMatchesReports()
+
+    def test_totals_in_one_query(self):
+        with self.assertNumQueries(1):
+            get_leave_totals(2023)
+
+    def test_kept_up_to_date(self):
+        self._record(1, date(2023, 3, 6), date(2023, 3, 7))
+        self.assertMatchesReports()
+
+        self.record.start_date = date(2023, 7, 3)
+        self.record.end_date = date(2023, 7, 4)
+        self.record.save()
+        self.assertMatchesReports()
+        self.assertEqual(
+            get_leave_totals(2023)[self.users[0].pk]["monthly_breakdown"][5], 0
+        )
+
+        plan = self.users[0].holiday_plans.get()
+        plan.tue_days = 0
+        plan.save()
+        self.assertMatchesReports()
+
+        self.record.delete()
+        self.assertMatchesReports()
+
+    def test_daily_headcount(self):
+        headcount = get_daily_headcount(date(2023, 5, 26), date(2023, 5, 30))
+        # Only users 1 and 2 work Fridays
+        self.assertEqual(headcount[date(2023, 5, 26)], (2, 0, 0))
+        self.assertNotIn(date(2023, 5, 27), headcount)
+        # Bank holiday
+        self.assertEqual(headcount[date(2023, 5, 29)], (0, 0, 3))
+        # User 0 on leave
+        self.assertEqual(headcount[date(2023, 5, 30)], (2, 0, 1))
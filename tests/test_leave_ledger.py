@@ -0,0 +1,210 @@
+import copy
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from teamsite_annual_leave.models.holiday_plan import HolidayPlan
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.models.holiday_record_type import HolidayRecordType
+from teamsite_annual_leave.models.holiday_user import HolidayUser
+from teamsite_annual_leave.models.leave_event import LeaveEvent
+from teamsite_annual_leave.models.leave_snapshot import LeaveSnapshot
+from teamsite_annual_leave.tasks import leave_ledger
+from teamsite_annual_leave.tasks.add_rollovers import add_rollovers
+from teamsite_annual_leave.tasks.leave_ledger import (
+    rebuild_ledger,
+    update_ledger_for_records,
+)
+from teamsite_annual_leave.util.bank_holiday_parser import (
+    load_holiday_fixtures,
+    synchronise_holidays,
+)
+from teamsite_annual_leave.util.holiday_report import generate_holiday_report
+from teamsite_annual_leave.util.leave_ledger import (
+    get_ledger_balance,
+    get_ledger_history,
+)
+
+User = get_user_model()
+
+
+@override_settings(ANNUAL_LEAVE_LEDGER=True)
+class LeaveLedgerTest(TestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        synchronise_holidays(load_holiday_fixtures())
+        self.user = User.objects.create_user("holidayuser")
+        self.holiday_user = HolidayUser.objects.create(user=self.user)
+        self.plan = HolidayPlan.objects.create(
+            user=self.holiday_user, start_date=date(2022, 1, 1), allowance=25
+        )
+        # Includes the spring bank holiday
+        self.record = self._record(date(2023, 5, 26), date(2023, 6, 2))
+        rebuild_ledger(2023)
+
+    def _record(self, start, end, **kwargs):
+        return HolidayRecord.objects.create(
+            user=self.holiday_user,
+            start_date=start,
+            end_date=end,
+            record_type_id=5,
+            year=start.year,
+            **kwargs,
+        )
+
+    def _kinds(self):
+        return list(
+            LeaveEvent.objects.filter(user=self.holiday_user, year=2023)
+            .exclude(kind=LeaveEvent.OPENING)
+            .order_by("id")
+            .values_list("kind", flat=True)
+        )
+
+    def assertMatchesReport(self, year=2023):
+        report = generate_holiday_report(self.user, year)
+        self.assertEqual(
+            get_ledger_balance(self.holiday_user, year), report["remainder"]
+        )
+
+    def test_rebuild(self):
+        self.assertEqual(get_ledger_balance(self.holiday_user, 2023), 25 - 5)
+        self.assertMatchesReport()
+        self.assertEqual(
+            LeaveSnapshot.objects.filter(user=self.holiday_user, year=2023).count(), 1
+        )
+
+    def test_booked_changed_cancelled(self):
+        record = self._record(date(2023, 8, 30), date(2023, 9, 1))
+        self.assertMatchesReport()
+
+        record.start_half = True
+        record.save()
+        self.assertMatchesReport()
+
+        record.delete()
+        self.assertMatchesReport()
+        self.assertEqual(
+            self._kinds(),
+            [LeaveEvent.BOOKED, LeaveEvent.CHANGED, LeaveEvent.CANCELLED],
+        )
+
+    def test_plan_changed(self):
+        self.plan.fri_days = 0.5
+        self.plan.save()
+        self.assertMatchesReport()
+        self.assertEqual(set(self._kinds()), {LeaveEvent.PLAN})
+
+    def test_closure(self):
+        HolidayRecord.objects.create(
+            start_date=date(2023, 5, 30),
+            end_date=date(2023, 5, 30),
+            title="Office closed",
+            record_type_id=4,
+            year=2023,
+        )
+        self.assertMatchesReport()
+        self.assertEqual(self._kinds(), [LeaveEvent.CLOSURE])
+
+    def test_rollover(self):
+        rebuild_ledger(2024)
+        add_rollovers(2023)
+        self.assertMatchesReport()
+        self.assertMatchesReport(2024)
+
+    @override_settings(ANNUAL_LEAVE_LEDGER_SNAPSHOT_EVERY=2)
+    def test_snapshots(self):
+        for day in (5, 12, 19):
+            self._record(date(2023, 9, day), date(2023, 9, day))
+        self.assertEqual(
+            LeaveSnapshot.objects.filter(user=self.holiday_user, year=2023).count(), 2
+        )
+        self.assertMatchesReport()
+
+        with self.assertNumQueries(2):
+            get_ledger_balance(self.holiday_user, 2023)
+
+        call_command("snapshot-leave-ledger", "2023", stdout=StringIO())
+        snapshot = LeaveSnapshot.objects.order_by("-event_id").first()
+        self.assertEqual(snapshot.balance, 25 - 5 - 3)
+
+    def test_point_in_time(self):
+        before = timezone.now()
+        self._record(date(2023, 9, 5), date(2023, 9, 6))
+        self.assertEqual(get_ledger_balance(self.holiday_user, 2023, at=before), 20)
+        self.assertEqual(get_ledger_balance(self.holiday_user, 2023), 18)
+
+        history = get_ledger_history(self.holiday_user, 2023)
+        self.assertEqual([balance for _, balance in history][-1], 18)
+
+
+@override_settings(ANNUAL_LEAVE_LEDGER=True)
+class ConcurrentLedgerTest(TransactionTestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        self.holiday_user = HolidayUser.objects.create(
+            user=User.objects.create_user("holidayuser")
+        )
+        self.record = HolidayRecord.objects.create(
+            user=self.holiday_user,
+            start_date=date(2023, 1, 1),
+            end_date=date(2023, 1, 1),
+            adjustment=1,
+            record_type=HolidayRecordType.objects.get_for_code("ROL"),
+            year=2023,
+        )
+
+    def test_concurrent_changes_to_one_record(self):
+        count = 8
+        barrier = threading.Barrier(count)
+        errors = []
+        latest_events = leave_ledger._latest_events
+
+        def slow_latest_events(*args):
+            events = latest_events(*args)
+            time.sleep(
+                0.01
+            )  # Widens the gap between reading the last event and writing
+            return events
+
+        def change(ix):
+            record = copy.copy(self.record)
+            record.adjustment = Decimal(ix + 2)
+            try:
+                barrier.wait()
+                # The shared-cache in-memory SQLite test database fails with "table is locked"
+                # where a file database would wait, so emulate the busy timeout
+                for attempt in range(100):
+                    try:
+                        update_ledger_for_records(self.holiday_user.pk, [record])
+                        return
+                    except OperationalError:
+                        time.sleep(0.01)
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+            finally:
+                connection.close()
+
+        with mock.patch.object(leave_ledger, "_latest_events", slow_latest_events):
+            threads = [
+                threading.Thread(target=change, args=(ix,)) for ix in range(count)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(errors, [])
+
+        events = LeaveEvent.objects.filter(record_id=self.record.pk).order_by("id")
+        self.assertEqual(len(events), count + 1)
+        self.assertEqual(sum(e.delta for e in events), events.last().contribution)
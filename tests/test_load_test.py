@@ -0,0 +1,107 @@
+import json
+from datetime import date
+
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase, override_settings
+
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.util.load_test import (
+    ENDPOINTS,
+    LoadStats,
+    count_queries,
+    get_requests,
+    seed_users,
+    validate_mix,
+)
+
+
+@override_settings(ROOT_URLCONF="django_site.urls", ALLOWED_HOSTS=["localhost"])
+class LoadTestTest(TestCase):
+    fixtures = ["record-types"]
+
+    def test_seed_users(self):
+        users = seed_users(5, records_per_user=4)
+        records = HolidayRecord.objects.filter(user__user__in=users)
+        self.assertEqual(records.count(), 20)
+        for record in records:
+            self.assertEqual(record.year, date.today().year)
+            self.assertLess(record.start_date.weekday(), 5)
+            self.assertLessEqual(record.start_date, record.end_date)
+            self.assertLess(record.end_date.weekday(), 5)
+
+        # Existing users are reused
+        self.assertEqual(seed_users(6)[:5], users)
+        self.assertEqual(HolidayRecord.objects.filter(user__isnull=False).count(), 26)
+
+    def test_requests(self):
+        requests = {r.name: r for r in get_requests("asgi", sorted(ENDPOINTS))}
+        self.assertEqual(requests["activity"].path, "/holiday/async/me/activity/")
+        self.assertEqual(requests["activity"].method, "GET")
+        self.assertEqual(requests["graphql"].method, "POST")
+        self.assertIn("holidays", json.loads(requests["graphql"].body)["query"])
+
+    def test_endpoints_respond(self):
+        user = seed_users(1)[0]
+        client = Client(HTTP_HOST="localhost")
+        client.force_login(user)
+        for mode in ("wsgi", "asgi"):
+            for request in get_requests(mode, sorted(ENDPOINTS)):
+                if request.method == "GET":
+                    response = client.get(request.path)
+                else:
+                    response = client.post(
+                        request.path, request.body, content_type="application/json"
+                    )
+                self.assertEqual(response.status_code, 200, request)
+
+        graphql = get_requests("wsgi", ["graphql"])[0]
+        data = client.post(
+            graphql.path, graphql.body, content_type="application/json"
+        ).json()
+        self.assertNotIn("errors", data)
+
+    def test_graphql_only_shows_own_leave(self):
+        users = seed_users(2)
+        graphql = get_requests("wsgi", ["graphql"])[0]
+        query = json.dumps(
+            {"query": "{ holidays { edges { node { title startDate } } } }"}
+        )
+
+        response = Client(HTTP_HOST="localhost").post(
+            graphql.path, query, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 302)
+
+        client = Client(HTTP_HOST="localhost")
+        client.force_login(users[0])
+        edges = client.post(
+            graphql.path, query, content_type="application/json"
+        ).json()["data"]["holidays"]["edges"]
+        self.assertEqual(
+            len(edges), HolidayRecord.objects.filter(user__user=users[0]).count()
+        )
+
+    def test_count_queries(self):
+        user = seed_users(1)[0]
+        counts = count_queries(user, get_requests("wsgi", sorted(ENDPOINTS)))
+        self.assertEqual(set(counts), set(ENDPOINTS))
+        self.assertTrue(all(count > 0 for count in counts.values()))
+
+    def test_mix_validated(self):
+        for mix in (["nope=1"], ["records=-1"], ["records=x"]):
+            with self.assertRaises(CommandError):
+                call_command("load-test", "--mix", *mix)
+        with self.assertRaises(CommandError):
+            call_command("load-test", "--endpoint", "records", "--mix", "records=0")
+        validate_mix({"records": 0}, ["records", "public"])
+
+    def test_stats(self):
+        stats = LoadStats()
+        for ms in range(1, 101):
+            stats.add(ms / 1000, ok=ms % 10 != 0)
+        stats.elapsed = 2
+        self.assertEqual(stats.percentile(50), 0.05)
+        self.assertEqual(stats.percentile(95), 0.095)
+        self.assertEqual(stats.percentile(99), 0.099)
+        self.assertEqual(stats.error_rate, 0.1)
+        self.assertEqual(stats.throughput, 50)
@@ -0,0 +1,77 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from teamsite_annual_leave.admin import HolidayRecordForm
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.models.holiday_user import HolidayUser
+from teamsite_annual_leave.util.overlaps import find_overlapping, records_overlap
+
+User = get_user_model()
+
+
+def _record(start, end, start_half=False, end_half=False):
+    return HolidayRecord(
+        start_date=start, end_date=end, start_half=start_half, end_half=end_half
+    )
+
+
+class OverlapsTest(TestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        user = User.objects.create_user("holidayuser1")
+        self.holiday_user = HolidayUser.objects.create(user=user)
+        self.existing = HolidayRecord.objects.create(
+            user=self.holiday_user,
+            start_date=date(2030, 3, 4),
+            end_date=date(2030, 3, 8),
+            end_half=True,
+            record_type_id=5,
+            year=2030,
+        )
+
+    def test_records_overlap(self):
+        a = _record(date(2030, 3, 4), date(2030, 3, 8), end_half=True)
+        self.assertTrue(records_overlap(a, _record(date(2030, 3, 6), date(2030, 3, 6))))
+        self.assertFalse(
+            records_overlap(a, _record(date(2030, 3, 9), date(2030, 3, 9)))
+        )
+        self.assertFalse(
+            records_overlap(a, _record(date(2030, 3, 8), date(2030, 3, 8), True))
+        )
+        self.assertTrue(records_overlap(a, _record(date(2030, 3, 8), date(2030, 3, 8))))
+
+    def test_find_overlapping(self):
+        record = _record(date(2030, 3, 1), date(2030, 3, 4))
+        record.user = self.holiday_user
+        self.assertEqual(find_overlapping(record), self.existing)
+
+        # Public holidays and other system records are not leave
+        HolidayRecord.objects.create(
+            start_date=date(2030, 3, 11),
+            end_date=date(2030, 3, 11),
+            record_type_id=3,
+            year=2030,
+        )
+        record.start_date = record.end_date = date(2030, 3, 11)
+        self.assertIsNone(find_overlapping(record))
+
+        self.assertIsNone(find_overlapping(self.existing))
+
+    def test_admin_form(self):
+        data = dict(
+            start_date="2030-03-08",
+            end_date="2030-03-08",
+            record_type=5,
+            user=self.holiday_user.pk,
+            title="Annual Leave",
+            year=2030,
+        )
+        form = HolidayRecordForm(data)
+        self.assertFalse(form.is_valid())
+        self.assertIn("Overlaps leave", str(form.errors))
+
+        form = HolidayRecordForm(dict(data, start_half=True))
+        self.assertTrue(form.is_valid(), form.errors)
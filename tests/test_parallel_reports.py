@@ -0,0 +1,83 @@
+import io
+import zipfile
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from teamsite_annual_leave.models.holiday_plan import HolidayPlan
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.models.holiday_user import HolidayUser
+from teamsite_annual_leave.util.bank_holiday_parser import (
+    load_holiday_fixtures,
+    synchronise_holidays,
+)
+from teamsite_annual_leave.util.holiday_export import (
+    create_holiday_report,
+    get_user_reports,
+    get_users,
+)
+from teamsite_annual_leave.util.parallel_reports import generate_reports_parallel
+
+User = get_user_model()
+
+
+class ParallelReportsTest(TestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        synchronise_holidays(load_holiday_fixtures())
+        for ix, username in enumerate(["dave", "alice", "carol", "bob", "erin"]):
+            holiday_user = HolidayUser.objects.create(
+                user=User.objects.create_user(username, email=f"{username}@example.com")
+            )
+            HolidayPlan.objects.create(
+                user=holiday_user, start_date="2022-01-01", allowance=25 + ix
+            )
+            HolidayRecord.objects.create(
+                user=holiday_user,
+                start_date=date(2023, 3, 1 + ix),
+                end_date=date(2023, 3, 8 + ix),
+                start_half=ix % 2 == 1,
+                record_type_id=5,
+                year=2023,
+            )
+        User.objects.create_user("frank")  # No HolidayUser
+
+    def test_parallel_matches_serial(self):
+        serial = get_user_reports(get_users(), 2023)
+        parallel = get_user_reports(get_users(), 2023, workers=2)
+
+        self.assertEqual(
+            [u.username for u, _ in parallel], ["alice", "bob", "carol", "dave", "erin"]
+        )
+        self.assertEqual(parallel, serial)
+
+    def test_slices_are_merged_in_order(self):
+        progress = []
+        results = generate_reports_parallel(
+            get_users(),
+            2023,
+            workers=3,
+            chunk_size=2,
+            progress=lambda stage, done, total: progress.append(done),
+        )
+        self.assertEqual(
+            [u.username for u, _ in results],
+            ["alice", "bob", "carol", "dave", "erin", "frank"],
+        )
+        self.assertIsNone(results[-1][1])
+        self.assertEqual(progress, [2, 4, 5])
+
+    def test_workbook_is_identical(self):
+        def sheets(workers):
+            output = io.BytesIO()
+            create_holiday_report(output, None, 2023, config="sd", workers=workers)
+            with zipfile.ZipFile(output) as workbook:
+                return {
+                    name: workbook.read(name)
+                    for name in workbook.namelist()
+                    if name != "docProps/core.xml"  # Holds the creation time
+                }
+
+        self.assertEqual(sheets(4), sheets(1))
@@ -0,0 +1,148 @@
+import io
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+
+from teamsite_annual_leave.models.holiday_plan import HolidayPlan
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.models.holiday_user import HolidayUser
+from teamsite_annual_leave.util import holiday_report
+from teamsite_annual_leave.util.analytics_export import write_analytics_export
+from teamsite_annual_leave.util.bank_holiday_parser import (
+    load_holiday_fixtures,
+    synchronise_holidays,
+)
+from teamsite_annual_leave.util.holiday_report import generate_holiday_report
+from teamsite_annual_leave.util.leave_cache import get_cache
+from teamsite_annual_leave.util.read_replica import reporting
+
+User = get_user_model()
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "leave": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "leave",
+    },
+}
+
+
+@override_settings(ANNUAL_LEAVE_READ_DATABASE="replica")
+class ReadReplicaTest(TransactionTestCase):
+    # The replica is a test mirror of default: a second connection to the same database, which
+    # only sees committed data
+    databases = {"default", "replica"}
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        synchronise_holidays(load_holiday_fixtures())
+        self.user = User.objects.create_user("holidayuser1")
+        self.other_user = User.objects.create_user("holidayuser2")
+        self.holiday_user = HolidayUser.objects.create(user=self.user)
+        HolidayPlan.objects.create(
+            user=self.holiday_user, start_date="2022-01-01", allowance=25
+        )
+        cache.clear()  # Forget the writes made setting up
+
+    def _create_record(self, user=None):
+        return HolidayRecord.objects.create(
+            user=user,
+            start_date=date(2023, 8, 1),
+            end_date=date(2023, 8, 2),
+            record_type_id=5 if user else 3,
+            year=2023,
+        )
+
+    def test_reads_are_routed_inside_reporting(self):
+        self.assertEqual(HolidayRecord.objects.all().db, "default")
+        with reporting():
+            self.assertEqual(HolidayRecord.objects.all().db, "replica")
+            with reporting(self.user):
+                self.assertEqual(HolidayRecord.objects.all().db, "replica")
+        self.assertEqual(HolidayRecord.objects.all().db, "default")
+
+    def test_writes_go_to_primary(self):
+        with reporting():
+            plan = HolidayPlan.objects.get()
+            self.assertEqual(plan._state.db, "replica")
+            plan.allowance = 20
+            plan.save()
+        self.assertEqual(HolidayPlan.objects.get().allowance, 20)
+
+    def test_read_your_writes(self):
+        self._create_record(self.holiday_user)
+
+        with reporting(self.user):
+            self.assertEqual(HolidayRecord.objects.all().db, "default")
+        with reporting(self.other_user):
+            self.assertEqual(HolidayRecord.objects.all().db, "replica")
+
+        self._create_record()  # Public holidays affect everyone
+        with reporting(self.other_user):
+            self.assertEqual(HolidayRecord.objects.all().db, "default")
+
+    def test_report_reads_replica(self):
+        with self.assertNumQueries(0, using="default"):
+            report = generate_holiday_report(self.user, 2022)
+        self.assertEqual(report["allowance"], 25)
+
+    @override_settings(ANNUAL_LEAVE_READ_DATABASE=None)
+    def test_no_replica(self):
+        self._create_record(self.holiday_user)
+        self.assertEqual(cache.get_many(cache._cache.keys()), {})
+        with reporting():
+            self.assertEqual(HolidayRecord.objects.all().db, "default")
+
+
+@override_settings(
+    CACHES=CACHES, ANNUAL_LEAVE_CACHE="leave", ANNUAL_LEAVE_READ_DATABASE="replica"
+)
+class ReadReplicaBulkReportTest(TransactionTestCase):
+    databases = {"default", "replica"}
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        synchronise_holidays(load_holiday_fixtures())
+        for username in ("alice", "bob"):
+            HolidayPlan.objects.create(
+                user=HolidayUser.objects.create(
+                    user=User.objects.create_user(username)
+                ),
+                start_date="2022-01-01",
+                allowance=25,
+            )
+        cache.clear()  # Forget the writes made setting up
+        get_cache().clear()
+
+    def test_analytics_export_reads_recent_writers_from_primary(self):
+        alice = HolidayUser.objects.get(user__username="alice")
+        HolidayRecord.objects.create(
+            user=alice,
+            start_date=date(2023, 8, 1),
+            end_date=date(2023, 8, 4),
+            record_type_id=5,
+            year=2023,
+        )
+
+        routed = {}
+        generate = holiday_report._generate_holiday_reports
+
+        def record_routing(holiday_users, year, plan_lookup=None):
+            for u in holiday_users:
+                routed[u.user.username] = HolidayRecord.objects.all().db
+            return generate(holiday_users, year, plan_lookup)
+
+        with mock.patch.object(
+            holiday_report, "_generate_holiday_reports", record_routing
+        ):
+            write_analytics_export(io.BytesIO(), "summary", "csv", [2023])
+        self.assertEqual(routed, {"alice": "default", "bob": "replica"})
+
+        # What the export cached for alice is what her own report reads
+        self.assertEqual(
+            generate_holiday_report(alice.user, 2023)["total_used"], Decimal(4)
+        )
@@ -0,0 +1,144 @@
+import threading
+import time
+from contextlib import nullcontext
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection, transaction
+from django.db.models import Count
+from django.test import TransactionTestCase
+
+from teamsite_annual_leave.models.holiday_plan import HolidayPlan
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.models.holiday_user import HolidayUser
+from teamsite_annual_leave.tasks import holiday_plan_tasks
+from teamsite_annual_leave.util.bank_holiday_parser import (
+    load_holiday_fixtures,
+    synchronise_holidays,
+)
+
+User = get_user_model()
+
+
+class ConcurrentRecalculationTest(TransactionTestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        synchronise_holidays(load_holiday_fixtures())
+        self.holiday_user = HolidayUser.objects.create(
+            user=User.objects.create_user("holidayuser1")
+        )
+        self.plan = HolidayPlan.objects.create(
+            user=self.holiday_user, allowance=26, start_date="2020-01-01", mon_days=0
+        )
+        self.years = set(
+            HolidayRecord.objects.filter(record_type__code="PH").values_list(
+                "year", flat=True
+            )
+        )
+
+    def _run_in_threads(self, target, count=8):
+        barrier = threading.Barrier(count)
+        errors = []
+
+        def run(ix):
+            try:
+                barrier.wait()
+                target(ix)
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(ix,)) for ix in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def _assert_no_duplicates(self):
+        duplicates = (
+            HolidayRecord.objects.filter(user=self.holiday_user)
+            .values("holiday_plan", "record_type", "start_date", "title")
+            .annotate(count=Count("id"))
+            .filter(count__gt=1)
+        )
+        self.assertEqual(list(duplicates), [])
+
+    def test_concurrent_triggers_are_coalesced(self):
+        HolidayPlan.objects.filter(pk=self.plan.pk).update(allowance=28)
+
+        # Called directly rather than through the receiver, whose lookup of the years runs before
+        # the locks are taken and trips over the in-memory test database's table locks
+        with mock.patch.object(
+            holiday_plan_tasks,
+            "compute_plan_records",
+            wraps=holiday_plan_tasks.compute_plan_records,
+        ) as compute:
+            self._run_in_threads(
+                lambda ix: holiday_plan_tasks.recalculate_user_plans(
+                    self.holiday_user, self.years
+                )
+            )
+
+        # Eight triggers, but each year is only recalculated once
+        self.assertEqual(compute.call_count, len(self.years))
+        self._assert_no_duplicates()
+        self.assertEqual(
+            HolidayRecord.objects.get(
+                user=self.holiday_user, record_type__code="ENT", year=2020
+            ).adjustment,
+            Decimal("22.4"),
+        )
+
+    def _parallel_plan_saves(self, in_transaction):
+        def save(ix):
+            # The shared-cache in-memory SQLite test database fails with "table is locked" where a
+            # file database would wait, so emulate the busy timeout
+            for attempt in range(100):
+                try:
+                    with transaction.atomic() if in_transaction else nullcontext():
+                        plan = HolidayPlan.objects.get(pk=self.plan.pk)
+                        plan.allowance = 20 + ix
+                        plan.save()
+                    return
+                except OperationalError:
+                    time.sleep(0.01)
+            plan = HolidayPlan.objects.get(pk=self.plan.pk)
+            plan.allowance = 20 + ix
+            plan.save()
+
+        self._run_in_threads(save)
+        self._assert_no_duplicates()
+
+        # Whichever save came last, the records match its plan
+        plan = HolidayPlan.objects.get(pk=self.plan.pk)
+        entitlement = HolidayRecord.objects.get(
+            user=self.holiday_user, record_type__code="ENT", year=2020
+        )
+        self.assertEqual(
+            entitlement.adjustment,
+            round(plan.outstanding_allowance_at_date(plan.start_date), 1),
+        )
+
+    def test_parallel_plan_saves(self):
+        self._parallel_plan_saves(in_transaction=False)
+
+    def test_parallel_plan_saves_in_transactions(self):
+        # As the admin does: the recalculation runs before the plan change is committed
+        self._parallel_plan_saves(in_transaction=True)
+
+    def test_save_in_transaction(self):
+        with transaction.atomic():
+            plan = HolidayPlan.objects.get(pk=self.plan.pk)
+            plan.allowance = 28
+            plan.save()
+            plan.mon_days = 1
+            plan.save()
+
+        entitlement = HolidayRecord.objects.get(
+            user=self.holiday_user, record_type__code="ENT", year=2020
+        )
+        self.assertEqual(entitlement.adjustment, Decimal("28.0"))
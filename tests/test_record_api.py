@@ -0,0 +1,131 @@
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.models.holiday_record_type import HolidayRecordType
+from teamsite_annual_leave.models.holiday_user import HolidayUser
+
+User = get_user_model()
+
+
+@override_settings(ROOT_URLCONF="tests.urls")
+class HolidayRecordApiTest(TestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        self.user = User.objects.create_user("holidayuser1")
+        self.holiday_user = HolidayUser.objects.create(user=self.user)
+
+        # Two records a week for three years, so start dates are shared
+        records = []
+        day = date(2021, 1, 4)
+        while day.year < 2024:
+            for _ in range(2):
+                records.append(
+                    HolidayRecord(
+                        user=self.holiday_user,
+                        start_date=day,
+                        end_date=day,
+                        record_type_id=5,
+                        year=day.year,
+                    )
+                )
+            day += timedelta(days=7)
+        HolidayRecord.objects.bulk_create(records)
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _get_all(self, url):
+        ids = []
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [r["id"] for r in response.data["results"]]
+            url = response.data["next"]
+        return ids
+
+    def test_pages_cover_all_records_in_order(self):
+        expected = list(
+            HolidayRecord.objects.filter(user=self.holiday_user)
+            .order_by("start_date", "id")
+            .values_list("id", flat=True)
+        )
+        self.assertEqual(self._get_all("/holiday/me/?page_size=25"), expected)
+
+    def test_query_count_does_not_grow(self):
+        first = self.client.get("/holiday/me/?page_size=50")
+        with self.assertNumQueries(1):
+            response = self.client.get(first.data["next"])
+        self.assertEqual(len(response.data["results"]), 50)
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/holiday/me/?page_size=500")
+        self.assertEqual(len(response.data["results"]), HolidayRecord.objects.count())
+        self.assertIsNone(response.data["next"])
+
+    def test_filters(self):
+        ids = self._get_all("/holiday/me/?year=2022")
+        self.assertEqual(len(ids), HolidayRecord.objects.filter(year=2022).count())
+
+        response = self.client.get("/holiday/me/?from=2022-03-01&to=2022-03-31")
+        self.assertEqual(
+            {r["start_date"][:7] for r in response.data["results"]}, {"2022-03"}
+        )
+
+        response = self.client.get("/holiday/me/?from=March")
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get("/holiday/me/?cursor=nonsense")
+        self.assertEqual(response.status_code, 404)
+
+    def test_update_uses_loaded_record(self):
+        record = HolidayRecord.objects.create(
+            user=self.holiday_user,
+            start_date=date.today() + timedelta(days=30),
+            end_date=date.today() + timedelta(days=30),
+            record_type_id=5,
+            year=date.today().year,
+        )
+        HolidayRecordType.objects.id_for("AL")  # Warm the record type cache
+        with self.assertNumQueries(
+            4
+        ):  # Load with the record type, closed years, overlaps and save
+            response = self.client.patch(
+                f"/holiday/me/{record.pk}/", {"title": "Trip"}, format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["title"], "Trip")
+
+    def test_overlapping_leave_is_rejected(self):
+        day = date.today() + timedelta(days=30)
+        HolidayRecord.objects.create(
+            user=self.holiday_user,
+            start_date=day,
+            end_date=day + timedelta(days=4),
+            record_type_id=5,
+            year=day.year,
+        )
+        data = {
+            "start_date": str(day + timedelta(days=4)),
+            "end_date": str(day + timedelta(days=6)),
+            "record_type": 5,
+            "year": day.year,
+        }
+        response = self.client.post("/holiday/me/", data, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Overlaps leave", response.data[0])
+
+        data["start_date"] = str(day + timedelta(days=5))
+        response = self.client.post("/holiday/me/", data, format="json")
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.patch(
+            f"/holiday/me/{response.data['id']}/",
+            {"start_date": str(day + timedelta(days=3))},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
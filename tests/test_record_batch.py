@@ -0,0 +1,143 @@
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from teamsite_annual_leave.models.holiday_plan import HolidayPlan
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.models.holiday_user import HolidayUser
+from teamsite_annual_leave.util.bank_holiday_parser import (
+    load_holiday_fixtures,
+    synchronise_holidays,
+)
+
+User = get_user_model()
+
+
+def _next_friday(after):
+    return after + timedelta(days=(4 - after.weekday()) % 7 or 7)
+
+
+@override_settings(ROOT_URLCONF="tests.urls")
+class RecordBatchTest(TestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        synchronise_holidays(load_holiday_fixtures())
+        self.user = User.objects.create_user("holidayuser1")
+        self.holiday_user = HolidayUser.objects.create(user=self.user)
+        HolidayPlan.objects.create(
+            user=self.holiday_user, start_date="2020-01-01", allowance=25
+        )
+        self.friday = _next_friday(date.today() + timedelta(days=7))
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _record(self, start, end=None, **kwargs):
+        return HolidayRecord.objects.create(
+            user=self.holiday_user,
+            start_date=start,
+            end_date=end or start,
+            record_type_id=5,
+            year=start.year,
+            **kwargs,
+        )
+
+    def _fridays(self, count):
+        return [
+            {
+                "start_date": str(day),
+                "end_date": str(day),
+                "record_type": 5,
+                "year": day.year,
+            }
+            for day in (self.friday + timedelta(weeks=w) for w in range(count))
+        ]
+
+    def _post(self, data):
+        return self.client.post("/holiday/me/batch/", data, format="json")
+
+    def test_create_update_delete(self):
+        to_update = self._record(self.friday - timedelta(days=2))
+        to_delete = self._record(self.friday - timedelta(days=1))
+
+        response = self._post(
+            {
+                "create": self._fridays(10),
+                "update": [{"id": to_update.pk, "title": "Dentist"}],
+                "delete": [to_delete.pk],
+            }
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(len(response.data["created"]), 10)
+        self.assertEqual(response.data["updated"][0]["title"], "Dentist")
+        self.assertEqual(response.data["deleted"], [to_delete.pk])
+        self.assertIn("activity", response.data)
+
+        records = HolidayRecord.objects.filter(user=self.holiday_user, record_type_id=5)
+        self.assertEqual(records.count(), 11)
+        self.assertFalse(records.filter(pk=to_delete.pk).exists())
+        self.assertEqual(records.get(pk=to_update.pk).title, "Dentist")
+
+    def test_query_count_does_not_grow(self):
+        def count_queries(data):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self._post(data).status_code, 200)
+            HolidayRecord.objects.filter(
+                user=self.holiday_user, record_type_id=5
+            ).delete()
+            return len(queries)
+
+        self.assertEqual(
+            count_queries({"create": self._fridays(2)}),
+            count_queries({"create": self._fridays(20)}),
+        )
+
+    def test_invalid_batch_changes_nothing(self):
+        self._record(self.friday)
+        past = self._record(date.today() - timedelta(days=10))
+        entitlement = HolidayRecord.objects.filter(
+            user=self.holiday_user, record_type_id=1
+        ).first()
+        yesterday = date.today() - timedelta(days=1)
+
+        response = self._post(
+            {
+                "create": self._fridays(2)
+                + [{"start_date": str(yesterday), "end_date": str(yesterday)}],
+                "delete": [past.pk, entitlement.pk, 0],
+            }
+        )
+        self.assertEqual(response.status_code, 400)
+        create_errors = response.data["create"]
+        self.assertIn("Overlaps", str(create_errors[0]))
+        self.assertEqual(create_errors[1], {})
+        self.assertIn("record_type", create_errors[2])
+        self.assertEqual(
+            response.data["delete"],
+            [
+                ["Leave cannot be in the past"],
+                ["System records cannot be changed"],
+                ["Not found"],
+            ],
+        )
+        self.assertTrue(HolidayRecord.objects.filter(pk=past.pk).exists())
+        self.assertEqual(
+            HolidayRecord.objects.filter(
+                user=self.holiday_user, start_date__gte=self.friday
+            ).count(),
+            1,
+        )
+
+    def test_half_days_can_share_a_day(self):
+        self._record(self.friday, end_half=True)
+        data = self._fridays(1)
+        data[0]["start_half"] = True
+        self.assertEqual(self._post({"create": data}).status_code, 200)
+
+        data[0]["start_half"] = False
+        self.assertEqual(self._post({"create": data}).status_code, 400)
@@ -0,0 +1,35 @@
+from django.test import TestCase
+
+from teamsite_annual_leave.models.holiday_record_type import HolidayRecordType
+
+
+class RecordTypeRegistryTest(TestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        HolidayRecordType.objects.clear_cache()
+
+    def test_lookups(self):
+        self.assertEqual(HolidayRecordType.objects.id_for("AL"), 5)
+        self.assertEqual(HolidayRecordType.objects.ids_for("ENT", "PH"), [1, 3])
+        self.assertEqual(HolidayRecordType.objects.code_for(6), "ROL")
+        self.assertEqual(
+            HolidayRecordType.objects.get_for_title("Office Closed").code, "CLS"
+        )
+        with self.assertRaises(HolidayRecordType.DoesNotExist):
+            HolidayRecordType.objects.get_for_code("XX")
+
+    def test_loaded_once(self):
+        with self.assertNumQueries(1):
+            HolidayRecordType.objects.id_for("AL")
+            HolidayRecordType.objects.get_for_code("PHADJ")
+            HolidayRecordType.objects.code_for(1)
+
+    def test_cleared_on_save(self):
+        record_type = HolidayRecordType.objects.get_for_code("ADJ")
+        record_type.code = "ADJX"
+        record_type.save()
+
+        self.assertEqual(HolidayRecordType.objects.code_for(record_type.pk), "ADJX")
+        with self.assertRaises(HolidayRecordType.DoesNotExist):
+            HolidayRecordType.objects.get_for_code("ADJ")
@@ -0,0 +1,151 @@
+from datetime import date
+from io import BytesIO
+from numbers import Number
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from teamsite_annual_leave.models.holiday_plan import HolidayPlan
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.models.holiday_record_type import HolidayRecordType
+from teamsite_annual_leave.models.holiday_user import HolidayUser
+from teamsite_annual_leave.tasks.close_year import close_year
+from teamsite_annual_leave.tasks.leave_days import rebuild_leave_year
+from teamsite_annual_leave.util.bank_holiday_parser import (
+    load_holiday_fixtures,
+    synchronise_holidays,
+)
+from teamsite_annual_leave.util.holiday_export import (
+    create_holiday_report,
+    get_detail_rows,
+    get_user_reports,
+)
+from teamsite_annual_leave.util.running_balance import (
+    get_running_balance_rows,
+    supports_running_balance,
+)
+
+User = get_user_model()
+
+
+@override_settings(ANNUAL_LEAVE_LEAVE_DAYS=True)
+class RunningBalanceTest(TestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        synchronise_holidays(load_holiday_fixtures())
+        for ix in range(3):
+            user = User.objects.create_user(
+                f"holidayuser{ix}", email=f"holidayuser{ix}@example.com"
+            )
+            holiday_user = HolidayUser.objects.create(user=user)
+            HolidayPlan.objects.create(
+                user=holiday_user,
+                start_date=date(2022, 1, 1),
+                allowance=25 if ix < 2 else 0,
+                fri_days=ix * 0.5,
+            )
+            for start, end in (
+                (date(2023, 5, 26), date(2023, 6, 2)),
+                (date(2023, 8, 30), date(2023, 9, 8)),
+            ):
+                HolidayRecord.objects.create(
+                    user=holiday_user,
+                    start_date=start,
+                    end_date=end,
+                    start_half=ix == 1,
+                    record_type_id=5,
+                    year=2023,
+                )
+        rebuild_leave_year(2023)
+
+    def _report_rows(self, users):
+        reports = get_user_reports(users, 2023)
+        return list(get_detail_rows([r for r in reports if r[1]["allowance"] > 0]))
+
+    def assertRowsEqual(self, rows, expected):
+        self.assertEqual(len(rows), len(expected))
+        for row, expected_row in zip(rows, expected):
+            self.assertEqual(
+                [float(v) if isinstance(v, Number) else v for v in row[6:11]],
+                [float(v) if isinstance(v, Number) else v for v in expected_row[6:11]],
+            )
+            self.assertEqual(row[:6] + row[11:], expected_row[:6] + expected_row[11:])
+
+    def test_matches_report(self):
+        self.assertTrue(supports_running_balance(2023))
+        users = User.objects.order_by("username")
+        rows = list(get_running_balance_rows(2023))
+        self.assertEqual(len({r[0] for r in rows}), 2)
+        self.assertRowsEqual(rows, self._report_rows(users))
+
+        # Users without an allowance are left out, like the rest of the workbook
+        self.assertNotIn("holidayuser2@example.com", {r[0] for r in rows})
+
+    def test_filtered_by_user(self):
+        users = User.objects.filter(username="holidayuser1")
+        rows = list(get_running_balance_rows(2023, users))
+        self.assertRowsEqual(rows, self._report_rows(users))
+
+    def test_shared_half_day(self):
+        # A morning and an afternoon off on 7 March, booked as two records
+        holiday_user = HolidayUser.objects.get(user__username="holidayuser0")
+        for start, start_half, end_half in (
+            (date(2023, 3, 6), False, True),
+            (date(2023, 3, 7), True, False),
+        ):
+            HolidayRecord.objects.create(
+                user=holiday_user,
+                start_date=start,
+                end_date=date(2023, 3, 7),
+                start_half=start_half,
+                end_half=end_half,
+                record_type_id=5,
+                year=2023,
+            )
+        rebuild_leave_year(2023)
+
+        users = User.objects.filter(username="holidayuser0")
+        rows = list(get_running_balance_rows(2023, users))
+        march = [float(r[7]) for r in rows if r[4].month == 3]
+        self.assertEqual(march, [1.5, 0.5])
+        self.assertRowsEqual(rows, self._report_rows(users))
+
+    def test_one_query(self):
+        HolidayRecordType.objects.id_for("AL")  # Warms the record type cache
+        with self.assertNumQueries(1):
+            list(get_running_balance_rows(2023))
+
+    def test_fallback(self):
+        self.assertFalse(supports_running_balance(2022))
+        with self.settings(ANNUAL_LEAVE_LEAVE_DAYS=False):
+            self.assertFalse(supports_running_balance(2023))
+
+    def test_closed_year(self):
+        holiday_user = HolidayUser.objects.get(user__username="holidayuser0")
+        close_year(2023, users=User.objects.filter(username="holidayuser0"))
+        record = HolidayRecord.objects.get(
+            user=holiday_user, start_date=date(2023, 5, 26)
+        )
+        record.end_date = date(2023, 6, 9)
+        record.save()
+        rebuild_leave_year(2023)
+
+        self.assertFalse(supports_running_balance(2023))
+        self.assertFalse(
+            supports_running_balance(2023, User.objects.filter(username="holidayuser0"))
+        )
+        self.assertTrue(
+            supports_running_balance(2023, User.objects.filter(username="holidayuser1"))
+        )
+
+        # The detail rows come from the snapshot, like the summary sheet
+        rows = self._report_rows(User.objects.filter(username="holidayuser0"))
+        self.assertEqual(
+            [r[5] for r in rows if r[4] == date(2023, 5, 26)], [date(2023, 6, 2)]
+        )
+
+    def test_workbook(self):
+        output = BytesIO()
+        create_holiday_report(output, None, 2023, config="d")
+        self.assertGreater(len(output.getvalue()), 0)
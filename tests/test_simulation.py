@@ -0,0 +1,173 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from teamsite_annual_leave.models.holiday_plan import HolidayPlan
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.models.holiday_record_type import HolidayRecordType
+from teamsite_annual_leave.models.holiday_user import HolidayUser
+from teamsite_annual_leave.tasks.close_year import close_year
+from teamsite_annual_leave.util.bank_holiday_parser import (
+    load_holiday_fixtures,
+    synchronise_holidays,
+)
+from teamsite_annual_leave.util.holiday_report import generate_holiday_report
+from teamsite_annual_leave.util.simulation import LeaveLedger
+
+User = get_user_model()
+
+FIGURES = ("allowance", "public_holiday_adjustment", "total_allowance", "remainder")
+
+
+@override_settings(ROOT_URLCONF="tests.urls")
+class SimulationTest(TestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        synchronise_holidays(load_holiday_fixtures())
+        self.user = User.objects.create_user("holidayuser1")
+        self.holiday_user = HolidayUser.objects.create(user=self.user)
+        self.plan = HolidayPlan.objects.create(
+            user=self.holiday_user, start_date=date(2020, 1, 1), allowance=25
+        )
+        self.day = date.today() + timedelta(days=14)
+        while self.day.weekday() > 3:
+            self.day += timedelta(days=1)
+        self.year = self.day.year
+        HolidayRecord.objects.create(
+            user=self.holiday_user,
+            start_date=self.day,
+            end_date=self.day + timedelta(days=1),
+            record_type_id=5,
+            year=self.year,
+        )
+
+    def _figures(self, summary):
+        return {k: summary[k] for k in FIGURES}
+
+    def test_unchanged_ledger_matches_report(self):
+        expected = generate_holiday_report(self.user, self.year)
+        actual = LeaveLedger(self.holiday_user, self.year).report()
+        self.assertEqual(self._figures(actual), self._figures(expected))
+        self.assertEqual(
+            [d["id"] for d in actual["details"]], [d["id"] for d in expected["details"]]
+        )
+
+    def test_plan_change_matches_saved_plan(self):
+        HolidayRecord.objects.create(
+            user=self.holiday_user,
+            start_date=date(2023, 8, 3),
+            end_date=date(2023, 8, 11),
+            record_type_id=5,
+            year=2023,
+        )
+        HolidayRecordType.objects.id_for("AL")  # Warms the record type cache
+        ledger = LeaveLedger(self.holiday_user, 2023)
+
+        new_plan = HolidayPlan(
+            user=self.holiday_user,
+            start_date=date(2023, 7, 1),
+            allowance=25,
+            fri_days=0,
+        )
+        with self.assertNumQueries(0):
+            simulated = ledger.report(plans=[self.plan, new_plan])
+
+        self.assertEqual(HolidayPlan.objects.count(), 1)
+        new_plan.save()
+        self.assertEqual(
+            self._figures(simulated),
+            self._figures(generate_holiday_report(self.user, 2023)),
+        )
+
+    def test_simulate_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        before = generate_holiday_report(self.user, self.year)
+        record_count = HolidayRecord.objects.count()
+
+        day = self.day + timedelta(weeks=1)
+        response = client.post(
+            f"/holiday/me/simulate/?year={self.year}",
+            {
+                "create": [
+                    {
+                        "start_date": str(day),
+                        "end_date": str(day),
+                        "record_type": 5,
+                        "year": self.year,
+                    }
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            Decimal(str(response.data["remainder"])), before["remainder"] - 1
+        )
+        self.assertEqual(HolidayRecord.objects.count(), record_count)
+
+    def test_closed_year(self):
+        close_year(self.year)
+        expected = generate_holiday_report(self.user, self.year)
+
+        # Plans are no longer recalculated into the year, so its snapshot stands
+        ledger = LeaveLedger(self.holiday_user, self.year)
+        new_plan = HolidayPlan(
+            user=self.holiday_user, start_date=date(self.year, 1, 1), allowance=30
+        )
+        self.assertEqual(ledger.report(), expected)
+        self.assertEqual(ledger.report(plans=[new_plan, self.plan]), expected)
+
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        day = self.day + timedelta(weeks=1)
+        response = client.post(
+            f"/holiday/me/simulate/?year={self.year}",
+            {
+                "create": [
+                    {
+                        "start_date": str(day),
+                        "end_date": str(day),
+                        "record_type": 5,
+                        "year": self.year,
+                    }
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["create"][0]["year"], [f"{self.year} is closed"])
+
+    @override_settings(ROOT_URLCONF="django_site.urls")
+    def test_admin_preview(self):
+        admin_user = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(admin_user)
+
+        response = self.client.post(
+            f"/admin/teamsite_annual_leave/holidayplan/{self.plan.pk}/preview/",
+            {
+                "user": self.holiday_user.pk,
+                "start_date": "2020-01-01",
+                "allowance": "30",
+                "mon_days": "1",
+                "tue_days": "1",
+                "wed_days": "1",
+                "thu_days": "1",
+                "fri_days": "1",
+                "sat_days": "0",
+                "sun_days": "0",
+            },
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        years = response.json()["years"]
+        self.assertEqual(
+            Decimal(years[0]["after"]["allowance"])
+            - Decimal(years[0]["before"]["allowance"]),
+            5,
+        )
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.allowance, 25)
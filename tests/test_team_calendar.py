@@ -0,0 +1,89 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from teamsite_annual_leave.models.holiday_plan import HolidayPlan
+from teamsite_annual_leave.models.holiday_record import HolidayRecord
+from teamsite_annual_leave.models.holiday_user import HolidayUser
+from teamsite_annual_leave.util.team_calendar import build_team_calendar
+
+User = get_user_model()
+
+
+@override_settings(ROOT_URLCONF="tests.urls")
+class TeamCalendarTest(TestCase):
+    fixtures = ["record-types"]
+
+    def setUp(self):
+        self.alice = HolidayUser.objects.create(user=User.objects.create_user("alice"))
+        self.bob = HolidayUser.objects.create(user=User.objects.create_user("bob"))
+        HolidayPlan.objects.create(
+            user=self.alice, start_date="2020-01-01", allowance=25
+        )
+        HolidayPlan.objects.create(
+            user=self.bob, start_date="2020-01-01", allowance=25, fri_days=0.5
+        )
+
+        HolidayRecord.objects.create(
+            user=self.alice,
+            start_date="2023-07-03",
+            end_date="2023-07-05",
+            end_half=True,
+            record_type_id=5,
+            year=2023,
+        )
+        HolidayRecord.objects.create(
+            user=self.bob,
+            start_date="2023-07-06",
+            end_date="2023-07-07",
+            record_type_id=5,
+            year=2023,
+        )
+        HolidayRecord.objects.create(
+            start_date="2023-07-10",
+            end_date="2023-07-10",
+            record_type_id=4,
+            title="Office Closed",
+            year=2023,
+        )
+
+    def test_grid(self):
+        users = HolidayUser.objects.order_by("user__username")
+        calendar = build_team_calendar(date(2023, 7, 3), date(2023, 7, 16), users)
+
+        self.assertEqual(
+            calendar["columns"],
+            [["", 5], ["weekend", 2], ["bank_holiday", 1], ["", 4], ["weekend", 2]],
+        )
+        self.assertEqual(calendar["closures"][0]["date"], date(2023, 7, 10))
+
+        alice, bob = calendar["users"]
+        self.assertEqual(
+            alice["spans"],
+            [["holiday", 2], ["holiday_half", 1], ["working", 11]],
+        )
+        # Weekends and the closure carry the state of the previous day
+        self.assertEqual(
+            bob["spans"],
+            [
+                ["working", 3],
+                ["holiday", 1],
+                ["non_working_holiday", 4],
+                ["working", 3],
+                ["non_working_half", 3],
+            ],
+        )
+
+    def test_api(self):
+        client = APIClient()
+        client.force_authenticate(self.alice.user)
+
+        response = client.get(
+            "/holiday/calendar/",
+            {"start": "2023-07-03", "end": "2023-07-09", "users": "bob"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["start"], "2023-07-03")
+        self.assertEqual([u["username"] for u in response.data["users"]], ["bob"])
@@ -0,0 +1,5 @@
+from django.urls import include, path
+
+urlpatterns = [
+    path("holiday/", include("teamsite_annual_leave.urls")),
+]